@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Benchmark RulesEngine.evaluate_series against a per-sample evaluate_snapshot loop.
+
+Generates synthetic 1 Hz telemetry for the shipped safety rules and reports the
+vectorized backtest time for the full series and the extrapolated snapshot-loop
+time (the loop is only run over a prefix to keep the benchmark short).
+
+Run:
+  python3 -m benchmarks.bench_evaluate_series --days 3
+"""
+import argparse
+import time
+
+import numpy as np
+
+from scripts.rules_engine import RulesEngine
+
+
+def synthetic_series(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000.0 + np.arange(n, dtype=np.float64)
+    arrays = {
+        'picrawler_battery_voltage_volts': 7.4 - np.linspace(0, 1.6, n) + rng.normal(0, 0.05, n),
+        'picrawler_cpu_temp_celsius': 70 + 18 * np.sin(np.arange(n) / 3600.0) + rng.normal(0, 1, n),
+        'ultrasonic_distance_m': rng.uniform(0.02, 2.0, n),
+    }
+    return arrays, ts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=float, default=1.0)
+    parser.add_argument('--loop-samples', type=int, default=50_000, help='prefix length for the snapshot loop')
+    args = parser.parse_args()
+
+    n = int(args.days * 86400)
+    arrays, ts = synthetic_series(n)
+    engine = RulesEngine('config/rules/safety_*.yaml')
+
+    start = time.perf_counter()
+    results = engine.evaluate_series(arrays, ts)
+    vec = time.perf_counter() - start
+    firings = sum(len(r['indices']) for r in results)
+
+    m = min(n, args.loop_samples)
+    loop_engine = RulesEngine('config/rules/safety_*.yaml')
+    names = list(arrays)
+    columns = [arrays[k].tolist() for k in names]
+    start = time.perf_counter()
+    for i in range(m):
+        loop_engine.evaluate_snapshot({k: col[i] for k, col in zip(names, columns)}, ts=float(ts[i]))
+    loop = (time.perf_counter() - start) * n / m
+
+    print(f"samples:              {n}")
+    print(f"firings:              {firings}")
+    print(f"evaluate_series:      {vec:8.3f} s")
+    print(f"snapshot loop (est.): {loop:8.3f} s")
+    print(f"speedup:              {loop / vec:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
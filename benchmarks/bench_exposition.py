@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""CPU cost of serving /metrics, cached vs rendering on every scrape.
+
+Starts an exporter-like server in a child process with a realistic registry
+(the exporter's own metrics plus ``--series`` pushed servo/vision series), then
+scrapes it at each rate in ``--rates`` for ``--seconds`` and reports the server
+process's CPU time per scrape and per second of wall time.
+
+Run:
+  python3 -m benchmarks.bench_exposition
+  python3 -m benchmarks.bench_exposition --rates 1 10 50 --seconds 10 --gzip
+"""
+import argparse
+import multiprocessing as mp
+import time
+
+import psutil
+import requests
+
+
+def run_server(port: int, cached: bool, series: int, ready):
+    from http.server import ThreadingHTTPServer
+
+    from prometheus_client import REGISTRY
+    from prometheus_client.exposition import MetricsHandler
+
+    from scripts import metrics_exporter
+    from scripts.ingest import IngestCollector
+
+    collector = IngestCollector(helps=metrics_exporter.INGEST_HELP)
+    collector.apply(b'\n'.join(b'picrawler_servos_position_degrees{servo="servo%d",leg="%d"} %d' % (i, i % 4, i % 180)
+                               for i in range(series)))
+    REGISTRY.register(collector)
+    metrics_exporter.update_metrics()
+    if cached:
+        metrics_exporter.serve(port, max_age=1.0)
+        ready.set()
+        while True:
+            time.sleep(60)
+    else:
+        server = ThreadingHTTPServer(('', port), MetricsHandler.factory(REGISTRY))
+        ready.set()
+        server.serve_forever()
+
+
+def measure(url: str, proc: psutil.Process, rate: float, seconds: float, headers: dict) -> tuple:
+    session = requests.Session()
+    session.get(url, headers=headers)  # warm up the connection and the first render
+    cpu0 = sum(proc.cpu_times()[:2])
+    start = time.perf_counter()
+    n = 0
+    while time.perf_counter() - start < seconds:
+        session.get(url, headers=headers)
+        n += 1
+        delay = start + n / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    cpu = sum(proc.cpu_times()[:2]) - cpu0
+    return n, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 10, 50], help='scrapes/s')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--series', type=int, default=200, help='pushed series in the registry')
+    parser.add_argument('--gzip', action='store_true', help='scrape with Accept-Encoding: gzip')
+    parser.add_argument('--port', type=int, default=9191)
+    args = parser.parse_args()
+    headers = {'Accept-Encoding': 'gzip' if args.gzip else 'identity'}
+
+    for cached in (False, True):
+        ready = mp.Event()
+        port = args.port + cached
+        server = mp.Process(target=run_server, args=(port, cached, args.series, ready), daemon=True)
+        server.start()
+        ready.wait(10)
+        time.sleep(0.2)
+        proc = psutil.Process(server.pid)
+        for rate in args.rates:
+            n, cpu = measure(f'http://127.0.0.1:{port}/metrics', proc, rate, args.seconds, headers)
+            print(f"{'cached' if cached else 'uncached':>8} {rate:5.0f} scrapes/s ({n} scrapes): "
+                  f"{cpu / n * 1e3:6.2f} ms CPU/scrape, {cpu / args.seconds * 100:5.1f}% of a core")
+        server.terminate()
+        server.join()
+
+
+if __name__ == '__main__':
+    main()
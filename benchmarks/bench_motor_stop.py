@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Cold vs warm stop_motors latency with a fake robot_hat module.
+
+The fake module charges a configurable cost for opening the controller
+(``Motors()``) to stand in for robot_hat's I2C/PWM setup. The cold path pays it
+on every stop; the warm MotorBackend pays it once at startup. The fallback
+path forks the stop command (``true`` here instead of systemctl) either way.
+
+Run:
+  python3 -m benchmarks.bench_motor_stop --open-ms 20
+"""
+import argparse
+import sys
+import time
+import types
+
+from scripts import enforcement
+
+
+def fake_robot_hat(open_ms: float, broken: bool = False):
+    class Motors:
+        def __init__(self):
+            if broken:
+                raise OSError('no HAT')
+            time.sleep(open_ms / 1e3)
+
+        def stop(self):
+            pass
+    return types.SimpleNamespace(Motors=Motors)
+
+
+def measure(fn, n: int, between=None):
+    samples = []
+    for _ in range(n):
+        if between:
+            between()
+        start = time.perf_counter()
+        assert fn()
+        samples.append((time.perf_counter() - start) * 1e3)
+    samples.sort()
+    return samples[len(samples) // 2], samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--open-ms', type=float, default=20.0, help='simulated Motors() setup cost')
+    parser.add_argument('-n', type=int, default=20)
+    args = parser.parse_args()
+
+    true_cmd = ['true']
+    sys.modules['robot_hat'] = fake_robot_hat(args.open_ms)
+    cold = measure(lambda: enforcement.stop_motors(dry_run=False), args.n)
+    backend = enforcement.MotorBackend()
+    backend.open()
+    warm = measure(backend.stop, args.n)
+
+    sys.modules['robot_hat'] = fake_robot_hat(args.open_ms, broken=True)
+    backend = enforcement.MotorBackend(fallback_cmd=true_cmd)
+    backend.open()
+    fallback = measure(backend.stop, args.n)
+
+    print(f"{'path':28} {'p50 ms':>8} {'max ms':>8}")
+    for label, (p50, worst) in (('robot_hat cold', cold), ('robot_hat warm', warm),
+                                ('fallback (fork per stop)', fallback)):
+        print(f"{label:28} {p50:8.3f} {worst:8.3f}")
+
+
+if __name__ == '__main__':
+    main()
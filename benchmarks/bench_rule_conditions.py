@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Microbenchmark: compiled rule conditions vs the original per-call string parser.
+
+Run:
+  python3 -m benchmarks.bench_rule_conditions
+"""
+import argparse
+import timeit
+
+from scripts.conditions import OP_MAP
+from scripts.rules_engine import Rule
+
+
+def legacy_match(cond: str, value: float) -> bool:
+    # the parser Rule.match_metric used before conditions were precompiled
+    parts = cond.strip().split()
+    if len(parts) == 2:
+        op_sym, threshold = parts
+        op = OP_MAP.get(op_sym)
+        if op is None:
+            return False
+        try:
+            return op(value, float(threshold))
+        except Exception:
+            return False
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=200_000)
+    args = parser.parse_args()
+
+    cond = '< 6.0'
+    rule = Rule({'id': 'bench/battery', 'trigger': {'metric': 'v', 'condition': cond}})
+    legacy = timeit.timeit(lambda: legacy_match(cond, 5.9), number=args.number)
+    compiled = timeit.timeit(lambda: rule.match_metric('v', 5.9), number=args.number)
+    per = 1e9 / args.number
+    print(f"legacy parser:      {legacy * per:8.1f} ns/call")
+    print(f"compiled predicate: {compiled * per:8.1f} ns/call")
+    print(f"speedup:            {legacy / compiled:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Benchmark RulesEngine construction time (watchdog startup).
+
+Compares the pure-Python YAML loader, libyaml's CSafeLoader and a warm rule
+cache over a synthetic rule directory.
+
+Run:
+  python3 -m benchmarks.bench_rules_startup --files 50 --rules-per-file 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import yaml
+
+import scripts.rules_engine as rules_engine
+from scripts.rules_engine import RulesEngine
+
+
+def write_rules(dirname: str, files: int, per_file: int):
+    for f in range(files):
+        rules = [{
+            'id': f"bench/rule-{f}-{i}",
+            'severity': 'critical',
+            'description': 'synthetic rule used to time watchdog startup\n' * 3,
+            'trigger': {'metric': f"bench_metric_{i}", 'condition': '< 6.0', 'duration_seconds': 15},
+            'enforcement_action': ['stop_motors', 'alert_operator'],
+            'tests': [{'simulate_metric': {'metric': f"bench_metric_{i}", 'values': [6.5, 5.5],
+                                           'expected_action': ['stop_motors']}}],
+        } for i in range(per_file)]
+        with open(os.path.join(dirname, f"rules_{f}.yaml"), 'w') as fh:
+            yaml.safe_dump(rules, fh)
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--rules-per-file', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        rules_dir = os.path.join(d, 'rules')
+        os.mkdir(rules_dir)
+        write_rules(rules_dir, args.files, args.rules_per_file)
+        pattern = os.path.join(rules_dir, '*.yaml')
+        cache = os.path.join(d, 'rules.json')
+
+        loader = rules_engine.YAML_LOADER
+        rules_engine.YAML_LOADER = yaml.SafeLoader
+        pure = best_of(lambda: RulesEngine(pattern), args.repeat)
+        rules_engine.YAML_LOADER = loader
+        fast = best_of(lambda: RulesEngine(pattern), args.repeat)
+        RulesEngine(pattern, cache_path=cache)  # populate the cache
+        cached = best_of(lambda: RulesEngine(pattern, cache_path=cache), args.repeat)
+
+    print(f"rules: {args.files * args.rules_per_file} in {args.files} files")
+    print(f"SafeLoader:  {pure:8.1f} ms")
+    print(f"{loader.__name__ + ':':12} {fast:8.1f} ms")
+    print(f"warm cache:  {cached:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
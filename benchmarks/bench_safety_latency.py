@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Latency harness for the event-driven safety path.
+
+A simulated ultrasonic sensor publishes readings over the safety socket; every
+``--every``-th reading is below the collision threshold. The harness measures
+the time from publish to the moment the stop_motors handler is entered.
+
+Run:
+  python3 -m benchmarks.bench_safety_latency --samples 2000
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from scripts import enforcement
+from scripts.rules_engine import RulesEngine
+from scripts.safety_channel import SafetyListener, SafetyPublisher
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--every', type=int, default=10, help='one collision reading per N samples')
+    parser.add_argument('--rate', type=float, default=200.0, help='sensor readings per second')
+    args = parser.parse_args()
+
+    stopped = threading.Event()
+    stop_times = []
+
+    def fake_stop_motors(dry_run=True):
+        stop_times.append(time.perf_counter())
+        stopped.set()
+        return True
+
+    enforcement.ACTION_MAP['stop_motors'] = fake_stop_motors
+    engine = RulesEngine('config/rules/safety_collision-imminent.yaml')
+    sock = os.path.join(tempfile.mkdtemp(), 'safety.sock')
+    listener = SafetyListener(engine, enforcement.dispatch_firings, sock)
+    listener.start()
+    pub = SafetyPublisher(sock)
+
+    latencies = []
+    period = 1.0 / args.rate
+    try:
+        for i in range(args.samples):
+            if i % args.every == args.every - 1:
+                stopped.clear()
+                sent = time.perf_counter()
+                pub.publish('ultrasonic_distance_m', 0.05)
+                if stopped.wait(1.0):
+                    latencies.append((stop_times[-1] - sent) * 1e3)
+            else:
+                pub.publish('ultrasonic_distance_m', 1.0)
+            time.sleep(period)
+    finally:
+        pub.close()
+        listener.stop()
+
+    print(f"collisions: {len(latencies)} (missed {args.samples // args.every - len(latencies)})")
+    print(f"sample -> stop_motors latency: p50 {percentile(latencies, 50):.3f} ms, "
+          f"p99 {percentile(latencies, 99):.3f} ms, max {max(latencies):.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Benchmark the streaming scrape parser against prometheus_client's parser.
+
+Parses a synthetic 5k-line exposition with prometheus_client (what the watchdog
+used to do), with the streaming parser keeping every sample, and with the
+streaming parser subscribed only to the metrics the shipped rules read.
+
+Run:
+  python3 -m benchmarks.bench_scrape_parser --lines 5000
+"""
+import argparse
+import time
+
+from prometheus_client.parser import text_string_to_metric_families
+
+from scripts.rules_engine import RulesEngine
+from scripts.scrape_parser import parse_into
+from scripts.series import SeriesStore
+
+
+def synthetic_exposition(lines: int) -> bytes:
+    out = [
+        '# TYPE picrawler_cpu_temp_celsius gauge', 'picrawler_cpu_temp_celsius 71.5',
+        '# TYPE picrawler_battery_voltage_volts gauge', 'picrawler_battery_voltage_volts 7.2',
+        '# TYPE ultrasonic_distance_m gauge', 'ultrasonic_distance_m 0.8',
+    ]
+    i = 0
+    while len(out) < lines:
+        out.append(f'# HELP bench_family_{i} synthetic family {i}')
+        out.append(f'# TYPE bench_family_{i} gauge')
+        for j in range(8):
+            out.append(f'bench_family_{i}{{instance="pi-crawler-1",slot="{j}"}} {i * 8 + j}.5')
+        i += 1
+    return ('\n'.join(out[:lines]) + '\n').encode()
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    body = synthetic_exposition(args.lines)
+    chunks = [body[i:i + 16384] for i in range(0, len(body), 16384)]
+    subscribed = RulesEngine().subscribed
+    store = SeriesStore()
+
+    def prom_client():
+        metrics = {}
+        for family in text_string_to_metric_families(body.decode()):
+            for m in family.samples:
+                metrics[m.name] = m.value
+        return metrics
+
+    def streaming(subs):
+        store.begin_scrape()
+        parse_into(chunks, store, subs)
+        store.end_scrape()
+
+    print(f"exposition: {args.lines} lines, {len(body)} bytes")
+    print(f"prometheus_client parser:   {best_of(prom_client, args.repeat):8.2f} ms")
+    print(f"streaming, all samples:     {best_of(lambda: streaming(None), args.repeat):8.2f} ms")
+    print(f"streaming, subscribed only: {best_of(lambda: streaming(subscribed), args.repeat):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
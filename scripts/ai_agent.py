@@ -3,21 +3,256 @@
 
 This is a safe, minimal scaffold. The real implementation would include
 prompt templates, safety checks, and offline model integration.
+
+Remote replies for intents listed under ``cache.intents`` in
+config/agents/ai.yaml are kept in a ResponseCache (scripts/ai_cache.py), so
+repeated operator commands and status questions skip the round trip.
+
+Remote calls share one long-lived OpenRouter client and are admitted by a
+token bucket at ``openrouter.rate_limits_per_minute``. When the budget is spent,
+callers queue in arrival order for up to ``openrouter.queue_timeout_seconds``;
+past that they get the local fallback instead of a provider-side 429.
+
+Admitted calls are hedged (HedgedRouter): if OpenRouter has not answered
+within the p95 of its recent latencies, the local model is started alongside
+it and whichever answers first wins. Intents under ``routing.local_intents``
+skip the remote model entirely.
 """
 import os
+import sys
+import time
 import logging
 import argparse
+import json
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import yaml
+from prometheus_client import Counter, Gauge, Histogram
+
+if __package__ in (None, ''):  # run as a script: make `scripts.*` importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.ai_cache import ResponseCache, cache_key  # noqa: E402
+from scripts.ratelimit import TokenBucket  # noqa: E402
 
 logger = logging.getLogger('ai_agent')
 
 OPENROUTER_API_KEY_ENV = 'OPENROUTER_API_KEY'
+AI_CONFIG_PATH = os.environ.get('PICRAWLER_AI_CONFIG', 'config/agents/ai.yaml')
+
+QUEUE_DEPTH = Gauge("picrawler_ai_queue_depth", "Requests waiting for an OpenRouter rate limit token")
+QUEUE_WAIT = Histogram("picrawler_ai_queue_wait_seconds", "Time requests waited for an OpenRouter rate limit token",
+                       buckets=(0, .1, .25, .5, 1, 2.5, 5, 10, 30))
+RATE_LIMITED = Counter("picrawler_ai_rate_limited_total",
+                       "Requests over the OpenRouter budget by outcome (queued, fallback)", ['outcome'])
+BACKEND_LATENCY = Histogram("picrawler_ai_backend_latency_seconds", "Model call latency by backend", ['backend'],
+                            buckets=(.05, .1, .25, .5, 1, 2, 4, 8, 16, 30))
+HEDGE_BUDGET = Gauge("picrawler_ai_hedge_budget_seconds", "Time OpenRouter gets before the local model is started")
+ROUTED = Counter("picrawler_ai_routed_total",
+                 "Replies by backend that produced them and route (direct, hedged, fallback after a remote error)",
+                 ['backend', 'route'])
+
+_config = None
+# shared cache, limiter and router, one per distinct config section (see _section_key)
+_caches: Dict[str, ResponseCache] = {}
+_cache_lock = threading.Lock()
+_client = None
+_client_owner = None  # (openrouter module, api key) the client was built for
+_client_lock = threading.Lock()
+_limiters: Dict[str, Optional['RequestLimiter']] = {}
+_limiter_lock = threading.Lock()
+_routers: Dict[str, 'HedgedRouter'] = {}
+_router_lock = threading.Lock()
+
+
+class RequestLimiter:
+    """Token bucket in front of the remote model; over-budget callers queue FIFO up to ``queue_timeout``."""
+
+    def __init__(self, per_minute: float, burst: float = 1, queue_timeout: float = 5.0):
+        self.bucket = TokenBucket(60.0 / per_minute, burst)
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> Optional['RequestLimiter']:
+        per_minute = float(cfg.get('rate_limits_per_minute') or 0)
+        if per_minute <= 0:
+            return None
+        return cls(per_minute, float(cfg.get('burst', 1)), float(cfg.get('queue_timeout_seconds', 5)))
+
+    def acquire(self) -> bool:
+        """Blocks until the caller may call the provider; False means use the fallback instead."""
+        with self._lock:
+            wait = self.bucket.reserve(time.monotonic(), self.queue_timeout)
+            if wait:
+                self.waiting += 1
+                QUEUE_DEPTH.set(self.waiting)
+        if wait is None:
+            RATE_LIMITED.labels('fallback').inc()
+            return False
+        if wait:
+            RATE_LIMITED.labels('queued').inc()
+            time.sleep(wait)
+            with self._lock:
+                self.waiting -= 1
+                QUEUE_DEPTH.set(self.waiting)
+        QUEUE_WAIT.observe(wait)
+        return True
+
+
+def load_agent_config(path: str = AI_CONFIG_PATH) -> Dict[str, Any]:
+    try:
+        with open(path, 'r') as fh:
+            return yaml.safe_load(fh) or {}
+    except OSError:
+        return {}
+
+
+def get_agent_config() -> Dict[str, Any]:
+    """ai.yaml, parsed on first use and reused; respond() must not pay for YAML on every call."""
+    global _config
+    if _config is None:
+        _config = load_agent_config()
+    return _config
+
+
+def _section_key(section: Dict[str, Any]) -> str:
+    return json.dumps(section, sort_keys=True, default=str)
+
+
+def get_cache(cfg: Dict[str, Any]) -> ResponseCache:
+    """Shared response cache for ``cfg['cache']``, loaded from disk on first use and saved in the background."""
+    section = cfg.get('cache') or {}
+    key = _section_key(section)
+    with _cache_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = ResponseCache.from_config(section)
+            cache.start_autosave()
+        return cache
+
+
+class HedgedRouter:
+    """Runs ``remote``; if it is slower than the learned budget, races ``local`` against it.
+
+    The budget is the p95 of the last ``window`` successful remote latencies,
+    clamped to ``[min_budget, max_budget]``, or ``initial_budget`` until
+    ``min_samples`` have been seen. Remote calls that finish after losing a race
+    are still recorded, so the budget follows the real latency rather than
+    only the calls that beat it. ``hedge=False`` always waits for the remote.
+    """
+
+    def __init__(self, remote: Callable[[str], str], local: Callable[[str], str], hedge: bool = True,
+                 initial_budget: float = 2.0, min_budget: float = 0.25, max_budget: float = 10.0,
+                 window: int = 200, min_samples: int = 20, max_remote_calls: int = 4):
+        self.remote = remote
+        self.local = local
+        self.hedge = hedge
+        self.initial_budget = initial_budget
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        # hung remote calls hold a worker; the local model has its own so it can always start
+        self._remote_pool = ThreadPoolExecutor(max_remote_calls, thread_name_prefix='ai-remote')
+        self._local_pool = ThreadPoolExecutor(2, thread_name_prefix='ai-local')
+        HEDGE_BUDGET.set(initial_budget)
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any], remote, local) -> 'HedgedRouter':
+        return cls(remote, local, bool(cfg.get('hedge', True)), float(cfg.get('initial_budget_seconds', 2.0)),
+                   float(cfg.get('min_budget_seconds', 0.25)), float(cfg.get('max_budget_seconds', 10.0)),
+                   int(cfg.get('window', 200)), int(cfg.get('min_samples', 20)))
+
+    def budget(self) -> float:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < self.min_samples:
+            return self.initial_budget
+        p95 = samples[int(0.95 * (len(samples) - 1))]
+        return min(self.max_budget, max(self.min_budget, p95))
+
+    def _timed(self, backend: str, fn, prompt: str) -> Tuple[str, float]:
+        start = time.monotonic()
+        text = fn(prompt)
+        elapsed = time.monotonic() - start
+        BACKEND_LATENCY.labels(backend).observe(elapsed)
+        if backend == 'openrouter':
+            with self._lock:
+                self.latencies.append(elapsed)
+        return text, elapsed
+
+    def call_local(self, prompt: str) -> str:
+        ROUTED.labels('local', 'direct').inc()
+        return self._timed('local', self.local, prompt)[0]
+
+    def route(self, prompt: str) -> Tuple[str, str, float]:
+        """Returns ``(text, backend, latency)`` from whichever backend answered first."""
+        budget = self.budget() if self.hedge else None
+        HEDGE_BUDGET.set(budget or 0)
+        remote = self._remote_pool.submit(self._timed, 'openrouter', self.remote, prompt)
+        done, _ = wait([remote], timeout=budget)
+        if remote in done and remote.exception() is None:
+            ROUTED.labels('openrouter', 'direct').inc()
+            text, elapsed = remote.result()
+            return text, 'openrouter', elapsed
+        route = 'fallback' if remote in done else 'hedged'
+        if route == 'hedged':
+            logger.info('OpenRouter slower than %.2fs budget; starting local model', budget)
+        local = self._local_pool.submit(self._timed, 'local', self.local, prompt)
+        pending = {remote, local}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in (remote, local):  # prefer the remote reply if both are in
+                if fut in done and fut.exception() is None:
+                    backend = 'openrouter' if fut is remote else 'local'
+                    ROUTED.labels(backend, route).inc()
+                    text, elapsed = fut.result()
+                    return text, backend, elapsed
+        raise local.exception()
+
+
+def get_router(cfg: Dict[str, Any]) -> HedgedRouter:
+    """Shared router for ``cfg['routing']``."""
+    section = cfg.get('routing') or {}
+    key = _section_key(section)
+    with _router_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = _routers[key] = HedgedRouter.from_config(section, call_openrouter, local_fallback)
+        return router
+
+
+def get_limiter(cfg: Dict[str, Any]) -> Optional[RequestLimiter]:
+    """Shared limiter built from the ``openrouter`` section; None if no rate limit is configured."""
+    section = cfg.get('openrouter') or {}
+    key = _section_key(section)
+    with _limiter_lock:
+        if key not in _limiters:
+            _limiters[key] = RequestLimiter.from_config(section)
+        return _limiters[key]
+
+
+def get_client():
+    """Long-lived OpenRouter client so connections are reused; rebuilt if the SDK module or API key changes."""
+    global _client, _client_owner
+    import openrouter
+    api_key = os.environ.get(OPENROUTER_API_KEY_ENV)
+    with _client_lock:
+        if _client is None or _client_owner[0] is not openrouter or _client_owner[1] != api_key:
+            _client = openrouter.OpenRouter(api_key=api_key)
+            _client_owner = (openrouter, api_key)
+        return _client
 
 
 def call_openrouter(prompt: str):
     # Try to import openrouter SDK; if not present, raise
     try:
-        import openrouter
-        client = openrouter.OpenRouter(api_key=os.environ.get(OPENROUTER_API_KEY_ENV))
+        client = get_client()
         resp = client.complete(prompt=prompt)
         return resp.get('text')
     except Exception as e:
@@ -30,18 +265,40 @@ def local_fallback(prompt: str):
     return f"(local) Echo: {prompt[:200]}"
 
 
-def respond(prompt: str):
-    # Try primary then fallback
+def respond(prompt: str, intent: Optional[str] = None, config: Optional[Dict[str, Any]] = None):
+    """Answer ``prompt``; ``config`` replaces ai.yaml, and calls with equal config sections share state."""
+    cfg = get_agent_config() if config is None else config
+    if intent is not None and intent in ((cfg.get('routing') or {}).get('local_intents') or ()):
+        # low-latency intents never wait on the network
+        return get_router(cfg).call_local(prompt)
+    cache = key = None
+    if intent is not None and intent in ((cfg.get('cache') or {}).get('intents') or ()):
+        cache = get_cache(cfg)
+        remote = cfg.get('openrouter') or {}
+        key = cache_key(prompt, {'backend': 'openrouter', 'model': remote.get('model')})
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    # Try primary (hedged with the local model) then fallback
     if os.environ.get(OPENROUTER_API_KEY_ENV):
-        try:
-            return call_openrouter(prompt)
-        except Exception:
-            logger.info('Falling back to local model')
-    return local_fallback(prompt)
+        limiter = get_limiter(cfg)
+        if limiter is not None and not limiter.acquire():
+            logger.info('OpenRouter budget exhausted; using local model')
+        else:
+            try:
+                text, backend, elapsed = get_router(cfg).route(prompt)
+                if cache is not None and backend == 'openrouter' and text is not None:
+                    cache.put(key, text, elapsed)  # written to disk by the cache's autosave, not here
+                return text
+            except Exception:
+                logger.info('Falling back to local model')
+    # local replies are cheap and should not outlive the remote outage, so they are not cached
+    return get_router(cfg).call_local(prompt)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--prompt', required=True)
+    parser.add_argument('--intent', help='e.g. status_query; cached if listed under cache.intents in ai.yaml')
     args = parser.parse_args()
-    print(respond(args.prompt))
+    print(respond(args.prompt, args.intent))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Response cache for the AI agent: TTL + LRU, bounded in bytes, persisted to disk.
+
+Keys are a hash of the normalized prompt (case-folded, whitespace collapsed)
+plus the model settings, so "Battery status?" and "battery  status?" share an
+entry while a model change does not. Entries expire ``ttl_seconds`` after they
+were stored (wall clock, so expiry holds across restarts); beyond
+``max_entries`` or ``max_bytes`` the least recently used entries are evicted.
+
+Each entry remembers how long the original call took; a hit adds that to
+``picrawler_ai_cache_saved_seconds_total``.
+
+Changes are written back by ``start_autosave`` every ``save_interval_seconds``
+and at exit, never on the request path.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger("ai_cache")
+
+DEFAULT_PATH = os.environ.get('PICRAWLER_AI_CACHE_PATH', os.path.expanduser('~/.cache/picrawler/ai_responses.json'))
+
+CACHE_REQUESTS = Counter("picrawler_ai_cache_requests_total", "AI response cache lookups by result (hit, miss)",
+                         ['result'])
+CACHE_EVICTIONS = Counter("picrawler_ai_cache_evictions_total", "AI response cache evictions by reason (ttl, lru)",
+                          ['reason'])
+CACHE_SAVED = Counter("picrawler_ai_cache_saved_seconds_total", "Model latency avoided by AI response cache hits")
+CACHE_BYTES = Gauge("picrawler_ai_cache_bytes", "Bytes of responses held by the AI response cache")
+CACHE_ENTRIES = Gauge("picrawler_ai_cache_entries", "Entries held by the AI response cache")
+
+
+def normalize(prompt: str) -> str:
+    return ' '.join(prompt.casefold().split())
+
+
+def cache_key(prompt: str, settings: Optional[Dict[str, Any]] = None) -> str:
+    raw = json.dumps([normalize(prompt), settings or {}], sort_keys=True)
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: Optional[str] = DEFAULT_PATH, ttl_seconds: float = 600, max_entries: int = 512,
+                 max_bytes: int = 1 << 20, save_interval: float = 60.0):
+        """``path=None`` keeps the cache in memory only."""
+        self.path = os.path.expanduser(path) if path else None
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[str, list]' = OrderedDict()  # key -> [stored_at, text, latency, size]
+        self.bytes = 0
+        self.save_interval = save_interval
+        self._dirty = False  # entries changed since the last save
+        self._saver = None
+        self._lock = threading.Lock()
+        if self.path:
+            self.load()
+            self._dirty = False
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> 'ResponseCache':
+        return cls(cfg.get('path', DEFAULT_PATH), float(cfg.get('ttl_seconds', 600)),
+                   int(cfg.get('max_entries', 512)), int(cfg.get('max_bytes', 1 << 20)),
+                   float(cfg.get('save_interval_seconds', 60)))
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] >= self.ttl_seconds:
+                self._drop(key, 'ttl')
+                entry = None
+            if entry is None:
+                CACHE_REQUESTS.labels('miss').inc()
+                return None
+            self.entries.move_to_end(key)
+        CACHE_REQUESTS.labels('hit').inc()
+        CACHE_SAVED.inc(entry[2])
+        return entry[1]
+
+    def put(self, key: str, text: str, latency: float = 0.0, now: Optional[float] = None):
+        size = len(key) + len(text.encode())
+        if size > self.max_bytes:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            if key in self.entries:
+                self._drop(key, None)
+            self.entries[key] = [now, text, latency, size]
+            self.bytes += size
+            self._dirty = True
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)), 'lru')
+            self._publish()
+
+    def _drop(self, key: str, reason: Optional[str]):
+        self._dirty = True
+        self.bytes -= self.entries.pop(key)[3]
+        if reason:
+            CACHE_EVICTIONS.labels(reason).inc()
+        self._publish()
+
+    def _publish(self):
+        CACHE_BYTES.set(self.bytes)
+        CACHE_ENTRIES.set(len(self.entries))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def save(self):
+        """Write the entries to ``path`` if they changed since the last save."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [[k] + e[:3] for k, e in self.entries.items()]  # LRU order, oldest first
+            self._dirty = False
+        try:
+            d = os.path.dirname(self.path) or '.'
+            os.makedirs(d, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=d, prefix='.ai_responses-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'entries': entries}, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            logger.exception("Failed to persist AI response cache to %s", self.path)
+            self._dirty = True
+
+    def start_autosave(self):
+        """Save every ``save_interval`` seconds from a background thread, and once more at exit."""
+        if not self.path or self._saver is not None:
+            return
+        atexit.register(self.save)
+
+        def loop():
+            while True:
+                time.sleep(self.save_interval)
+                self.save()
+        self._saver = threading.Thread(target=loop, name='ai-cache-save', daemon=True)
+        self._saver.start()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("Ignoring unreadable AI response cache %s", self.path)
+            return
+        now = time.time()
+        for key, stored_at, text, latency in data.get('entries', []):
+            if now - stored_at < self.ttl_seconds:
+                self.put(key, text, latency, now=stored_at)
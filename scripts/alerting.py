@@ -1,40 +1,143 @@
 #!/usr/bin/env python3
-"""Operator alerting via webhook with retries and simple rate limiting."""
+"""Operator alerting via webhook with retries and per-rule rate limiting.
+
+``send_alert`` posts synchronously. Long-running callers (enforcement) use
+AlertDispatcher instead: ``enqueue`` returns immediately, and a background thread
+writes alerts to an on-disk outbox, coalesces whatever arrives within
+``coalesce_seconds`` into one batched webhook payload, and posts it over a pooled
+session, retrying with backoff until delivered. Undelivered alerts survive a
+restart in the outbox.
+
+Both paths are rate limited in memory per ``(rule_id, severity)`` of the alert
+payload (AlertRateLimiter); critical alerts bypass the limit by default.
+"""
 import os
+import re
 import time
 import json
 import logging
-from typing import Dict
+import queue
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
 
 import requests
+import yaml
+from prometheus_client import Counter, Gauge
+
+from scripts.ratelimit import TokenBucket
 
 logger = logging.getLogger("alerting")
-RATE_LIMIT_SECONDS = int(os.environ.get('PICRAWLER_ALERT_RATE_LIMIT', '10'))
-LAST_ALERT_PATH = '/tmp/picrawler_last_alert'
+RATE_LIMIT_SECONDS = float(os.environ.get('PICRAWLER_ALERT_RATE_LIMIT', '10'))
 
+ALERT_BATCHES = Counter("picrawler_alert_batches_total", "Alert webhook batches by outcome (sent, failed)", ['outcome'])
+ALERTS_DELIVERED = Counter("picrawler_alerts_delivered_total", "Alerts delivered to the webhook")
+ALERTS_DROPPED = Counter("picrawler_alerts_dropped_total", "Alerts dropped because the in-memory queue was full")
+ALERTS_RATE_LIMITED = Counter("picrawler_alerts_rate_limited_total", "Alerts suppressed by the rate limiter",
+                              ['severity'])
+OUTBOX_PENDING = Gauge("picrawler_alert_outbox_pending", "Alerts waiting in the outbox")
 
-def can_send_alert():
-    try:
-        if os.path.exists(LAST_ALERT_PATH):
-            with open(LAST_ALERT_PATH, 'r') as f:
-                last = float(f.read().strip())
-            if time.time() - last < RATE_LIMIT_SECONDS:
-                return False
-    except Exception:
-        logger.exception("Failed to read last alert timestamp")
-    return True
 
+class AlertRateLimiter:
+    """Per ``(rule_id, severity)`` token buckets held in memory.
 
-def mark_alert_sent():
-    try:
-        with open(LAST_ALERT_PATH, 'w') as f:
-            f.write(str(time.time()))
-    except Exception:
-        logger.exception("Failed to write last alert timestamp")
+    Each rule/severity pair gets its own bucket, so a chatty medium-severity rule
+    cannot use up the budget of a critical one; severities in ``bypass`` are never
+    limited. ``severities`` overrides ``per_seconds``/``burst`` per severity. State
+    can be written to ``persist_path`` by a background thread so limits survive a
+    restart; ``allow`` itself never touches the filesystem.
+    """
+
+    def __init__(self, per_seconds: float = RATE_LIMIT_SECONDS, burst: float = 1, bypass=('critical',),
+                 severities: Dict[str, Dict[str, float]] = None, persist_path: str = None):
+        self.per_seconds = per_seconds
+        self.burst = burst
+        self.bypass = frozenset(bypass or ())
+        self.severities = severities or {}
+        self.persist_path = persist_path
+        self.buckets: Dict[tuple, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if persist_path:
+            self.load()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> 'AlertRateLimiter':
+        """Build from an alerts.yaml profile (``rate_limit`` section, falling back to ``rate_limit_seconds``)."""
+        rl = cfg.get('rate_limit') or {}
+        return cls(per_seconds=float(rl.get('per_seconds', cfg.get('rate_limit_seconds', RATE_LIMIT_SECONDS))),
+                   burst=float(rl.get('burst', 1)), bypass=rl.get('bypass_severities', ('critical',)),
+                   severities=rl.get('severities'), persist_path=rl.get('persist_path') or None)
+
+    def allow(self, rule_id: Optional[str], severity: Optional[str], now: float = None) -> bool:
+        if severity in self.bypass:
+            return True
+        now = time.monotonic() if now is None else now
+        key = (rule_id, severity)
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                opts = self.severities.get(severity) or {}
+                bucket = self.buckets[key] = TokenBucket(float(opts.get('per_seconds', self.per_seconds)),
+                                                         float(opts.get('burst', self.burst)))
+            return bucket.take(now)
+
+    def save(self):
+        # monotonic time does not survive a restart; store how long ago each bucket was updated
+        now = time.monotonic()
+        with self._lock:
+            state = [[rid, sev, b.tokens, now - b.updated] for (rid, sev), b in self.buckets.items()
+                     if b.updated is not None]
+        try:
+            d = os.path.dirname(self.persist_path) or '.'
+            os.makedirs(d, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=d, prefix='.ratelimit-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'saved_at': time.time(), 'buckets': state}, f)
+            os.replace(tmp, self.persist_path)
+        except OSError:
+            logger.exception("Failed to persist alert rate limits to %s", self.persist_path)
+
+    def load(self):
+        try:
+            with open(self.persist_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("Ignoring unreadable alert rate limit state %s", self.persist_path)
+            return
+        now = time.monotonic()
+        downtime = max(0.0, time.time() - data.get('saved_at', time.time()))
+        for rid, sev, tokens, age in data.get('buckets', []):
+            opts = self.severities.get(sev) or {}
+            self.buckets[(rid, sev)] = TokenBucket(float(opts.get('per_seconds', self.per_seconds)),
+                                                   float(opts.get('burst', self.burst)), tokens,
+                                                   now - age - downtime)
 
+    def start_persistence(self, interval: float = 60.0) -> threading.Thread:
+        def loop():
+            while not self._stop.wait(interval):
+                self.save()
+        t = threading.Thread(target=loop, name='alert-ratelimit-persist', daemon=True)
+        t.start()
+        return t
 
-def send_alert(webhook_url: str, payload: Dict, retries: int = 3, backoff: float = 1.0) -> bool:
-    if not can_send_alert():
+    def stop(self):
+        self._stop.set()
+        if self.persist_path:
+            self.save()
+
+
+_limiter = AlertRateLimiter()
+
+
+def send_alert(webhook_url: str, payload: Dict, retries: int = 3, backoff: float = 1.0,
+               limiter: AlertRateLimiter = None) -> bool:
+    """Post ``payload`` now, subject to the rate limit for its ``rule_id``/``severity``."""
+    limiter = limiter or _limiter
+    if not limiter.allow(payload.get('rule_id'), payload.get('severity')):
+        ALERTS_RATE_LIMITED.labels(payload.get('severity') or 'none').inc()
         logger.info("Rate limit in effect; skipping alert")
         return False
 
@@ -44,7 +147,6 @@ def send_alert(webhook_url: str, payload: Dict, retries: int = 3, backoff: float
             r = requests.post(webhook_url, json=payload, headers=headers, timeout=5)
             if r.status_code >= 200 and r.status_code < 300:
                 logger.info("Alert sent successfully")
-                mark_alert_sent()
                 return True
             else:
                 logger.warning("Alert failed with status %s: %s", r.status_code, r.text)
@@ -53,3 +155,190 @@ def send_alert(webhook_url: str, payload: Dict, retries: int = 3, backoff: float
         time.sleep(backoff * attempt)
     logger.error("All alert attempts failed")
     return False
+
+
+ALERT_CONFIG_PATH = 'config/alerts.yaml'
+DEFAULT_OUTBOX = os.environ.get('PICRAWLER_ALERT_OUTBOX', os.path.expanduser('~/.cache/picrawler/alert_outbox.json'))
+MAX_RETRY_DELAY = 60.0
+
+_ENV_REF = re.compile(r'\$\{(\w+)(?::-([^}]*))?\}')
+
+
+def load_alert_config(path: str = ALERT_CONFIG_PATH, profile: str = 'default') -> Dict[str, Any]:
+    """Read one profile of config/alerts.yaml, expanding ``${VAR:-default}`` references."""
+    try:
+        with open(path, 'r') as fh:
+            cfg = (yaml.safe_load(fh) or {}).get(profile) or {}
+    except OSError:
+        return {}
+    return {k: _ENV_REF.sub(lambda m: os.environ.get(m.group(1), m.group(2) or ''), v) if isinstance(v, str) else v
+            for k, v in cfg.items()}
+
+
+class AlertDispatcher:
+    def __init__(self, webhook_url: str, outbox_path: str = DEFAULT_OUTBOX, coalesce_seconds: float = 1.0,
+                 max_batch: int = 50, retries: int = 3, backoff: float = 1.0, timeout: float = 5.0,
+                 max_queue: int = 1000, session: requests.Session = None, limiter: AlertRateLimiter = None):
+        self.webhook_url = webhook_url
+        self.limiter = limiter
+        self.outbox_path = outbox_path
+        self.coalesce_seconds = coalesce_seconds
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.pending: List[Dict[str, Any]] = self._load_outbox()
+        OUTBOX_PENDING.set(len(self.pending))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enqueue(self, payload: Dict[str, Any]) -> bool:
+        """Queue an alert without blocking; False if it is rate limited or the queue is full."""
+        if self.limiter is not None and not self.limiter.allow(payload.get('rule_id'), payload.get('severity')):
+            ALERTS_RATE_LIMITED.labels(payload.get('severity') or 'none').inc()
+            return False
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except queue.Full:
+            ALERTS_DROPPED.inc()
+            logger.error("Alert queue full; dropping alert")
+            return False
+
+    def _load_outbox(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.outbox_path, 'r') as f:
+                pending = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError):
+            logger.exception("Unreadable alert outbox %s; starting empty", self.outbox_path)
+            return []
+        if pending:
+            logger.info("Recovered %d undelivered alerts from %s", len(pending), self.outbox_path)
+        return pending
+
+    def _save_outbox(self):
+        OUTBOX_PENDING.set(len(self.pending))
+        try:
+            if not self.pending:
+                if os.path.exists(self.outbox_path):
+                    os.unlink(self.outbox_path)
+                return
+            d = os.path.dirname(self.outbox_path) or '.'
+            os.makedirs(d, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=d, prefix='.outbox-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.pending, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.outbox_path)
+        except OSError:
+            logger.exception("Failed to write alert outbox %s", self.outbox_path)
+
+    def _drain(self, block_seconds: Optional[float]) -> bool:
+        """Move queued alerts into ``pending``; waits up to ``block_seconds`` for the first."""
+        try:
+            self.pending.append(self.queue.get(timeout=block_seconds) if block_seconds else self.queue.get_nowait())
+        except queue.Empty:
+            return False
+        while True:
+            try:
+                self.pending.append(self.queue.get_nowait())
+            except queue.Empty:
+                return True
+
+    @staticmethod
+    def coalesce(alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """One webhook payload for ``alerts``.
+
+        Alerts with the same ``(rule_id, severity, message)`` are sent once (the
+        first of them) with a count and the first/last ``ts`` seen.
+        """
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for a in alerts:
+            key = (a.get('rule_id'), a.get('severity'), a.get('message'))
+            ts = a.get('ts')
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = {'alert': a, 'count': 1, 'first_ts': ts, 'last_ts': ts}
+                continue
+            entry['count'] += 1
+            if ts is not None:
+                entry['first_ts'] = ts if entry['first_ts'] is None else min(entry['first_ts'], ts)
+                entry['last_ts'] = ts if entry['last_ts'] is None else max(entry['last_ts'], ts)
+        return {'alerts': list(merged.values()), 'total': len(alerts)}
+
+    def post_batch(self, alerts: List[Dict[str, Any]]) -> bool:
+        try:
+            r = self.session.post(self.webhook_url, json=self.coalesce(alerts), timeout=self.timeout)
+            if 200 <= r.status_code < 300:
+                ALERT_BATCHES.labels('sent').inc()
+                ALERTS_DELIVERED.inc(len(alerts))
+                return True
+            logger.warning("Alert batch failed with status %s: %s", r.status_code, r.text[:200])
+        except Exception as e:
+            logger.warning("Exception when sending alert batch: %s", e)
+        ALERT_BATCHES.labels('failed').inc()
+        return False
+
+    def run(self):
+        failures = 0
+        while not self._stop.is_set():
+            if not self.pending and not self._drain(0.5):
+                continue
+            # persist first, then give related alerts a moment to arrive and join the batch
+            self._save_outbox()
+            if self._stop.wait(self.coalesce_seconds):
+                break
+            self._drain(None)
+            batch = self.pending[:self.max_batch]
+            if self.post_batch(batch):
+                failures = 0
+                del self.pending[:len(batch)]
+                self._save_outbox()
+                continue
+            failures += 1
+            delay = min(MAX_RETRY_DELAY, self.backoff * failures)
+            if failures >= self.retries:
+                logger.error("Alert batch failed %d times; keeping %d alerts in the outbox", failures,
+                             len(self.pending))
+            self._stop.wait(delay)
+        self._drain(None)
+        self._save_outbox()
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.run, name='alert-dispatcher', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.session.close()
+
+
+_dispatcher = None
+_dispatcher_checked = False
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(config_path: str = ALERT_CONFIG_PATH) -> Optional[AlertDispatcher]:
+    """Shared dispatcher for the configured webhook, started on first use; None if no webhook is set."""
+    global _dispatcher, _dispatcher_checked
+    with _dispatcher_lock:
+        if not _dispatcher_checked:
+            _dispatcher_checked = True
+            cfg = load_alert_config(config_path)
+            if not cfg.get('webhook_url'):
+                return None
+            opts = {k: cfg[k] for k in ('coalesce_seconds', 'retries', 'outbox_path') if k in cfg}
+            limiter = AlertRateLimiter.from_config(cfg)
+            if limiter.persist_path:
+                limiter.start_persistence(float((cfg.get('rate_limit') or {}).get('persist_interval_seconds', 60)))
+            _dispatcher = AlertDispatcher(cfg['webhook_url'], limiter=limiter, **opts)
+            _dispatcher.start()
+        return _dispatcher
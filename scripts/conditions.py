@@ -0,0 +1,259 @@
+"""Compiler for rule trigger conditions.
+
+Conditions are parsed once when a rule loads and turned into a plain Python
+callable ``pred(value, metrics) -> bool`` so the watchdog hot path never touches
+strings. ``value`` is the sample of the rule's own ``trigger.metric`` and
+``metrics`` is the full snapshot, used when a clause names another metric.
+
+Grammar (keywords are case-insensitive):
+
+    expr    := term ('or' term)*
+    term    := factor ('and' factor)*
+    factor  := 'not' factor | '(' expr ')' | clause
+    clause  := [metric] OP number [('+/-' | '±') number]
+             | [metric] 'between' number 'and' number
+
+Examples: ``"< 6.0"``, ``"between 5.5 and 6.0"``, ``"== 1 +/- 0.01"``,
+``"> 85 and picrawler_battery_voltage_volts < 6.0"``.
+
+A clause without a metric name compares the trigger metric. A clause naming a
+metric that is missing from the snapshot evaluates to False.
+"""
+import operator
+import re
+from typing import Any, Callable, List, Mapping, Optional, Tuple
+
+OP_MAP = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+Predicate = Callable[[float, Optional[Mapping[str, float]]], bool]
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+      (?P<num>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+     |(?P<tol>\+/-|±)
+     |(?P<op>>=|<=|==|!=|>|<)
+     |(?P<paren>[()])
+     |(?P<name>[A-Za-z_:][A-Za-z0-9_:]*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {'and', 'or', 'not', 'between'}
+
+
+class ConditionError(ValueError):
+    """Raised when a trigger condition cannot be parsed."""
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise ConditionError(f"unexpected input at {pos} in condition {text!r}")
+        kind = m.lastgroup
+        val = m.group(kind)
+        if kind == 'name' and val.lower() in _KEYWORDS:
+            kind, val = 'kw', val.lower()
+        tokens.append((kind, val))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else ('eof', '')
+
+    def take(self, kind: str, val: Optional[str] = None) -> str:
+        k, v = self.peek()
+        if k != kind or (val is not None and v != val):
+            want = val or kind
+            raise ConditionError(f"expected {want!r} but found {v or 'end'!r} in condition {self.text!r}")
+        self.pos += 1
+        return v
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise ConditionError("empty condition")
+        node = self.expr()
+        if self.pos != len(self.tokens):
+            raise ConditionError(f"trailing input {self.peek()[1]!r} in condition {self.text!r}")
+        return node
+
+    def expr(self) -> tuple:
+        parts = [self.term()]
+        while self.peek() == ('kw', 'or'):
+            self.pos += 1
+            parts.append(self.term())
+        return parts[0] if len(parts) == 1 else ('or', parts)
+
+    def term(self) -> tuple:
+        parts = [self.factor()]
+        while self.peek() == ('kw', 'and'):
+            self.pos += 1
+            parts.append(self.factor())
+        return parts[0] if len(parts) == 1 else ('and', parts)
+
+    def factor(self) -> tuple:
+        if self.peek() == ('kw', 'not'):
+            self.pos += 1
+            return ('not', self.factor())
+        if self.peek() == ('paren', '('):
+            self.pos += 1
+            inner = self.expr()
+            self.take('paren', ')')
+            return inner
+        return self.clause()
+
+    def number(self) -> float:
+        return float(self.take('num'))
+
+    def clause(self) -> tuple:
+        metric = None
+        if self.peek()[0] == 'name':
+            metric = self.take('name')
+        if self.peek() == ('kw', 'between'):
+            self.pos += 1
+            lo = self.number()
+            self.take('kw', 'and')
+            hi = self.number()
+            if lo > hi:
+                raise ConditionError(f"empty range {lo} .. {hi} in condition {self.text!r}")
+            return ('between', metric, lo, hi)
+        op_sym = self.take('op')
+        thr = self.number()
+        tol = None
+        if self.peek()[0] == 'tol':
+            self.pos += 1
+            tol = abs(self.number())
+            if op_sym not in ('==', '!='):
+                raise ConditionError(f"tolerance only applies to == and != in condition {self.text!r}")
+        return ('cmp', metric, op_sym, thr, tol)
+
+
+def _scalar_test(node: tuple) -> Callable[[float], bool]:
+    if node[0] == 'between':
+        _, _, lo, hi = node
+        return lambda x: lo <= x <= hi
+    _, _, op_sym, thr, tol = node
+    if tol is not None and op_sym == '==':
+        return lambda x: abs(x - thr) <= tol
+    if tol is not None:
+        return lambda x: abs(x - thr) > tol
+    op = OP_MAP[op_sym]
+    return lambda x: op(x, thr)
+
+
+def _build_scalar(node: tuple) -> Predicate:
+    kind = node[0]
+    if kind == 'or':
+        parts = [_build_scalar(n) for n in node[1]]
+        return lambda v, m: any(p(v, m) for p in parts)
+    if kind == 'and':
+        parts = [_build_scalar(n) for n in node[1]]
+        return lambda v, m: all(p(v, m) for p in parts)
+    if kind == 'not':
+        inner = _build_scalar(node[1])
+        return lambda v, m: not inner(v, m)
+    test = _scalar_test(node)
+    metric = node[1]
+    if metric is None:
+        return lambda v, m: test(v)
+
+    def cross(v, m):
+        if m is None:
+            return False
+        x = m.get(metric)
+        return x is not None and test(x)
+    return cross
+
+
+def _build_vector(node: tuple, np) -> Callable:
+    kind = node[0]
+    if kind in ('or', 'and'):
+        parts = [_build_vector(n, np) for n in node[1]]
+        combine = np.logical_or if kind == 'or' else np.logical_and
+
+        def fold(v, m):
+            out = parts[0](v, m)
+            for p in parts[1:]:
+                out = combine(out, p(v, m))
+            return out
+        return fold
+    if kind == 'not':
+        inner = _build_vector(node[1], np)
+        return lambda v, m: ~inner(v, m)
+    if kind == 'between':
+        _, metric, lo, hi = node
+        test = lambda x: (x >= lo) & (x <= hi)  # noqa: E731
+    else:
+        _, metric, op_sym, thr, tol = node
+        if tol is not None and op_sym == '==':
+            test = lambda x: np.abs(x - thr) <= tol  # noqa: E731
+        elif tol is not None:
+            test = lambda x: np.abs(x - thr) > tol  # noqa: E731
+        else:
+            op = OP_MAP[op_sym]
+            test = lambda x: op(x, thr)  # noqa: E731
+    if metric is None:
+        return lambda v, m: test(v)
+
+    def cross(v, m):
+        x = m.get(metric)
+        if x is None:
+            return np.zeros(len(v), dtype=bool)
+        # missing samples (NaN) never satisfy a clause, mirroring the snapshot path
+        return ~np.isnan(x) & test(x)
+    return cross
+
+
+def parse_condition(text: Any) -> tuple:
+    """Parse a condition string into a small tuple tree.
+
+    Raises ConditionError for anything that does not parse.
+    """
+    if not isinstance(text, str):
+        raise ConditionError(f"condition must be a string, got {type(text).__name__}")
+    return _Parser(text).parse()
+
+
+def compile_condition(text: Any) -> Predicate:
+    """Compile a condition string (or parsed tree) into ``pred(value, metrics) -> bool``.
+
+    Raises ConditionError for anything that does not parse.
+    """
+    node = text if isinstance(text, tuple) else parse_condition(text)
+    return _build_scalar(node)
+
+
+def compile_vector_condition(node: tuple) -> Callable:
+    """Compile a parsed condition into a NumPy predicate.
+
+    The result is ``vpred(values, arrays) -> bool ndarray`` where ``values`` holds
+    the trigger metric samples and ``arrays`` maps other metric names to arrays
+    aligned with ``values`` (NaN marks a missing sample).
+    """
+    import numpy as np
+    return _build_vector(node, np)
+
+
+def referenced_metrics(node: tuple) -> List[str]:
+    """Return the metric names a parsed condition refers to explicitly."""
+    if node[0] in ('or', 'and'):
+        return [name for n in node[1] for name in referenced_metrics(n)]
+    if node[0] == 'not':
+        return referenced_metrics(node[1])
+    return [node[1]] if node[1] else []
@@ -7,16 +7,122 @@ callable by the Watchdog agent.
 import subprocess
 import logging
 import os
-from typing import List
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Tuple
+
+from prometheus_client import Counter, Histogram
 
 logger = logging.getLogger("enforcement")
 
+ACTION_SECONDS = Histogram(
+    "picrawler_enforcement_action_duration_seconds", "Time spent in each enforcement action handler", ['action'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+ACTION_OUTCOMES = Counter(
+    "picrawler_enforcement_actions_total", "Enforcement actions by outcome (ok, failed, timeout, unknown)",
+    ['action', 'outcome'])
+ACTIONS_EXECUTED = Counter(
+    "picrawler_enforcement_gate_executed_total", "Rule actions let through the cooldown/fire-once gate",
+    ['rule', 'action'])
+ACTIONS_SUPPRESSED = Counter(
+    "picrawler_enforcement_gate_suppressed_total", "Rule actions held back by the gate (reason: cooldown, latched)",
+    ['rule', 'action', 'reason'])
+
+
+class MotorBackend:
+    """Motor controller handle opened once and kept warm for stop_motors.
+
+    The cold path imports robot_hat and builds ``Motors()`` on every stop; here
+    that cost is paid once at startup. If the handle fails during a stop, the
+    fallback (``systemctl stop``) runs and the handle is dropped; a background
+    thread reopens a missing handle every ``reopen_interval`` seconds. robot_hat
+    offers no way to probe a live handle without driving the motors, so a lost
+    handle is only noticed when a stop through it fails.
+    """
+
+    def __init__(self, service: str = 'picrawler.service', reopen_interval: float = 10.0,
+                 fallback_cmd: List[str] = None):
+        systemctl = shutil.which('systemctl') or 'systemctl'
+        self.fallback_cmd = fallback_cmd or [systemctl, 'stop', service]
+        self.reopen_interval = reopen_interval
+        self.motors = None
+        self._stop_reopen = threading.Event()
+        self._reopen_thread = None
+
+    def open(self) -> bool:
+        try:
+            import robot_hat
+            if hasattr(robot_hat, 'Motors'):
+                self.motors = robot_hat.Motors()
+        except Exception:
+            logger.warning("robot_hat motor controller unavailable; stop_motors will use %s", self.fallback_cmd)
+            self.motors = None
+        return self.motors is not None
+
+    def stop(self) -> bool:
+        motors = self.motors
+        if motors is not None:
+            try:
+                motors.stop()
+                logger.info("Motors stopped via warm robot_hat handle")
+                return True
+            except Exception:
+                logger.exception("Warm robot_hat handle failed to stop motors")
+                self.motors = None  # reopened in the background
+        return self._fallback_stop()
+
+    def _fallback_stop(self) -> bool:
+        try:
+            return subprocess.run(self.fallback_cmd, timeout=ACTION_DEADLINE_SECONDS['stop_motors']).returncode == 0
+        except Exception:
+            logger.exception("Fallback motor stop failed")
+            return False
+
+    def reopen_if_lost(self) -> bool:
+        """Reopen the handle if a failed stop dropped it; returns whether a handle is open."""
+        if self.motors is None:
+            return self.open()
+        return True
+
+    def start_reopen(self):
+        def loop():
+            while not self._stop_reopen.wait(self.reopen_interval):
+                try:
+                    self.reopen_if_lost()
+                except Exception:
+                    logger.exception("Reopening the motor controller failed")
+        self._reopen_thread = threading.Thread(target=loop, name='motor-reopen', daemon=True)
+        self._reopen_thread.start()
+
+    def close(self):
+        self._stop_reopen.set()
+
+
+_motor_backend = None
+
+
+def warm_motor_backend(**kwargs) -> MotorBackend:
+    """Open the motor controller now so later stop_motors calls skip import and setup."""
+    global _motor_backend
+    if _motor_backend is not None:
+        _motor_backend.close()
+    backend = MotorBackend(**kwargs)
+    backend.open()
+    backend.start_reopen()
+    _motor_backend = backend
+    return backend
+
 
 def stop_motors(dry_run: bool = True) -> bool:
     logger.info("Enforcement: stop_motors (dry_run=%s)", dry_run)
     if dry_run:
         return True
-    # Try to use robot_hat API if available
+    if _motor_backend is not None:
+        return _motor_backend.stop()
+    # Cold path: try to use robot_hat API if available
     try:
         import robot_hat
         try:
@@ -32,7 +138,8 @@ def stop_motors(dry_run: bool = True) -> bool:
 
     # Fallback: try to stop a known systemd service that controls motors
     try:
-        subprocess.run(["systemctl", "stop", "picrawler.service"], check=True)
+        subprocess.run(["systemctl", "stop", "picrawler.service"], check=True,
+                       timeout=ACTION_DEADLINE_SECONDS['stop_motors'])
         logger.info("picrawler.service stopped via systemctl")
         return True
     except Exception:
@@ -40,11 +147,30 @@ def stop_motors(dry_run: bool = True) -> bool:
         return False
 
 
+_cpu_throttler = None
+
+
+def get_cpu_throttler():
+    """Process-wide CpuThrottler, created on first use (see scripts/throttle.py)."""
+    global _cpu_throttler
+    if _cpu_throttler is None:
+        from scripts.throttle import CpuThrottler
+        _cpu_throttler = CpuThrottler()
+    return _cpu_throttler
+
+
 def throttle_cpu(dry_run: bool = True) -> bool:
     logger.info("Enforcement: throttle_cpu (dry_run=%s)", dry_run)
     if dry_run:
         return True
-    # Best-effort: write a flag file that operator tools can read and act on.
+    # Lower cgroup cpu.max on the PiCrawler slices; the throttler relaxes it as temperature recovers.
+    try:
+        if get_cpu_throttler().engage():
+            return True
+        logger.warning("No writable cgroup for CPU throttling; writing flag file instead")
+    except Exception:
+        logger.exception("CPU throttling failed")
+    # Fallback: write a flag file that operator tools can read and act on.
     try:
         with open('/tmp/picrawler_throttle_enabled', 'w') as f:
             f.write('1')
@@ -55,9 +181,16 @@ def throttle_cpu(dry_run: bool = True) -> bool:
         return False
 
 
-def alert_operator(message: str) -> bool:
-    # Simple alert via log for now; can be extended to send email, webhook, or push notification
-    logger.warning("ALERT OPERATOR: %s", message)
+def alert_operator(message: str, rule_id: str = None, severity: str = None, dry_run: bool = True) -> bool:
+    logger.warning("ALERT OPERATOR: %s (dry_run=%s)", message, dry_run)
+    if dry_run:
+        return True
+    # Queue for the webhook (config/alerts.yaml) if one is configured; never waits on the network.
+    # rule_id/severity select the rate-limit bucket.
+    from scripts.alerting import get_dispatcher
+    dispatcher = get_dispatcher()
+    if dispatcher is not None:
+        return dispatcher.enqueue({'message': message, 'rule_id': rule_id, 'severity': severity, 'ts': time.time()})
     return True
 
 
@@ -66,7 +199,8 @@ def attempt_restart_agent(agent_name: str, dry_run: bool = True) -> bool:
     if dry_run:
         return True
     try:
-        subprocess.run(["systemctl", "restart", agent_name], check=True)
+        subprocess.run(["systemctl", "restart", agent_name], check=True,
+                       timeout=ACTION_DEADLINE_SECONDS['attempt_restart_agent'])
         logger.info("Restarted %s via systemctl", agent_name)
         return True
     except Exception:
@@ -82,30 +216,188 @@ ACTION_MAP = {
 }
 
 
-def perform_actions(actions: List[str], dry_run: bool = True):
-    results = []
-    for a in actions:
-        # allow actions that are strings or dicts with params
-        if isinstance(a, dict):
-            name = list(a.keys())[0]
-            val = a[name]
+# Lower runs first. stop_motors always runs first, inline on the caller's thread.
+ACTION_PRIORITY = {
+    'stop_motors': 0,
+    'throttle_cpu_tasks': 10,
+    'attempt_restart_agent': 20,
+    'alert_operator': 30,
+}
+INLINE_ACTIONS = {'stop_motors'}
+DEFAULT_ACTION_DEADLINE = 5.0
+ACTION_DEADLINE_SECONDS = {
+    'stop_motors': 2.0,
+    'throttle_cpu_tasks': 2.0,
+    'attempt_restart_agent': 10.0,
+    'alert_operator': 5.0,
+}
+_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='enforcement')
+
+
+def _run_action(name: str, handler, val, dry_run: bool, rule_id: str = None, severity: str = None) -> bool:
+    start = time.perf_counter()
+    try:
+        if name == 'alert_operator':
+            ok = handler(val if val else f'Alert from rules engine: {rule_id or "unknown rule"}',
+                         rule_id=rule_id, severity=severity, dry_run=dry_run)
+        elif name == 'attempt_restart_agent':
+            ok = handler(val if val else 'picrawler.service', dry_run=dry_run)
         else:
-            name = a
-            val = None
+            ok = handler(dry_run=dry_run)
+        ok = bool(ok)
+    except Exception:
+        logger.exception("Error performing action: %s", name)
+        ok = False
+    ACTION_SECONDS.labels(name).observe(time.perf_counter() - start)
+    return ok
+
+
+def action_name(action) -> str:
+    """Name of an enforcement_action entry (a string or a one-key ``{name: param}`` dict)."""
+    return next(iter(action)) if isinstance(action, dict) else action
+
+
+class ActionGate:
+    """Decides which actions of a firing rule actually run.
+
+    A duration rule keeps firing on every tick while its condition holds; without
+    a gate throttle_cpu and alert_operator would run every cycle. Each
+    ``(rule_id, action)`` pair has an optional cooldown (seconds since it last ran)
+    and an optional fire-once latch that holds until the rule clears
+    (``RulesEngine.on_clear``). Actions without a policy always run. State is two
+    in-memory structures, so a decision is O(1) per action.
+    """
+
+    def __init__(self):
+        self.last_run: Dict[Tuple[str, str], float] = {}
+        self.latched: Dict[str, set] = {}  # rule_id -> fire-once actions already run
+        self._lock = threading.Lock()
+
+    def admit(self, rule_id: str, actions: List, policy: Dict[str, Tuple[float, bool]] = None,
+              now: float = None) -> List:
+        """Return the subset of ``actions`` to run now and record them as run."""
+        if not policy:
+            for a in actions:
+                ACTIONS_EXECUTED.labels(rule_id, action_name(a)).inc()
+            return list(actions)
+        now = time.monotonic() if now is None else now
+        admitted = []
+        with self._lock:
+            for a in actions:
+                name = action_name(a)
+                cooldown, once = policy.get(name, (0.0, False))
+                key = (rule_id, name)
+                if once and name in self.latched.get(rule_id, ()):
+                    ACTIONS_SUPPRESSED.labels(rule_id, name, 'latched').inc()
+                    continue
+                last = self.last_run.get(key)
+                if cooldown and last is not None and now - last < cooldown:
+                    ACTIONS_SUPPRESSED.labels(rule_id, name, 'cooldown').inc()
+                    continue
+                if once:
+                    self.latched.setdefault(rule_id, set()).add(name)
+                if cooldown:
+                    self.last_run[key] = now
+                admitted.append(a)
+                ACTIONS_EXECUTED.labels(rule_id, name).inc()
+        return admitted
+
+    def clear(self, rule_id: str):
+        """Re-arm the fire-once actions of ``rule_id``; cooldowns keep running."""
+        with self._lock:
+            self.latched.pop(rule_id, None)
+
+
+class ActionBatch:
+    """The actions of one firing once dispatched: inline results are known at once,
+    pooled ones when they finish or miss their deadline (see ``collect``)."""
+
+    def __init__(self, parsed: List[Tuple[str, object]], rule_id: str = None, severity: str = None):
+        self.parsed = parsed
+        self.rule_id = rule_id
+        self.severity = severity
+        self.results: List[Tuple[str, bool]] = [None] * len(parsed)
+        self.pending = []  # (index, name, deadline, future)
+
+    def collect(self) -> List[Tuple[str, bool]]:
+        """Wait for the pooled actions and return ``[(name, ok), ...]`` in input order."""
+        for i, name, deadline, fut in self.pending:
+            try:
+                ok = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+                outcome = 'ok' if ok else 'failed'
+            except FutureTimeout:
+                logger.error("Enforcement action %s exceeded its deadline", name)
+                ok, outcome = False, 'timeout'
+            ACTION_OUTCOMES.labels(name, outcome).inc()
+            self.results[i] = (name, ok)
+        self.pending = []
+        return self.results
+
+
+def _dispatch(firings: List[Dict], dry_run: bool) -> List[ActionBatch]:
+    # allow actions that are strings or dicts with params
+    batches = [ActionBatch([(action_name(a), a[action_name(a)] if isinstance(a, dict) else None)
+                            for a in f['actions']], f.get('rule_id'), f.get('severity')) for f in firings]
+    # every stop_motors of the tick runs before any other action of any firing
+    order = sorted(((b, i) for b in batches for i in range(len(b.parsed))),
+                   key=lambda bi: ACTION_PRIORITY.get(bi[0].parsed[bi[1]][0], 50))
+    for b, i in order:
+        name, val = b.parsed[i]
         handler = ACTION_MAP.get(name)
         if not handler:
             logger.warning("Unknown enforcement action: %s", name)
-            results.append((name, False))
+            ACTION_OUTCOMES.labels(name, 'unknown').inc()
+            b.results[i] = (name, False)
+            continue
+        if name in INLINE_ACTIONS:
+            ok = _run_action(name, handler, val, dry_run, b.rule_id, b.severity)
+            ACTION_OUTCOMES.labels(name, 'ok' if ok else 'failed').inc()
+            b.results[i] = (name, ok)
             continue
+        deadline = time.monotonic() + ACTION_DEADLINE_SECONDS.get(name, DEFAULT_ACTION_DEADLINE)
+        fut = _POOL.submit(_run_action, name, handler, val, dry_run, b.rule_id, b.severity)
+        b.pending.append((i, name, deadline, fut))
+    return batches
+
+
+def perform_actions(actions: List[str], dry_run: bool = True, rule_id: str = None, severity: str = None):
+    """Run enforcement actions and return ``[(name, ok), ...]`` in input order.
+
+    ``rule_id``/``severity`` identify the firing rule (passed on to alert_operator).
+
+    stop_motors runs inline before anything else; the remaining actions run in a
+    bounded thread pool in priority order, each with its own deadline
+    (ACTION_DEADLINE_SECONDS). An action that misses its deadline reports False
+    and keeps running in the background.
+    """
+    batch, = _dispatch([{'actions': actions, 'rule_id': rule_id, 'severity': severity}], dry_run)
+    return batch.collect()
+
+
+_COLLECTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='enforcement-collect')
+
+
+def dispatch_firings(firings: List[Dict], dry_run: bool = True,
+                     on_done: Callable[[Dict, List[Tuple[str, bool]]], None] = None):
+    """Start the actions of every firing of one evaluation without waiting for them.
+
+    ``firings`` are rule engine results (``rule_id``, ``actions``, ``severity``).
+    Every stop_motors among them runs inline first, so a slow action of an
+    earlier firing can never delay the stop of a later one; the rest go to the
+    action pool as in ``perform_actions``. Results are gathered off the caller's
+    thread and handed to ``on_done(firing, [(name, ok), ...])`` per firing.
+    """
+    for firing, batch in zip(firings, _dispatch(firings, dry_run)):
+        if batch.pending:
+            _COLLECTOR.submit(_report, firing, batch, on_done)
+        else:
+            _report(firing, batch, on_done)
+
+
+def _report(firing: Dict, batch: ActionBatch, on_done):
+    results = batch.collect()
+    if on_done is not None:
         try:
-            if name == 'alert_operator':
-                ok = handler(val if val else 'Alert from rules engine')
-            elif name == 'attempt_restart_agent':
-                ok = handler(val if val else 'picrawler.service', dry_run=dry_run)
-            else:
-                ok = handler(dry_run=dry_run)
-            results.append((name, bool(ok)))
+            on_done(firing, results)
         except Exception:
-            logger.exception("Error performing action: %s", name)
-            results.append((name, False))
-    return results
+            logger.exception("Reporting enforcement results for %s failed", firing.get('rule_id'))
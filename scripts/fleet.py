@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Fleet mode: evaluate config/rules for many robots in one batched pass per tick.
+
+Instead of one RulesEngine (and one dict of timers) per robot, a FleetEvaluator
+keeps all state in NumPy arrays:
+
+- ``values``: float64 [robots x metrics], NaN where a robot did not report a metric
+- ``start_ts``: float64 [robots x rules], NaN where no duration timer is running
+
+Each tick runs every rule's vectorized condition over all robots at once, with
+the same ``duration_seconds`` semantics as ``RulesEngine.evaluate_snapshot``.
+Rules with a windowed ``aggregate`` or label selectors are skipped in fleet mode
+(they need per-series history) and are logged at load.
+
+Above a few thousand robots ShardedFleet splits the robots across worker
+processes that read their rows from shared memory.
+"""
+import logging
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Mapping, Tuple
+
+import numpy as np
+
+from scripts.conditions import referenced_metrics
+from scripts.rules_engine import RulesEngine
+
+logger = logging.getLogger("fleet")
+
+SHARD_THRESHOLD = 4000  # robots per process before sharding pays for the IPC
+
+
+class FleetEvaluator:
+    def __init__(self, engine: RulesEngine, robots: int):
+        self.rules = []
+        for rule in engine.rules:
+            if rule.condition is None:
+                continue
+            if rule.aggregate is not None or rule.selects_labels:
+                logger.warning("Rule %s uses windows or labels; not evaluated in fleet mode", rule.id)
+                continue
+            self.rules.append(rule)
+        names = sorted({n for r in self.rules for n in [r.trigger['metric']] + referenced_metrics(r.condition)})
+        self.metric_names: List[str] = names
+        self.column: Dict[str, int] = {n: i for i, n in enumerate(names)}
+        self.robots = robots
+        self.values = np.full((robots, len(names)), np.nan)
+        self.start_ts = np.full((robots, len(self.rules)), np.nan)
+        self.durations = np.array([float(r.duration or 0) for r in self.rules])
+        self._plan = []
+        for rule in self.rules:
+            refs = {n: self.column[n] for n in referenced_metrics(rule.condition)}
+            self._plan.append((self.column[rule.trigger['metric']], refs, rule.vector_predicate()))
+
+    def update_row(self, robot: int, metrics: Mapping[str, float]):
+        """Copy one robot's latest snapshot into the value matrix (missing -> NaN)."""
+        row = self.values[robot]
+        for name, col in self.column.items():
+            v = metrics.get(name)
+            row[col] = np.nan if v is None else v
+
+    def tick(self, ts: float, values: np.ndarray = None) -> np.ndarray:
+        """Evaluate all rules for all robots; returns bool [robots x rules] of firings.
+
+        ``values`` defaults to ``self.values``; pass a view to evaluate in place.
+        """
+        values = self.values if values is None else values
+        fired = np.zeros((values.shape[0], len(self.rules)), dtype=bool)
+        for j, (col, refs, vpred) in enumerate(self._plan):
+            v = values[:, col]
+            present = ~np.isnan(v)
+            matched = present & np.asarray(vpred(v, {n: values[:, c] for n, c in refs.items()}), dtype=bool)
+            start = self.start_ts[:, j]
+            dur = self.durations[j]
+            if dur > 0:
+                running = ~np.isnan(start)
+                fired[:, j] = matched & running & (ts - start >= dur)
+                start[matched & ~running] = ts
+            else:
+                fired[:, j] = matched
+            # like evaluate_snapshot: a present, non-matching sample resets the timer
+            start[present & ~matched] = np.nan
+        return fired
+
+    def firings(self, fired: np.ndarray, robot_offset: int = 0) -> List[Dict[str, Any]]:
+        robots, rules = np.nonzero(fired)
+        return [{'robot': int(r) + robot_offset, 'rule_id': self.rules[k].id,
+                 'actions': self.rules[k].enforcement_action}
+                for r, k in zip(robots.tolist(), rules.tolist())]
+
+
+def _shard_worker(conn, pattern: str, shm_name: str, shape: Tuple[int, int], lo: int, hi: int):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        values = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        fleet = FleetEvaluator(RulesEngine(pattern), hi - lo)
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            fired = fleet.tick(msg, values[lo:hi])
+            robots, rules = np.nonzero(fired)
+            conn.send((robots + lo, rules))
+    finally:
+        shm.close()
+        conn.close()
+
+
+class ShardedFleet:
+    """Fleet evaluation split across worker processes over a shared value matrix.
+
+    The parent writes robot rows into ``values`` (shared memory); each tick every
+    worker evaluates its contiguous robot slice and returns sparse firings.
+    """
+
+    def __init__(self, pattern: str, robots: int, workers: int = None):
+        workers = workers or max(1, min(mp.cpu_count(), -(-robots // SHARD_THRESHOLD)))
+        self.template = FleetEvaluator(RulesEngine(pattern), 0)
+        shape = (robots, len(self.template.metric_names))
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * 8))
+        self.values = np.ndarray(shape, dtype=np.float64, buffer=self._shm.buf)
+        self.values[:] = np.nan
+        ctx = mp.get_context('spawn')
+        bounds = np.linspace(0, robots, workers + 1).astype(int)
+        self._workers = []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_shard_worker, args=(child, pattern, self._shm.name, shape, int(lo), int(hi)),
+                               daemon=True)
+            proc.start()
+            child.close()
+            self._workers.append((proc, parent))
+
+    @property
+    def column(self) -> Dict[str, int]:
+        return self.template.column
+
+    @property
+    def rules(self):
+        return self.template.rules
+
+    def tick(self, ts: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (robot indices, rule indices) of every firing this tick."""
+        for _, conn in self._workers:
+            conn.send(ts)
+        parts = [conn.recv() for _, conn in self._workers]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def close(self):
+        for proc, conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            proc.join(timeout=5)
+            conn.close()
+        self._shm.close()
+        self._shm.unlink()
+
+
+def make_fleet(pattern: str, robots: int, workers: int = None):
+    """FleetEvaluator for small fleets, ShardedFleet once sharding pays off."""
+    if workers or robots > SHARD_THRESHOLD:
+        return ShardedFleet(pattern, robots, workers)
+    return FleetEvaluator(RulesEngine(pattern), robots)
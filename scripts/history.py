@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Bounded telemetry history in a memory-mapped columnar ring file.
+
+The exporter appends one row per sampling tick: a float64 timestamp plus one
+float32 column per metric (NaN when a metric had no reading). The file has a
+fixed size, so memory and disk use stay constant, and each column is written
+sequentially.
+
+Layout (little endian):
+  [0, 4096)                header: magic, capacity, column count, rows written,
+                           then 64-byte column names
+  ts                       float64[capacity]
+  one column per metric    float32[capacity]
+
+Readers (watchdog, backtests, the exporter's /history endpoint) open the same
+file read-only and get NumPy views straight onto the mapping. ``window`` is
+zero-copy unless the requested range wraps around the end of the ring. Rows
+are assumed to be appended in timestamp order.
+
+  ring = HistoryRing.open('~/.cache/picrawler/history.ring')
+  ts, cols = ring.window(since=time.time() - 600)
+  RulesEngine().evaluate_series(cols, ts)
+"""
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("history")
+
+DEFAULT_PATH = os.environ.get('PICRAWLER_HISTORY_PATH', os.path.expanduser('~/.cache/picrawler/history.ring'))
+MAGIC = b'PCRING01'
+HEADER_BYTES = 4096
+NAME_BYTES = 64
+MAX_COLUMNS = (HEADER_BYTES - 32) // NAME_BYTES
+
+
+class HistoryRing:
+    def __init__(self, path: str, metrics: Sequence[str], capacity: int = 86400, readonly: bool = False):
+        """Open (or create) a ring for ``metrics``; an existing file with another layout is recreated."""
+        if len(metrics) > MAX_COLUMNS:
+            raise ValueError(f"at most {MAX_COLUMNS} history columns")
+        self.path = os.path.expanduser(path)
+        self.metrics: List[str] = list(metrics)
+        self.capacity = capacity
+        self.readonly = readonly
+        if not readonly and not self._layout_matches():
+            self._create()
+        self._map()
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_PATH) -> 'HistoryRing':
+        """Open an existing ring read-only, taking columns and capacity from its header."""
+        path = os.path.expanduser(path)
+        header = cls._read_header(path)
+        if header is None:
+            raise ValueError(f"{path} is not a history ring")
+        capacity, names = header
+        return cls(path, names, capacity, readonly=True)
+
+    @staticmethod
+    def _read_header(path: str) -> Optional[Tuple[int, List[str]]]:
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read(HEADER_BYTES)
+        except OSError:
+            return None
+        if len(raw) < HEADER_BYTES or raw[:8] != MAGIC:
+            return None
+        capacity, ncols = np.frombuffer(raw, dtype='<u8', count=2, offset=8)
+        names = [raw[32 + i * NAME_BYTES:32 + (i + 1) * NAME_BYTES].rstrip(b'\0').decode() for i in range(ncols)]
+        return int(capacity), names
+
+    def _size(self) -> int:
+        return HEADER_BYTES + self.capacity * (8 + 4 * len(self.metrics))
+
+    def _layout_matches(self) -> bool:
+        header = self._read_header(self.path)
+        if header is None:
+            return False
+        if header != (self.capacity, self.metrics) or os.path.getsize(self.path) != self._size():
+            logger.warning("History file %s has a different layout; starting a new one", self.path)
+            return False
+        return True
+
+    def _create(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        header = bytearray(HEADER_BYTES)
+        header[:8] = MAGIC
+        header[8:24] = np.array([self.capacity, len(self.metrics)], dtype='<u8').tobytes()
+        for i, name in enumerate(self.metrics):
+            encoded = name.encode()[:NAME_BYTES]
+            header[32 + i * NAME_BYTES:32 + i * NAME_BYTES + len(encoded)] = encoded
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            f.truncate(self._size())
+        os.replace(tmp, self.path)
+
+    def _map(self):
+        self._mm = np.memmap(self.path, dtype=np.uint8, mode='r' if self.readonly else 'r+', shape=(self._size(),))
+        self._count = self._mm[24:32].view('<u8')  # rows ever written; published after the row itself
+        off = HEADER_BYTES
+        self.ts = self._mm[off:off + 8 * self.capacity].view('<f8')
+        off += 8 * self.capacity
+        self.columns: Dict[str, np.ndarray] = {}
+        for name in self.metrics:
+            self.columns[name] = self._mm[off:off + 4 * self.capacity].view('<f4')
+            off += 4 * self.capacity
+
+    @property
+    def count(self) -> int:
+        return int(self._count[0])
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def append(self, ts: float, values: Dict[str, float]):
+        """Write one row; metrics missing from ``values`` are stored as NaN."""
+        n = self.count
+        i = n % self.capacity
+        self.ts[i] = ts
+        for name, col in self.columns.items():
+            v = values.get(name)
+            col[i] = np.nan if v is None else v
+        self._count[0] = n + 1
+
+    def flush(self):
+        self._mm.flush()
+
+    def _segments(self) -> List[Tuple[int, int]]:
+        n = self.count
+        if n <= self.capacity:
+            return [(0, n)] if n else []
+        head = n % self.capacity
+        return [(head, self.capacity), (0, head)] if head else [(0, self.capacity)]
+
+    def window(self, since: float = None, until: float = None,
+               metrics: Sequence[str] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Rows with ``since <= ts <= until`` in time order, as ``(ts, {metric: values})``.
+
+        Views into the mapping when the rows are contiguous in the file; copies
+        only when the range wraps around the end of the ring.
+        """
+        names = list(metrics) if metrics is not None else self.metrics
+        parts = []
+        for lo, hi in self._segments():
+            seg = self.ts[lo:hi]
+            a = lo + (int(np.searchsorted(seg, since, 'left')) if since is not None else 0)
+            b = lo + (int(np.searchsorted(seg, until, 'right')) if until is not None else hi - lo)
+            if b > a:
+                parts.append((a, b))
+        if not parts:
+            return self.ts[:0], {n: self.columns[n][:0] for n in names}
+        if len(parts) == 1:
+            a, b = parts[0]
+            return self.ts[a:b], {n: self.columns[n][a:b] for n in names}
+        return (np.concatenate([self.ts[a:b] for a, b in parts]),
+                {n: np.concatenate([self.columns[n][a:b] for a, b in parts]) for n in names})
+
+    def close(self):
+        if not self.readonly:
+            self.flush()
+        # the mapping is released once no returned views reference it
+        self._mm = self._count = self.ts = None
+        self.columns = {}
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Local ingestion API: agents push gauge and counter updates into the metrics exporter.
+
+The daemon, vision and navigation agents send batched datagrams to a Unix socket
+owned by the exporter instead of running their own HTTP endpoints. Wire format,
+one sample per line (same sample syntax as the safety channel):
+
+  picrawler_servos_position_degrees{servo="servo0"} 42.5     gauge: set
+  picrawler_vision_frames_total{camera="front"} +3           counter: add
+
+A single listener thread owns the stored values, so updates take no locks; the
+exporter's registry reads them through IngestCollector at scrape time. Gauges
+keep the latest value, counters accumulate. Names the exporter already exports
+itself are rejected, and the number of series is capped.
+
+Benchmark: python3 -m benchmarks.bench_ingest
+"""
+import logging
+import os
+import re
+import socket
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from prometheus_client.core import Metric
+
+from scripts.scrape_parser import format_series, parse_labels, sample_value, split_sample
+
+logger = logging.getLogger("ingest")
+
+DEFAULT_SOCKET = os.environ.get('PICRAWLER_INGEST_SOCKET', '/tmp/picrawler_ingest.sock')
+MAX_DATAGRAM = 65536
+MAX_SERIES = 10000
+_NAME_RE = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*\Z')
+
+
+class IngestPublisher:
+    """Batches updates into datagrams; never blocks the producer.
+
+    Updates are buffered until ``flush`` (or until a datagram's worth is
+    queued). If the exporter is not listening the batch is dropped and counted
+    in ``dropped``.
+    """
+
+    def __init__(self, path: str = DEFAULT_SOCKET, max_batch_bytes: int = 8192):
+        self.path = path
+        self.max_batch_bytes = max_batch_bytes
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self._buf = []
+        self._size = 0
+        self.dropped = 0
+
+    def _add(self, line: str):
+        if self._size + len(line) + 1 > self.max_batch_bytes:
+            self.flush()
+        self._buf.append(line)
+        self._size += len(line) + 1
+
+    def gauge(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        self._add(f'{format_series(name, labels)} {value!r}')
+
+    def inc(self, name: str, amount: float = 1, labels: Optional[Dict[str, str]] = None):
+        self._add(f'{format_series(name, labels)} +{amount!r}')
+
+    def flush(self) -> bool:
+        if not self._buf:
+            return True
+        data = '\n'.join(self._buf).encode()
+        count = len(self._buf)
+        self._buf = []
+        self._size = 0
+        try:
+            self.sock.sendto(data, self.path)
+            return True
+        except OSError:
+            self.dropped += count
+            return False
+
+    def close(self):
+        self.flush()
+        self.sock.close()
+
+
+class IngestCollector:
+    """Holds pushed series and exposes them to a prometheus_client registry.
+
+    ``apply`` must only be called from one thread (the listener); ``collect``
+    runs on the HTTP thread and copies each dict in one step.
+    """
+
+    def __init__(self, reserved: Iterable[str] = (), max_series: int = MAX_SERIES,
+                 helps: Optional[Dict[str, str]] = None):
+        self.reserved = frozenset(reserved) | {'picrawler_ingest_series', 'picrawler_ingest_rejected_total'}
+        self.max_series = max_series
+        self.helps = dict(helps or {})
+        self.gauges: Dict[Tuple[str, bytes], float] = {}
+        self.counters: Dict[Tuple[str, bytes], float] = {}
+        self.types: Dict[str, str] = {}
+        self.labels: Dict[bytes, Dict[str, str]] = {b'': {}}
+        self.rejected = 0
+
+    def _admit(self, name: str, kind: str) -> bool:
+        known = self.types.get(name)
+        if known is None:
+            if name in self.reserved or not _NAME_RE.match(name):
+                return False
+            self.types[name] = kind
+            return True
+        return known == kind
+
+    def apply(self, data: bytes) -> int:
+        """Apply one datagram; returns the number of samples stored."""
+        applied = 0
+        gauges, counters, labels = self.gauges, self.counters, self.labels
+        for line in data.split(b'\n'):
+            if not line:
+                continue
+            try:
+                name, raw, rest = split_sample(line)
+                val = sample_value(rest, line)
+                value = float(val)
+                key = (name.decode(), raw or b'')
+            except (ValueError, UnicodeDecodeError):
+                self.rejected += 1
+                continue
+            kind, values = ('counter', counters) if val[:1] == b'+' else ('gauge', gauges)
+            if key not in values:
+                # admission is decided before anything is cached, so rejected series cost no memory
+                try:
+                    parsed = labels.get(key[1])
+                    if parsed is None:
+                        parsed = parse_labels(key[1].decode())
+                except (ValueError, UnicodeDecodeError):
+                    self.rejected += 1
+                    continue
+                if self._full() or not self._admit(key[0], kind):
+                    self.rejected += 1
+                    continue
+                labels.setdefault(key[1], parsed)
+            if kind == 'counter':
+                values[key] = values.get(key, 0.0) + value
+            else:
+                values[key] = value
+            applied += 1
+        return applied
+
+    def _full(self) -> bool:
+        return len(self.gauges) + len(self.counters) >= self.max_series
+
+    def describe(self):
+        # pushed names are not known up front; reserved names are checked in apply()
+        return []
+
+    def collect(self):
+        families = {}
+        for kind, values in (('gauge', self.gauges), ('counter', self.counters)):
+            for (name, raw), value in list(values.items()):
+                fam = families.get(name)
+                if fam is None:
+                    base = name[:-6] if kind == 'counter' and name.endswith('_total') else name
+                    help_text = self.helps.get(name, f'Pushed {kind} (local ingestion)')
+                    fam = families[name] = Metric(base, help_text, kind)
+                fam.add_sample(fam.name + '_total' if kind == 'counter' else name, self.labels[raw], value)
+        own = Metric('picrawler_ingest_series', 'Series currently held by the ingestion endpoint', 'gauge')
+        own.add_sample('picrawler_ingest_series', {}, len(self.gauges) + len(self.counters))
+        rejected = Metric('picrawler_ingest_rejected', 'Pushed samples rejected (malformed, reserved, type clash, cap)',
+                          'counter')
+        rejected.add_sample('picrawler_ingest_rejected_total', {}, self.rejected)
+        return list(families.values()) + [own, rejected]
+
+
+class IngestListener:
+    def __init__(self, collector: IngestCollector, path: str = DEFAULT_SOCKET):
+        self.collector = collector
+        self.path = path
+        self.sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def bind(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind(self.path)
+        self.sock.settimeout(0.5)  # lets stop() be noticed
+
+    def serve_forever(self):
+        if self.sock is None:
+            self.bind()
+        buf = bytearray(MAX_DATAGRAM)
+        view = memoryview(buf)
+        apply = self.collector.apply
+        while not self._stop.is_set():
+            try:
+                n = self.sock.recv_into(buf)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stop.is_set():
+                    break
+                raise
+            try:
+                apply(bytes(view[:n]))
+            except Exception:
+                logger.exception("Failed to apply ingested metrics")
+
+    def start(self) -> threading.Thread:
+        self.bind()
+        self._thread = threading.Thread(target=self.serve_forever, name='ingest-listener', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
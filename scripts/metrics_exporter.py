@@ -9,18 +9,58 @@ Exports:
 - picrawler_last_heartbeat_timestamp
 - picrawler_camera_frames_total
 - picrawler_battery_voltage_volts (if robot-hat available)
-- picrawler_servos_position_degrees (labels: servo)
+- picrawler_servos_position_degrees (labels: servo; pushed by agents, see scripts/ingest.py)
+
+Readings are taken by a background Sampler: one scheduler thread, a per-sensor
+interval (battery and temperature fast, uptime slow) and a per-sensor timeout.
+Reads run on a small worker pool, so a hung I2C read only makes its own gauge
+stale (picrawler_sensor_staleness_seconds) instead of freezing the export.
+Sysfs files are opened once and re-read with pread.
+
+Agents push their own gauges and counters (servo positions, frame counts) over
+the local ingestion socket (--ingest-socket, scripts/ingest.py; off unless given).
+
+/metrics is rendered at most once per fast interval into a cached byte buffer
+(plus a gzip copy made on first use), negotiated between the Prometheus text
+format and OpenMetrics, and tagged with an ETag so an unchanged buffer is
+answered with 304 Not Modified.
+
+With --history-path, sampled values are also appended to a fixed-size
+memory-mapped history ring (scripts/history.py; needs numpy), served as JSON on
+/history?metric=...&seconds=600. A reading whose sensor has gone stale is
+stored as NaN.
 
 Run:
   python3 scripts/metrics_exporter.py --port 8000
+  python3 scripts/metrics_exporter.py --port 8000 --ingest-socket /tmp/picrawler_ingest.sock \
+      --history-path ~/.cache/picrawler/history.ring
 
 """
-from prometheus_client import start_http_server, Gauge, Counter
+from prometheus_client import Gauge, Counter, REGISTRY
+from prometheus_client.exposition import MetricsHandler, choose_encoder, gzip_accepted
 import time
 import argparse
+import gzip
+import hashlib
+import heapq
+import json
+import logging
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 import psutil
 
+if __package__ in (None, ''):
+    # run as `python3 scripts/metrics_exporter.py`: make the scripts package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.ingest import DEFAULT_SOCKET as INGEST_SOCKET, IngestCollector, IngestListener  # noqa: E402
+
+logger = logging.getLogger("metrics_exporter")
+
 # Metrics
 PROCESS_CPU = Gauge("picrawler_process_cpu_percent", "CPU percent used by picrawler process")
 PROCESS_MEM = Gauge("picrawler_process_memory_bytes", "Memory used by picrawler process in bytes")
@@ -29,7 +69,25 @@ UPTIME = Gauge("picrawler_uptime_seconds", "System uptime in seconds")
 LAST_HEARTBEAT = Gauge("picrawler_last_heartbeat_timestamp", "UTC timestamp of last heartbeat")
 CAMERA_FRAMES = Counter("picrawler_camera_frames_total", "Total camera frames processed")
 BATTERY_VOLT = Gauge("picrawler_battery_voltage_volts", "Battery voltage reported by Robot HAT", unit="volts")
-SERVO_POS = Gauge("picrawler_servos_position_degrees", "Servo position in degrees", ['servo'])
+SENSOR_STALENESS = Gauge(
+    "picrawler_sensor_staleness_seconds", "Seconds since the sensor last returned a reading", ['sensor'])
+SENSOR_TIMEOUTS = Counter("picrawler_sensor_timeouts_total", "Sensor reads that exceeded their timeout", ['sensor'])
+SENSOR_ERRORS = Counter("picrawler_sensor_errors_total", "Sensor reads that failed or returned nothing", ['sensor'])
+EXPOSITION_RENDERS = Counter("picrawler_exporter_renders_total", "Times the registry was rendered for /metrics",
+                             ['format'])
+SCRAPES = Counter("picrawler_exporter_scrapes_total", "/metrics requests by result (rendered, cached, not_modified)",
+                  ['result'])
+
+THERMAL_PATH = "/sys/class/thermal/thermal_zone0/temp"
+HISTORY_METRICS = (
+    'picrawler_cpu_temp_celsius',
+    'picrawler_battery_voltage_volts',
+    'picrawler_process_cpu_percent',
+    'picrawler_process_memory_bytes',
+)
+INGEST_HELP = {
+    'picrawler_servos_position_degrees': 'Servo position in degrees',
+}
 
 # Try to import robot_hat utilities if available to read battery etc
 robot_hat_utils = None
@@ -40,15 +98,48 @@ except Exception:
     robot_hat_utils = None
 
 start_time = time.time()
+_mono_start = time.monotonic()
+# metric -> (monotonic time sampled, value, seconds until stale); fresh values are copied into the history ring
+latest: Dict[str, Tuple[float, float, float]] = {}
+
+
+class SysfsReader:
+    """Keeps a sysfs attribute open and re-reads it with pread (no open/close per sample)."""
+
+    def __init__(self, path: str, size: int = 64):
+        self.path = path
+        self.size = size
+        self.fd = None
+
+    def read(self) -> Optional[bytes]:
+        for _ in range(2):
+            try:
+                if self.fd is None:
+                    self.fd = os.open(self.path, os.O_RDONLY)
+                return os.pread(self.fd, self.size, 0)
+            except OSError:
+                # the device may have gone away and come back; reopen once
+                self.close()
+        return None
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+
+_thermal = SysfsReader(THERMAL_PATH)
 
 
 def read_cpu_temp():
     # Common sysfs thermal path
     try:
-        with open("/sys/class/thermal/thermal_zone0/temp", "r") as f:
-            t = int(f.read().strip()) / 1000.0
-            return t
-    except Exception:
+        raw = _thermal.read()
+        return int(raw.strip()) / 1000.0 if raw else None
+    except ValueError:
         return None
 
 
@@ -61,45 +152,326 @@ def read_battery_voltage():
         return None
 
 
-def update_metrics():
-    p = psutil.Process(os.getpid())
+_process = psutil.Process(os.getpid())
+
+
+def read_process():
+    with _process.oneshot():
+        return _process.cpu_percent(interval=None), _process.memory_info().rss
+
+
+def _recorder(gauge: Gauge, name: str, stale_after: float) -> Callable[[float], None]:
+    def apply(v):
+        gauge.set(v)
+        latest[name] = (time.monotonic(), v, stale_after)
+    return apply
+
+
+def _process_recorder(stale_after: float) -> Callable[[Tuple[float, float]], None]:
+    def apply(v):
+        PROCESS_CPU.set(v[0])
+        PROCESS_MEM.set(v[1])
+        now = time.monotonic()
+        latest['picrawler_process_cpu_percent'] = (now, v[0], stale_after)
+        latest['picrawler_process_memory_bytes'] = (now, v[1], stale_after)
+    return apply
+
+
+def history_row(now: float = None) -> Dict[str, float]:
+    """Latest value of each history metric; a stale one (its sensor hung or failing) is left out, i.e. NaN."""
+    now = time.monotonic() if now is None else now
+    return {name: v for name, (at, v, stale_after) in list(latest.items()) if now - at <= stale_after}
+
+
+class Sensor:
+    """A reading function, how often to call it, and where its value goes."""
+
+    def __init__(self, name: str, read: Callable[[], Any], apply: Callable[[Any], None], interval: float,
+                 timeout: float = None):
+        self.name = name
+        self.read = read
+        self.apply = apply
+        self.interval = interval
+        self.timeout = timeout if timeout is not None else interval
+        self.last_ok = None
+        self.started = None  # monotonic start of the read in flight, if any
+        self.timed_out = False
+        SENSOR_STALENESS.labels(name).set_function(self.staleness)
+
+    def staleness(self) -> float:
+        # before the first reading, count from process start
+        return time.monotonic() - (self.last_ok if self.last_ok is not None else _mono_start)
 
-    PROCESS_CPU.set(p.cpu_percent(interval=None))
-    PROCESS_MEM.set(p.memory_info().rss)
 
+class Sampler:
+    """Runs each Sensor on its own interval from a single scheduler thread.
+
+    A read that is still in flight when its sensor comes due again is not
+    duplicated; if by then it has outlived ``timeout`` it is counted in
+    picrawler_sensor_timeouts_total. The gauge keeps its last value while its
+    staleness grows.
+    """
+
+    def __init__(self, sensors: List[Sensor]):
+        self.sensors = sensors
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(sensors)), thread_name_prefix='sensor')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run_read(self, sensor: Sensor):
+        try:
+            value = sensor.read()
+        except Exception:
+            logger.exception("Sensor %s read failed", sensor.name)
+            value = None
+        if value is None:
+            SENSOR_ERRORS.labels(sensor.name).inc()
+        else:
+            sensor.apply(value)
+            sensor.last_ok = time.monotonic()
+        sensor.started = None
+
+    def poll(self, sensor: Sensor, now: float):
+        if sensor.started is not None:
+            if not sensor.timed_out and now - sensor.started > sensor.timeout:
+                sensor.timed_out = True
+                SENSOR_TIMEOUTS.labels(sensor.name).inc()
+                logger.warning("Sensor %s read exceeded %.2fs", sensor.name, sensor.timeout)
+            return
+        sensor.started = now
+        sensor.timed_out = False
+        self._pool.submit(self._run_read, sensor)
+
+    def run(self):
+        now = time.monotonic()
+        due = [(now, i) for i in range(len(self.sensors))]
+        heapq.heapify(due)
+        while not self._stop.is_set():
+            at, i = due[0]
+            if self._stop.wait(max(0.0, at - time.monotonic())):
+                break
+            now = time.monotonic()
+            sensor = self.sensors[i]
+            self.poll(sensor, now)
+            # running behind: skip missed slots instead of bursting
+            heapq.heapreplace(due, (max(at + sensor.interval, now), i))
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.run, name='sampler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._pool.shutdown(wait=False)
+
+
+def default_sensors(fast_interval: float = 1.0, interval: float = 5.0, slow_interval: float = 30.0,
+                    history=None) -> List[Sensor]:
+    # a value missing two reads in a row is stale
+    sensors = [
+        Sensor('cpu_temp', read_cpu_temp, _recorder(CPU_TEMP, 'picrawler_cpu_temp_celsius', 2 * fast_interval),
+               fast_interval, timeout=0.5),
+        Sensor('process', read_process, _process_recorder(2 * interval), interval),
+        Sensor('heartbeat', time.time, LAST_HEARTBEAT.set, interval),
+        Sensor('uptime', lambda: time.time() - start_time, UPTIME.set, slow_interval),
+    ]
+    if robot_hat_utils is not None:
+        sensors.append(Sensor('battery', read_battery_voltage,
+                              _recorder(BATTERY_VOLT, 'picrawler_battery_voltage_volts', 2 * fast_interval),
+                              fast_interval, timeout=0.5))
+    if history is not None:
+        # one row per fast tick with the latest fresh value of every history metric
+        sensors.append(Sensor('history', history_row, lambda row: history.append(time.time(), row),
+                              fast_interval))
+    return sensors
+
+
+def update_metrics():
+    """Take every reading once, synchronously, on the calling thread."""
     t = read_cpu_temp()
     if t is not None:
         CPU_TEMP.set(t)
-
+    cpu, mem = read_process()
+    PROCESS_CPU.set(cpu)
+    PROCESS_MEM.set(mem)
     UPTIME.set(time.time() - start_time)
     LAST_HEARTBEAT.set(time.time())
-
-    # battery
     bv = read_battery_voltage()
     if bv is not None:
         BATTERY_VOLT.set(bv)
 
-    # servo placeholders (user code should set specific servo gauge values via /metrics push or local API)
-    # Example static values for now
-    SERVO_POS.labels(servo="servo0").set(0)
-    SERVO_POS.labels(servo="servo1").set(0)
+
+class ExpositionCache:
+    """Rendered /metrics bodies per content type, reused for ``max_age`` seconds.
+
+    Only one thread renders at a time; scrapers arriving meanwhile wait for it
+    and share the result instead of each walking the registry.
+    """
+
+    def __init__(self, registry=REGISTRY, max_age: float = 1.0, gzip_level: int = 6):
+        self.registry = registry
+        self.max_age = max_age
+        self.gzip_level = gzip_level
+        self._entries: Dict[str, list] = {}  # content type -> [rendered_at, body, etag, gzipped body or None]
+        self._lock = threading.Lock()
+
+    def get(self, accept: Optional[str], want_gzip: bool):
+        """Returns ``(content_type, body, etag, gzipped, fresh)``; ``fresh`` is True if rendered for this call."""
+        encoder, content_type = choose_encoder(accept)
+        now = time.monotonic()
+        fresh = False
+        with self._lock:
+            entry = self._entries.get(content_type)
+            if entry is None or now - entry[0] >= self.max_age:
+                body = encoder(self.registry)
+                etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+                entry = self._entries[content_type] = [now, body, etag, None]
+                EXPOSITION_RENDERS.labels('openmetrics' if 'openmetrics' in content_type else 'text').inc()
+                fresh = True
+            if want_gzip and entry[3] is None:
+                entry[3] = gzip.compress(entry[1], self.gzip_level)
+            _, body, etag, gz = entry
+        return content_type, (gz if want_gzip else body), etag, want_gzip, fresh
+
+
+class ExporterHandler(MetricsHandler):
+    """/metrics from the exposition cache plus /history from the telemetry ring."""
+    protocol_version = 'HTTP/1.1'  # keep-alive for the watchdog's pooled session
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    history = None
+    cache = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/history':
+            self._history(parse_qs(url.query))
+        else:
+            self._metrics(parse_qs(url.query))
+
+    def _send(self, body: bytes, content_type: str, gzipped: bool = False, etag: str = None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept, Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _metrics(self, params):
+        accept = self.headers.get('Accept')
+        want_gzip = gzip_accepted(self.headers.get('Accept-Encoding'))
+        if 'name[]' in params or self.cache is None:
+            # filtered scrapes are rare; render them directly
+            encoder, content_type = choose_encoder(accept)
+            registry = self.registry.restricted_registry(params['name[]']) if 'name[]' in params else self.registry
+            body = encoder(registry)
+            SCRAPES.labels('rendered').inc()
+            self._send(gzip.compress(body) if want_gzip else body, content_type, want_gzip)
+            return
+        content_type, body, etag, gzipped, fresh = self.cache.get(accept, want_gzip)
+        if self.headers.get('If-None-Match') == etag:
+            SCRAPES.labels('not_modified').inc()
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        SCRAPES.labels('rendered' if fresh else 'cached').inc()
+        self._send(body, content_type, gzipped, etag)
+
+    def _history(self, params):
+        if self.history is None:
+            self.send_error(404, 'history is disabled')
+            return
+        try:
+            names = params.get('metric') or list(self.history.metrics)
+            unknown = [n for n in names if n not in self.history.columns]
+            if unknown:
+                raise ValueError(f'unknown metric {unknown[0]}')
+            until = float(params['until'][0]) if 'until' in params else None
+            since = float(params['since'][0]) if 'since' in params else \
+                (until or time.time()) - float(params.get('seconds', ['600'])[0])
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        ts, cols = self.history.window(since, until, names)
+        body = json.dumps({'ts': ts.tolist(),
+                           'metrics': {n: [None if v != v else v for v in c.tolist()] for n, c in cols.items()}})
+        self._send(body.encode(), 'application/json')
+
+
+def serve(port: int, history=None, max_age: float = 1.0, registry=REGISTRY) -> ThreadingHTTPServer:
+    """Serve /metrics and /history in a background thread; ``max_age=0`` disables the exposition cache."""
+    cache = ExpositionCache(registry, max_age) if max_age > 0 else None
+    handler = type('Handler', (ExporterHandler,), {'history': history, 'cache': cache, 'registry': registry})
+    server = ThreadingHTTPServer(('', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='http', daemon=True).start()
+    return server
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", type=int, default=int(os.environ.get("METRICS_PORT", 8000)))
-    parser.add_argument("--interval", type=float, default=5.0, help="metrics update interval seconds")
+    parser.add_argument("--interval", type=float, default=5.0, help="process/heartbeat update interval seconds")
+    parser.add_argument("--fast-interval", type=float, default=1.0, help="battery/temperature update interval seconds")
+    parser.add_argument("--slow-interval", type=float, default=30.0, help="uptime update interval seconds")
+    # both are opt-in so a bare run (tests, dev) writes nothing outside its own process
+    parser.add_argument("--ingest-socket", default=os.environ.get("PICRAWLER_INGEST_SOCKET", ""),
+                        help=f"Unix datagram socket agents push metrics to, e.g. {INGEST_SOCKET} (default: off)")
+    parser.add_argument("--history-path", default=os.environ.get("PICRAWLER_HISTORY_PATH", ""),
+                        help="memory-mapped telemetry history ring, e.g. ~/.cache/picrawler/history.ring "
+                             "(default: off)")
+    parser.add_argument("--history-rows", type=int, default=86400,
+                        help="rows kept in the history ring (one per fast interval)")
     args = parser.parse_args()
 
-    start_http_server(args.port)
+    history = None
+    if args.history_path:
+        try:
+            from scripts.history import HistoryRing
+            history = HistoryRing(args.history_path, HISTORY_METRICS, args.history_rows)
+        except ImportError:
+            logger.warning("numpy is not installed; telemetry history disabled")
+        except (OSError, ValueError):
+            logger.exception("Cannot open telemetry history %s; history disabled", args.history_path)
+
+    # scrapes within one fast tick would render the same values; reuse the buffer
+    serve(args.port, history, max_age=args.fast_interval)
     print(f"Metrics exporter running on :{args.port}")
 
     # Warm-up psutil cpu_percent
     psutil.cpu_percent(interval=None)
 
+    # pushed metrics may not reuse a name the exporter already exports
+    builtin = {m.name for c in (PROCESS_CPU, PROCESS_MEM, CPU_TEMP, UPTIME, LAST_HEARTBEAT, CAMERA_FRAMES,
+                                BATTERY_VOLT, SENSOR_STALENESS, SENSOR_TIMEOUTS, SENSOR_ERRORS)
+               for m in c.describe()}
+    ingest = IngestCollector(reserved=builtin | {n + '_total' for n in builtin}, helps=INGEST_HELP)
+    # servo placeholders until the daemon pushes real positions
+    ingest.apply(b'picrawler_servos_position_degrees{servo="servo0"} 0\n'
+                 b'picrawler_servos_position_degrees{servo="servo1"} 0')
+    REGISTRY.register(ingest)
+    listener = None
+    if args.ingest_socket:
+        listener = IngestListener(ingest, args.ingest_socket)
+        listener.start()
+
+    sampler = Sampler(default_sensors(args.fast_interval, args.interval, args.slow_interval, history))
+    sampler.start()
     try:
         while True:
-            update_metrics()
-            time.sleep(args.interval)
+            time.sleep(3600)
     except KeyboardInterrupt:
+        sampler.stop()
+        if listener is not None:
+            listener.stop()
+        if history is not None:
+            history.close()
         print("Exporter stopped")
@@ -0,0 +1,42 @@
+"""Token bucket shared by the alert rate limiter and the AI agent's request limiter.
+
+Plain Python with no dependencies; callers pass the clock in (``time.monotonic()``),
+so buckets are cheap to test and never read the time themselves.
+"""
+from typing import Optional
+
+
+class TokenBucket:
+    """Refills one token every ``per_seconds`` up to ``burst`` tokens."""
+    __slots__ = ('per_seconds', 'burst', 'tokens', 'updated')
+
+    def __init__(self, per_seconds: float, burst: float, tokens: float = None, updated: float = None):
+        self.per_seconds = per_seconds
+        self.burst = burst
+        self.tokens = burst if tokens is None else tokens
+        self.updated = updated
+
+    def take(self, now: float) -> bool:
+        if self.updated is not None and self.per_seconds > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.per_seconds)
+        elif self.per_seconds <= 0:
+            self.tokens = self.burst
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def reserve(self, now: float, max_wait: float) -> Optional[float]:
+        """Claim the next token; returns seconds until it is due, or None if that is more than ``max_wait``.
+
+        Claims may run the bucket negative, so successive callers queue up in
+        arrival order behind each other.
+        """
+        if self.take(now):
+            return 0.0
+        wait = (1 - self.tokens) * self.per_seconds
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
@@ -6,108 +6,545 @@ This is intentionally small and testable; enforcement actions are returned for c
 code (e.g., watchdog-agent) to execute.
 """
 from glob import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
 import yaml
 import time
-import operator
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Mapping, Optional, Tuple
 
-OP_MAP = {
-    '>': operator.gt,
-    '<': operator.lt,
-    '>=': operator.ge,
-    '<=': operator.le,
-    '==': operator.eq,
-    '!=': operator.ne,
-}
+from scripts.conditions import (  # noqa: F401 (OP_MAP re-exported)
+    OP_MAP, ConditionError, compile_condition, compile_vector_condition, parse_condition, referenced_metrics,
+)
+from scripts.series import LABEL_AGGREGATES, SeriesStore
+from scripts.windows import AGGREGATES, DEFAULT_MAX_SAMPLES, SlidingWindow, rolling_aggregate
+
+logger = logging.getLogger("rules_engine")
+
+# libyaml's loader is several times faster than the pure-Python one on a Pi
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+RULES_CACHE_ENV = 'PICRAWLER_RULES_CACHE'
+RULES_CACHE_VERSION = 1
+
+
+class RuleCache:
+    """Validated rule definitions keyed by file content hash.
+
+    Stored as JSON (not pickle) so a tampered cache file cannot execute code.
+    Entries are only written for files whose rules constructed cleanly, and any
+    change to a file's bytes misses the cache and re-parses the YAML.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Any] = {}  # rule file path -> [sha256, [rule dicts]]
+        self.dirty = False
+        try:
+            with open(path, 'r') as fh:
+                data = json.load(fh)
+            if data.get('version') == RULES_CACHE_VERSION:
+                self.entries = data.get('files', {})
+        except (OSError, ValueError, AttributeError):
+            pass  # missing or unreadable cache: rebuild from YAML
+
+    def get(self, rule_path: str, digest: str):
+        entry = self.entries.get(rule_path)
+        if entry and entry[0] == digest:
+            return entry[1]
+        return None
+
+    def put(self, rule_path: str, digest: str, cfgs: Any):
+        try:
+            json.dumps(cfgs)
+        except (TypeError, ValueError):
+            return  # YAML produced something JSON cannot hold; always parse this file
+        self.entries[rule_path] = [digest, cfgs]
+        self.dirty = True
+
+    def prune(self, live_paths):
+        for p in [p for p in self.entries if p not in live_paths]:
+            del self.entries[p]
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            d = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(d, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=d, prefix='.rules-cache-')
+            with os.fdopen(fd, 'w') as fh:
+                json.dump({'version': RULES_CACHE_VERSION, 'files': self.entries}, fh)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError:
+            logger.exception("Failed to write rule cache %s", self.path)
+
+
+class RuleConfigError(ValueError):
+    """Raised when a rule definition is invalid and cannot be loaded."""
 
 
 class Rule:
     def __init__(self, data: Dict[str, Any]):
+        self.data = data
         self.id = data['id']
         self.severity = data.get('severity', 'medium')
         self.description = data.get('description', '')
         self.trigger = data.get('trigger', {})
         self.enforcement_action = data.get('enforcement_action', [])
         self.duration = self.trigger.get('duration_seconds', 0)
+        # Conditions are compiled once here so evaluation never parses strings.
+        self.condition = None
+        self.predicate = None
+        self._vector_predicate = None
+        cond = self.trigger.get('condition')
+        if cond is not None and 'metric' in self.trigger:
+            try:
+                self.condition = parse_condition(cond)
+            except ConditionError as e:
+                raise RuleConfigError(f"rule {self.id}: {e}") from e
+            self.predicate = compile_condition(self.condition)
+        # Optional windowed aggregate applied to the metric before the condition.
+        self.aggregate = self.trigger.get('aggregate')
+        self.window_seconds = self.trigger.get('window_seconds')
+        self.max_samples = self.trigger.get('max_samples', DEFAULT_MAX_SAMPLES)
+        if self.aggregate is not None:
+            if self.aggregate not in AGGREGATES:
+                raise RuleConfigError(f"rule {self.id}: unknown aggregate {self.aggregate!r}")
+            if not isinstance(self.window_seconds, (int, float)) or self.window_seconds <= 0:
+                raise RuleConfigError(f"rule {self.id}: aggregate requires a positive window_seconds")
+            if not isinstance(self.max_samples, int) or self.max_samples < 1:
+                raise RuleConfigError(f"rule {self.id}: max_samples must be a positive integer")
+        # Optional label selection for labeled series (only honoured with a SeriesStore snapshot).
+        self.labels = self.trigger.get('labels')
+        self.label_aggregate = self.trigger.get('label_aggregate')
+        if self.labels is not None and not isinstance(self.labels, dict):
+            raise RuleConfigError(f"rule {self.id}: labels must be a mapping")
+        if self.label_aggregate is not None and self.label_aggregate not in LABEL_AGGREGATES:
+            raise RuleConfigError(f"rule {self.id}: unknown label_aggregate {self.label_aggregate!r}")
+        if self.labels:
+            self.labels = {str(k): str(v) for k, v in self.labels.items()}
+        self.selects_labels = bool(self.labels) or self.label_aggregate is not None
+        self.action_policy = self._action_policy(data.get('cooldown_seconds'), data.get('fire_once'))
 
-    def match_metric(self, metric_name: str, value: float) -> bool:
-        trig = self.trigger
-        if 'metric' not in trig:
-            return False
-        if trig['metric'] != metric_name:
-            return False
-        cond = trig.get('condition')
-        if not cond:
+    def _action_policy(self, cooldown, fire_once) -> Dict[str, Tuple[float, bool]]:
+        """Per-action ``(cooldown_seconds, fire_once)`` for actions that are not run on every firing.
+
+        ``cooldown_seconds`` is a number for every action or a mapping action -> seconds;
+        ``fire_once`` is true for every action or a list of action names.
+        """
+        names = [next(iter(a)) if isinstance(a, dict) else a for a in self.enforcement_action]
+        if cooldown is None:
+            cooldowns = {}
+        elif isinstance(cooldown, dict):
+            cooldowns = cooldown
+        else:
+            cooldowns = {n: cooldown for n in names}
+        for n, secs in cooldowns.items():
+            if n not in names:
+                raise RuleConfigError(f"rule {self.id}: cooldown_seconds names unknown action {n!r}")
+            if isinstance(secs, bool) or not isinstance(secs, (int, float)) or secs < 0:
+                raise RuleConfigError(f"rule {self.id}: cooldown_seconds must be a non-negative number")
+        if fire_once is None or fire_once is False:
+            once = set()
+        elif fire_once is True:
+            once = set(names)
+        elif isinstance(fire_once, list):
+            once = set(fire_once)
+            unknown = once.difference(names)
+            if unknown:
+                raise RuleConfigError(f"rule {self.id}: fire_once names unknown action {sorted(unknown)[0]!r}")
+        else:
+            raise RuleConfigError(f"rule {self.id}: fire_once must be a boolean or a list of actions")
+        return {n: (float(cooldowns.get(n, 0)), n in once) for n in names if cooldowns.get(n) or n in once}
+
+    def new_window(self) -> SlidingWindow:
+        return SlidingWindow(self.aggregate, self.window_seconds, self.max_samples)
+
+    def vector_predicate(self):
+        """NumPy form of the condition, built on first use (backtesting only)."""
+        if self._vector_predicate is None and self.condition is not None:
+            self._vector_predicate = compile_vector_condition(self.condition)
+        return self._vector_predicate
+
+    def match_metric(self, metric_name: str, value: float, metrics: Optional[Mapping[str, float]] = None) -> bool:
+        """Return True if the rule's condition holds for ``value``.
+
+        ``metrics`` is the full snapshot and is only needed for conditions that
+        reference other metrics.
+        """
+        if self.predicate is None or self.trigger['metric'] != metric_name:
             return False
-        # condition format: "< 6.0" or "> 85"
-        parts = cond.strip().split()
-        if len(parts) == 2:
-            op_sym, threshold = parts
-            op = OP_MAP.get(op_sym)
-            if op is None:
-                return False
-            try:
-                thr = float(threshold)
-                return op(value, thr)
-            except Exception:
-                return False
-        return False
+        return self.predicate(value, metrics)
 
 
 class RulesEngine:
-    def __init__(self, rules_path_pattern='config/rules/*.yaml'):
+    def __init__(self, rules_path_pattern='config/rules/*.yaml', cache_path: Optional[str] = None):
         self.rules: List[Rule] = []
-        self.state = {}  # state to track durations: {rule_id: {'start_ts': float}}
+        self.by_metric: Dict[str, List[Rule]] = {}  # metric name -> rules watching it
+        self.subscribed: frozenset = frozenset()  # every metric name any rule reads
+        # per-rule state: {rule_id: {'start_ts': float, 'window': SlidingWindow, 'firing': bool}}
+        self.state = {}
+        # called with a rule ID when a rule that fired stops matching (see ActionGate.clear)
+        self.on_clear: Optional[Callable[[str], None]] = None
+        self.pattern = rules_path_pattern
+        self.files: Dict[str, Any] = {}  # path -> ((mtime_ns, size), [Rule, ...])
+        self.duplicates: Dict[str, List[str]] = {}  # rule_id -> paths defining it more than once
+        self._reload_lock = threading.Lock()
+        self._reload_stop = None
+        cache_path = cache_path or os.environ.get(RULES_CACHE_ENV)
+        self.cache = RuleCache(cache_path) if cache_path else None
         self.load_rules(rules_path_pattern)
 
     def load_rules(self, pattern: str):
-        self.rules = []
-        for path in glob(pattern):
-            with open(path, 'r') as fh:
-                cfgs = yaml.safe_load(fh)
-                if not cfgs:
+        """Load every rule file matching ``pattern``; invalid rules raise."""
+        self.pattern = pattern
+        self.files = {}
+        self.reload_rules(strict=True)
+
+    def _parse_file(self, path: str) -> List[Rule]:
+        with open(path, 'rb') as fh:
+            raw = fh.read()
+        if self.cache is None:
+            return [Rule(r) for r in yaml.load(raw, Loader=YAML_LOADER) or []]
+        digest = hashlib.sha256(raw).hexdigest()
+        cfgs = self.cache.get(path, digest)
+        if cfgs is not None:
+            return [Rule(r) for r in cfgs]
+        cfgs = yaml.load(raw, Loader=YAML_LOADER) or []
+        rules = [Rule(r) for r in cfgs]
+        self.cache.put(path, digest, cfgs)
+        return rules
+
+    def reload_rules(self, strict: bool = False) -> Dict[str, Any]:
+        """Re-read only the rule files whose mtime or size changed.
+
+        The new rule list and metric index are built off to the side and swapped in
+        with a single assignment, so a concurrent ``evaluate_snapshot`` sees either
+        the old or the new rule set. Duration/window state is kept for rule IDs
+        whose definition did not change and dropped for changed or removed ones.
+
+        With ``strict=False`` a file that fails to parse keeps its previous rules and
+        is reported under ``errors``. Returns a report dict with ``changed``,
+        ``removed``, ``errors``, ``duplicates`` and ``reset`` (rule IDs whose state
+        was dropped).
+        """
+        report = {'changed': [], 'removed': [], 'errors': {}, 'duplicates': {}, 'reset': []}
+        with self._reload_lock:
+            old_files = self.files
+            files = {}
+            for path in sorted(glob(self.pattern)):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # vanished between glob and stat
+                sig = (st.st_mtime_ns, st.st_size)
+                prev = old_files.get(path)
+                if prev is not None and prev[0] == sig:
+                    files[path] = prev
                     continue
-                for r in cfgs:
-                    self.rules.append(Rule(r))
+                try:
+                    files[path] = (sig, self._parse_file(path))
+                except (yaml.YAMLError, RuleConfigError, KeyError, TypeError) as e:
+                    if strict:
+                        raise
+                    logger.error("Failed to reload %s, keeping previous rules: %s", path, e)
+                    report['errors'][path] = str(e)
+                    if prev is not None:
+                        files[path] = prev
+                    continue
+                report['changed'].append(path)
+            report['removed'] = [p for p in old_files if p not in files]
+            if self.cache is not None:
+                self.cache.prune(files)
+                self.cache.save()
+            if not report['changed'] and not report['removed'] and not strict:
+                report['duplicates'] = self.duplicates
+                return report
+
+            rules = [r for _, file_rules in files.values() for r in file_rules]
+            seen: Dict[str, List[str]] = {}
+            for path, (_, file_rules) in files.items():
+                for r in file_rules:
+                    seen.setdefault(r.id, []).append(path)
+            duplicates = {rid: paths for rid, paths in seen.items() if len(paths) > 1}
+            for rid, paths in duplicates.items():
+                if self.duplicates.get(rid) != paths:
+                    logger.warning("Rule %s is defined %d times: %s", rid, len(paths), ', '.join(paths))
 
-    def evaluate_snapshot(self, metrics: Dict[str, float], ts: float = None) -> List[Dict[str, Any]]:
+            old_defs: Dict[str, List[Any]] = {}
+            for r in self.rules:
+                old_defs.setdefault(r.id, []).append(r.data)
+            new_defs: Dict[str, List[Any]] = {}
+            for r in rules:
+                new_defs.setdefault(r.id, []).append(r.data)
+
+            # swap: evaluate_snapshot only reads self.by_metric, so publish it last
+            self.rules = rules
+            self.subscribed = self._subscriptions(rules)
+            self.by_metric = self._index(rules)
+            self.files = files
+            self.duplicates = duplicates
+            for rid in list(self.state):
+                if old_defs.get(rid) != new_defs.get(rid) and rid in old_defs:
+                    if self.state.pop(rid, {}).get('firing'):
+                        self._cleared(rid)
+                    report['reset'].append(rid)
+            report['duplicates'] = duplicates
+        return report
+
+    def start_auto_reload(self, interval: float = 5.0) -> threading.Thread:
+        """Poll rule files every ``interval`` seconds on a daemon thread."""
+        self.stop_auto_reload()
+        stop = self._reload_stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    report = self.reload_rules()
+                    if report['changed'] or report['removed']:
+                        logger.info("Reloaded rules: changed=%s removed=%s", report['changed'], report['removed'])
+                except Exception:
+                    logger.exception("Rule reload failed")
+
+        t = threading.Thread(target=loop, name='rules-reload', daemon=True)
+        t.start()
+        return t
+
+    def stop_auto_reload(self):
+        if self._reload_stop is not None:
+            self._reload_stop.set()
+            self._reload_stop = None
+
+    def build_index(self):
+        """Rebuild the metric name -> rules index from self.rules."""
+        self.subscribed = self._subscriptions(self.rules)
+        self.by_metric = self._index(self.rules)
+
+    @staticmethod
+    def _subscriptions(rules: List[Rule]) -> frozenset:
+        names = set()
+        for rule in rules:
+            if rule.trigger.get('metric'):
+                names.add(rule.trigger['metric'])
+            if rule.condition is not None:
+                names.update(referenced_metrics(rule.condition))
+        return frozenset(names)
+
+    @staticmethod
+    def _index(rules: List[Rule]) -> Dict[str, List[Rule]]:
+        # rules keep their load order within each bucket so evaluation order is stable
+        index: Dict[str, List[Rule]] = {}
+        for rule in rules:
+            mname = rule.trigger.get('metric')
+            if mname:
+                index.setdefault(mname, []).append(rule)
+        return index
+
+    def evaluate_snapshot(self, metrics: Mapping[str, float], ts: float = None) -> List[Dict[str, Any]]:
         """Evaluate current metrics and return list of enforcement actions triggered.
 
-        metrics: mapping metric_name -> numeric value
+        metrics: mapping metric_name -> numeric value, or a SeriesStore so rules can
+            select series by label
         ts: unix timestamp
         """
         ts = ts or time.time()
         actions = []
-        for rule in self.rules:
-            trig = rule.trigger
-            if 'metric' in trig:
-                mname = trig['metric']
-                if mname in metrics:
-                    val = metrics[mname]
-                    matched = rule.match_metric(mname, val)
-                    if matched:
-                        # handle duration
-                        if rule.duration and rule.duration > 0:
-                            st = self.state.get(rule.id, {}).get('start_ts')
-                            if st is None:
-                                # start duration timer
-                                self.state.setdefault(rule.id, {})['start_ts'] = ts
-                                # not yet triggered
-                                continue
-                            else:
-                                if ts - st >= rule.duration:
-                                    actions.append({'rule_id': rule.id, 'actions': rule.enforcement_action})
-                                else:
-                                    # still waiting for duration
-                                    continue
-                        else:
-                            actions.append({'rule_id': rule.id, 'actions': rule.enforcement_action})
-                    else:
-                        # reset state if previously started
-                        if rule.id in self.state and 'start_ts' in self.state[rule.id]:
-                            del self.state[rule.id]['start_ts']
+        index = self.by_metric
+        # Walk whichever side is smaller: a full scrape has hundreds of samples but
+        # only a handful of them are watched by rules.
+        if len(metrics) < len(index):
+            names = [m for m in metrics if m in index]
+        else:
+            names = [m for m in index if m in metrics]
+        for mname in names:
+            self._evaluate_rules(index[mname], mname, metrics, ts, actions)
+        return actions
+
+    def evaluate_metric(self, mname: str, metrics: Mapping[str, float], ts: float = None,
+                        severity: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Evaluate only the rules watching ``mname``, e.g. when a single reading arrives.
+
+        ``severity`` restricts evaluation to rules of that severity (the event-driven
+        safety path passes 'critical'). State is shared with evaluate_snapshot.
+        """
+        ts = ts or time.time()
+        actions = []
+        rules = self.by_metric.get(mname)
+        if rules and mname in metrics:
+            if severity is not None:
+                rules = [r for r in rules if r.severity == severity]
+            self._evaluate_rules(rules, mname, metrics, ts, actions)
         return actions
 
+    def _evaluate_rules(self, rules: List[Rule], mname: str, metrics: Mapping[str, float], ts: float,
+                        actions: List[Dict[str, Any]]):
+        if isinstance(metrics, SeriesStore):
+            series = None
+            for rule in rules:
+                if rule.selects_labels:
+                    v = metrics.select(mname, rule.labels, rule.label_aggregate or 'max')
+                    if v is not None:
+                        self._evaluate_rule(rule, mname, v, ts, actions, metrics)
+                    continue
+                # no selector: every series is checked and any match counts, so one low
+                # battery cell or one close ultrasonic sensor is never hidden by the others
+                if series is None:
+                    series = list(metrics.series(mname))
+                if len(series) == 1:
+                    self._evaluate_rule(rule, mname, series[0][1], ts, actions, metrics)
+                else:
+                    self._evaluate_any(rule, mname, series, ts, actions, metrics)
+            return
+        val = metrics[mname]
+        for rule in rules:
+            # plain dicts carry one value per name; only label selection is impossible
+            if not rule.labels:
+                self._evaluate_rule(rule, mname, val, ts, actions, metrics)
+
+    def _evaluate_rule(self, rule: Rule, mname: str, val: float, ts: float, actions: List[Dict[str, Any]],
+                       metrics: Optional[Mapping[str, float]] = None):
+        if rule.aggregate is not None:
+            st = self.state.setdefault(rule.id, {})
+            window = st.get('window')
+            if window is None:
+                window = st['window'] = rule.new_window()
+            window.push(ts, val)
+            val = window.value()
+            if val is None:
+                # window cannot produce a value yet (e.g. rate from one sample)
+                return
+        self._apply_match(rule, rule.match_metric(mname, val, metrics), ts, actions)
+
+    def _evaluate_any(self, rule: Rule, mname: str, series, ts: float, actions: List[Dict[str, Any]],
+                      metrics: Mapping[str, float]):
+        """Evaluate ``rule`` on each ``(labels, value)`` series; windowed rules keep one window per series."""
+        if rule.aggregate is not None:
+            st = self.state.setdefault(rule.id, {})
+            old = st.get('windows') or {}
+            windows = st['windows'] = {}
+        matched = ready = False
+        for labels, val in series:
+            if rule.aggregate is not None:
+                window = windows[labels] = old.get(labels) or rule.new_window()
+                window.push(ts, val)
+                val = window.value()
+                if val is None:
+                    continue
+            ready = True
+            if not matched:
+                matched = rule.match_metric(mname, val, metrics)
+        if ready:
+            self._apply_match(rule, matched, ts, actions)
+
+    def _apply_match(self, rule: Rule, matched: bool, ts: float, actions: List[Dict[str, Any]]):
+        if matched:
+            # handle duration
+            if rule.duration and rule.duration > 0:
+                st = self.state.get(rule.id, {}).get('start_ts')
+                if st is None:
+                    # start duration timer; not yet triggered
+                    self.state.setdefault(rule.id, {})['start_ts'] = ts
+                elif ts - st >= rule.duration:
+                    self._fire(rule, actions)
+                # else: still waiting for duration
+            else:
+                self._fire(rule, actions)
+        else:
+            # reset state if previously started
+            st = self.state.get(rule.id)
+            if st:
+                st.pop('start_ts', None)
+                if st.pop('firing', False):
+                    self._cleared(rule.id)
+
+    def _fire(self, rule: Rule, actions: List[Dict[str, Any]]):
+        self.state.setdefault(rule.id, {})['firing'] = True
+        actions.append({'rule_id': rule.id, 'severity': rule.severity, 'actions': rule.enforcement_action,
+                        'policy': rule.action_policy})
+
+    def _cleared(self, rule_id: str):
+        if self.on_clear is not None:
+            try:
+                self.on_clear(rule_id)
+            except Exception:
+                logger.exception("on_clear hook failed for %s", rule_id)
+
+    def evaluate_series(self, metric_arrays: Mapping[str, Any], timestamps: Any) -> List[Dict[str, Any]]:
+        """Backtest all rules over recorded telemetry in one vectorized pass.
+
+        metric_arrays: mapping metric_name -> 1-D array aligned with ``timestamps``;
+            NaN marks a tick where the metric was not scraped.
+        timestamps: 1-D array of unix timestamps, ascending.
+
+        Returns one entry per rule that fired: ``{'rule_id', 'actions', 'indices',
+        'timestamps'}`` where ``indices`` are the sample positions at which
+        ``evaluate_snapshot`` would have returned the rule. Duration semantics match
+        ``evaluate_snapshot`` from a fresh state: a run of matching samples starts a
+        timer at its first sample and fires on every sample at least
+        ``duration_seconds`` later; a non-matching sample resets it and a missing
+        sample leaves it untouched. Rules are evaluated independently, so duplicate
+        rule IDs do not share a timer here. ``self.state`` is not modified.
+        """
+        import numpy as np
+
+        ts = np.asarray(timestamps, dtype=np.float64)
+        arrays = {k: np.asarray(v, dtype=np.float64) for k, v in metric_arrays.items()}
+        for name, arr in arrays.items():
+            if arr.shape != ts.shape:
+                raise ValueError(f"series for {name} has shape {arr.shape}, expected {ts.shape}")
+        results = []
+        for rule in self.rules:
+            mname = rule.trigger.get('metric')
+            vpred = rule.vector_predicate()
+            if vpred is None or mname not in arrays:
+                continue
+            values = arrays[mname]
+            present = ~np.isnan(values)
+            others = {k: arrays[k] for k in referenced_metrics(rule.condition) if k in arrays}
+            if present.all():
+                idx = None
+                t, v = ts, values
+            else:
+                idx = np.flatnonzero(present)
+                t, v = ts[idx], values[idx]
+                others = {k: a[idx] for k, a in others.items()}
+            if v.size == 0:
+                continue
+            if rule.aggregate is not None:
+                agg = rolling_aggregate(t, v, rule.aggregate, rule.window_seconds, rule.max_samples)
+                ready = ~np.isnan(agg)
+                if not ready.all():
+                    # like missing samples, windows without a value leave timers untouched
+                    keep = np.flatnonzero(ready)
+                    idx = keep if idx is None else idx[keep]
+                    t, agg = t[keep], agg[keep]
+                    others = {k: a[keep] for k, a in others.items()}
+                v = agg
+            matched = np.asarray(vpred(v, others), dtype=bool)
+            if not matched.any():
+                continue
+            if rule.duration and rule.duration > 0:
+                # run-length detection: every matched sample knows when its run started
+                starts = matched & ~np.concatenate(([False], matched[:-1]))
+                run_id = np.cumsum(starts)
+                start_ts = t[starts]
+                fired = matched & (t - start_ts[np.maximum(run_id - 1, 0)] >= rule.duration)
+            else:
+                fired = matched
+            pos = np.flatnonzero(fired)
+            if pos.size == 0:
+                continue
+            if idx is not None:
+                pos = idx[pos]
+            results.append({'rule_id': rule.id, 'actions': rule.enforcement_action,
+                            'indices': pos, 'timestamps': ts[pos]})
+        return results
+
 
 if __name__ == '__main__':
     # Simple CLI demo
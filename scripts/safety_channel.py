@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Event-driven safety path: sensor readings pushed over a Unix datagram socket.
+
+The scrape loop reacts to a collision only after the exporter has sampled the
+sensor and the watchdog has polled it, which can take seconds. Producers that
+already hold a fresh reading (the daemon, navigation agent) publish it here
+instead, and the listener evaluates the ``severity: critical`` rules watching
+that metric as soon as the datagram arrives.
+
+Wire format: one or more lines per datagram, each ``name value`` or
+``name{label="v",...} value`` (the Prometheus sample syntax without a
+timestamp). Publishing never blocks; if the listener is gone or its buffer is
+full the reading is dropped and the scrape path still covers it.
+
+Run a simulated producer:
+  python3 scripts/safety_channel.py --metric ultrasonic_distance_m --value 0.05
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from scripts.rules_engine import RulesEngine
+from scripts.scrape_parser import format_series, parse_labels, sample_value, split_sample
+from scripts.series import SeriesStore
+
+logger = logging.getLogger("safety_channel")
+
+DEFAULT_SOCKET = os.environ.get('PICRAWLER_SAFETY_SOCKET', '/tmp/picrawler_safety.sock')
+MAX_DATAGRAM = 4096
+
+
+class SafetyPublisher:
+    """Non-blocking sender used by sensor producers."""
+
+    def __init__(self, path: str = DEFAULT_SOCKET):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def publish(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> bool:
+        line = f'{format_series(name, labels)} {value!r}'
+        try:
+            self.sock.sendto(line.encode(), self.path)
+            return True
+        except OSError:
+            # listener not running or backlog full: never stall the producer
+            return False
+
+    def close(self):
+        self.sock.close()
+
+
+class SafetyListener:
+    """Receives readings and evaluates critical rules on every arrival.
+
+    ``on_actions`` is called on the listener thread with the triggered action
+    list, so stop_motors runs without waiting for the next scrape tick.
+
+    The engine is only touched from the listener thread: ``request_reload``
+    asks that thread to reload the rules between datagrams.
+    """
+
+    def __init__(self, engine: RulesEngine, on_actions: Callable[[List[Dict]], None],
+                 path: str = DEFAULT_SOCKET, severity: str = 'critical'):
+        self.engine = engine
+        self.on_actions = on_actions
+        self.path = path
+        self.severity = severity
+        self.store = SeriesStore()  # last known value per pushed series
+        self.sock = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._reload = threading.Event()
+
+    def request_reload(self):
+        """Reload the engine's rules on the listener thread (within one receive timeout)."""
+        self._reload.set()
+
+    def _reload_if_requested(self):
+        if self._reload.is_set():
+            self._reload.clear()
+            try:
+                self.engine.reload_rules()
+            except Exception:
+                logger.exception("Safety rule reload failed")
+
+    def handle_datagram(self, data: bytes, ts: float = None) -> List[Dict]:
+        """Apply one datagram and return the actions it triggered."""
+        ts = ts or time.time()
+        actions = []
+        store = self.store
+        for line in data.split(b'\n'):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                name, raw, rest = split_sample(line)
+                value = float(sample_value(rest, line))
+                name = name.decode()
+                key = store.lookup(name, raw)
+                if key is None:
+                    key = store.key(name, parse_labels(raw.decode()) if raw else None, raw=raw)
+            except (ValueError, UnicodeDecodeError):
+                logger.warning("Dropping malformed safety reading %r", line[:80])
+                continue
+            store.set_key(key, value)
+            actions.extend(self.engine.evaluate_metric(name, store, ts=ts, severity=self.severity))
+        if actions:
+            self.on_actions(actions)
+        return actions
+
+    def bind(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.settimeout(0.5)  # lets stop() be noticed
+
+    def serve_forever(self):
+        if self.sock is None:
+            self.bind()
+        while not self._stop.is_set():
+            self._reload_if_requested()
+            try:
+                data = self.sock.recv(MAX_DATAGRAM)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stop.is_set():
+                    break
+                raise
+            try:
+                self.handle_datagram(data)
+            except Exception:
+                logger.exception("Safety evaluation failed")
+
+    def start(self) -> threading.Thread:
+        self.bind()
+        self._thread = threading.Thread(target=self.serve_forever, name='safety-listener', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--metric', required=True)
+    parser.add_argument('--value', type=float, required=True)
+    args = parser.parse_args()
+    ok = SafetyPublisher(args.socket).publish(args.metric, args.value)
+    print('sent' if ok else 'no listener on ' + args.socket)
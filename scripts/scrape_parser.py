@@ -0,0 +1,115 @@
+"""Streaming parser for the Prometheus text exposition format.
+
+Built for the watchdog scrape path: it consumes the response body chunk by
+chunk, looks only at the metric name of each sample line and skips the line
+unless some rule subscribed to that name. Matching lines go straight into a
+SeriesStore; label text is parsed only the first time a series is seen, after
+that the raw ``{...}`` bytes are the interned lookup key.
+
+``split_sample``/``sample_value`` are the one sample-line splitter, shared with
+the safety channel and the local ingestion endpoint; ``format_series`` writes
+the ``name{labels}`` part for their publishers.
+"""
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from scripts.series import SeriesStore
+
+_LABEL_RE = re.compile(r'\s*([A-Za-z_][A-Za-z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+_UNESCAPE = {'\\\\': '\\', '\\"': '"', '\\n': '\n'}
+_ESCAPE_RE = re.compile(r'[\\"\n]')
+_ESCAPE = {v: k for k, v in _UNESCAPE.items()}
+
+
+class ExpositionError(ValueError):
+    """Raised for a sample line that cannot be parsed."""
+
+
+def parse_labels(text: str) -> Dict[str, str]:
+    """Parse the inside of a ``{...}`` label block."""
+    labels = {}
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _LABEL_RE.match(text, pos)
+        if not m:
+            raise ExpositionError(f"bad label set {{{text}}}")
+        val = m.group(2)
+        if '\\' in val:
+            val = re.sub(r'\\[\\"n]', lambda e: _UNESCAPE[e.group(0)], val)
+        labels[m.group(1)] = val
+        pos = m.end()
+    return labels
+
+
+def format_series(name: str, labels: Optional[Dict[str, str]] = None) -> str:
+    """``name{k="v",...}`` with labels sorted and values escaped as ``parse_labels`` expects."""
+    if not labels:
+        return name
+    inner = ','.join('%s="%s"' % (k, _ESCAPE_RE.sub(lambda e: _ESCAPE[e.group(0)], str(v)))
+                     for k, v in sorted(labels.items()))
+    return f'{name}{{{inner}}}'
+
+
+def split_sample(line: bytes) -> Tuple[bytes, Optional[bytes], bytes]:
+    """Split a sample line into ``(name, label text or None, rest)``.
+
+    The label text is the raw inside of ``{...}`` (callers intern on it and parse
+    it with ``parse_labels`` only when needed); ``rest`` holds the value and an
+    optional timestamp.
+    """
+    brace = line.find(b'{')
+    space = line.find(b' ')
+    if brace != -1 and (space == -1 or brace < space):
+        close = line.rfind(b'}')
+        if close < brace:
+            raise ExpositionError(f"unterminated label set: {line[:80]!r}")
+        return line[:brace], line[brace + 1:close], line[close + 1:]
+    if space == -1:
+        return line, None, b''
+    return line[:space], None, line[space:]
+
+
+def sample_value(rest: bytes, line: bytes = b'') -> bytes:
+    """The value field of ``rest`` from ``split_sample``, still as bytes (it may carry a sign)."""
+    fields = rest.split()
+    if not fields:
+        raise ExpositionError(f"sample without value: {line[:80]!r}")
+    return fields[0]
+
+
+def _iter_lines(chunks: Iterable[bytes]) -> Iterable[bytes]:
+    tail = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def parse_into(chunks: Iterable[bytes], store: SeriesStore, subscribed: Optional[Iterable[str]] = None) -> int:
+    """Feed exposition ``chunks`` into ``store``; returns the number of samples kept.
+
+    ``subscribed`` limits parsing to those metric (sample) names; None keeps all.
+    The caller brackets this with ``store.begin_scrape()``/``end_scrape()``.
+    """
+    wanted = None if subscribed is None else {n.encode() for n in subscribed}
+    kept = 0
+    for line in _iter_lines(chunks):
+        if not line or line[0] == 0x23:  # '#': HELP/TYPE/EOF comments
+            continue
+        name, raw, rest = split_sample(line)
+        if wanted is not None and name not in wanted:
+            continue
+        value = float(sample_value(rest, line))
+        sname = name.decode()
+        key = store.lookup(sname, raw)
+        if key is None:
+            labels = parse_labels(raw.decode()) if raw else None
+            key = store.key(sname, labels, raw=raw)
+        store.set_key(key, value)
+        kept += 1
+    return kept
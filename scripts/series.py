@@ -0,0 +1,139 @@
+"""Label-aware store for scraped Prometheus samples.
+
+Every series is keyed by ``(name, frozenset(labels))``. Keys are interned the
+first time a series is seen and values are updated in place on later scrapes,
+so a steady-state scrape allocates no new dicts or keys.
+
+The store is also a read-only ``Mapping[str, float]`` over metric names (the
+"flat view"): the unlabeled series, or the only series of that name. A name
+with several labeled series and no unlabeled one has no single value, so
+indexing it raises AmbiguousSeriesError (a KeyError, so ``get`` returns None)
+rather than picking one and hiding the others. The rules engine evaluates such
+metrics per series (a rule without a selector fires if any series matches), or
+through ``select`` via ``trigger.labels`` and ``trigger.label_aggregate``.
+"""
+from collections.abc import Mapping
+from typing import Dict, FrozenSet, Hashable, Iterator, Optional, Tuple
+
+LABEL_AGGREGATES = ('max', 'min', 'avg', 'sum', 'count')
+
+SeriesKey = Tuple[str, FrozenSet[Tuple[str, str]]]
+_NO_LABELS: FrozenSet[Tuple[str, str]] = frozenset()
+
+
+class AmbiguousSeriesError(KeyError):
+    """Raised by the flat view for a name with several labeled series."""
+
+
+class SeriesStore(Mapping):
+    def __init__(self):
+        self.values: Dict[SeriesKey, float] = {}
+        self.by_name: Dict[str, Dict[SeriesKey, None]] = {}  # name -> ordered set of keys
+        self._interned: Dict[Hashable, SeriesKey] = {}  # raw label form -> canonical key
+        self._spellings: Dict[SeriesKey, list] = {}  # key -> its entries in _interned, pruned with the series
+        self._stamp: Dict[SeriesKey, int] = {}  # key -> generation it was last written
+        self.generation = 0
+        self._written = 0
+
+    def key(self, name: str, labels=None, raw: Optional[Hashable] = None) -> SeriesKey:
+        """Return the interned key for a series.
+
+        ``raw`` is any hashable spelling of the label set that the caller already
+        has (e.g. the literal ``{servo="servo0"}`` text); when given, ``labels`` is
+        only consulted the first time the series is seen.
+        """
+        lookup = (name, raw) if raw is not None else (name, tuple(sorted(labels.items())) if labels else ())
+        key = self._interned.get(lookup)
+        if key is None:
+            key = (name, frozenset(labels.items()) if labels else _NO_LABELS)
+            canonical = (name, key[1])
+            if canonical not in self._interned:
+                self._interned[canonical] = key
+                self._spellings[key] = [canonical]
+            key = self._interned[canonical]
+            if lookup != canonical:
+                self._interned[lookup] = key
+                self._spellings[key].append(lookup)
+        return key
+
+    def lookup(self, name: str, raw: Optional[Hashable]) -> Optional[SeriesKey]:
+        """Return the interned key for a raw label spelling seen before, else None."""
+        return self._interned.get((name, raw if raw is not None else ()))
+
+    def begin_scrape(self):
+        self.generation += 1
+        self._written = 0
+
+    def set(self, name: str, labels, value: float, raw: Optional[Hashable] = None):
+        self.set_key(self.key(name, labels, raw), value)
+
+    def set_key(self, key: SeriesKey, value: float):
+        if key not in self.values:
+            self.by_name.setdefault(key[0], {})[key] = None
+        self.values[key] = value
+        if self._stamp.get(key) != self.generation:
+            self._stamp[key] = self.generation
+            self._written += 1
+
+    def end_scrape(self):
+        """Drop series that were not present in the scrape that just finished, and their interned keys."""
+        if self._written == len(self.values):
+            return
+        gen = self.generation
+        for key in [k for k, g in self._stamp.items() if g != gen]:
+            del self.values[key]
+            del self._stamp[key]
+            for lookup in self._spellings.pop(key, ()):
+                del self._interned[lookup]
+            names = self.by_name[key[0]]
+            del names[key]
+            if not names:
+                del self.by_name[key[0]]
+
+    def series(self, name: str) -> Iterator[Tuple[FrozenSet[Tuple[str, str]], float]]:
+        for key in self.by_name.get(name, ()):
+            yield key[1], self.values[key]
+
+    def select(self, name: str, labels: Optional[Dict[str, str]] = None, how: str = 'max') -> Optional[float]:
+        """Aggregate the series of ``name`` whose labels include ``labels``.
+
+        Returns None when nothing matches.
+        """
+        want = frozenset(labels.items()) if labels else _NO_LABELS
+        vals = [v for lbls, v in self.series(name) if want <= lbls]
+        if not vals:
+            return None
+        if how == 'max':
+            return max(vals)
+        if how == 'min':
+            return min(vals)
+        if how == 'sum':
+            return sum(vals)
+        if how == 'avg':
+            return sum(vals) / len(vals)
+        if how == 'count':
+            return float(len(vals))
+        raise ValueError(f"unknown label aggregate {how!r}")
+
+    # Mapping over metric names (flat view)
+
+    def __getitem__(self, name: str) -> float:
+        keys = self.by_name.get(name)
+        if not keys:
+            raise KeyError(name)
+        plain = self.values.get((name, _NO_LABELS))
+        if plain is not None:
+            return plain
+        if len(keys) == 1:
+            return self.values[next(iter(keys))]
+        raise AmbiguousSeriesError(f"{name} has {len(keys)} labeled series; select one with labels or "
+                                   f"label_aggregate")
+
+    def __contains__(self, name) -> bool:
+        return name in self.by_name
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.by_name)
+
+    def __len__(self) -> int:
+        return len(self.by_name)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""CPU throttling backend for the ``throttle_cpu_tasks`` action.
+
+Lowers CPU pressure by writing cgroup v2 ``cpu.max`` limits on the PiCrawler
+slices and lifts them again one step at a time as the temperature recovers.
+
+Throttle levels run from 0 (no limit) to ``levels - 1`` (tightest). At each level
+a slice gets a share of the machine's CPU time interpolated between 100% and its
+floor in SLICE_FLOORS, so the robot daemon keeps most of its CPU while the
+vision and AI slices are cut back first.
+
+Once engaged, a control loop reads the thermal zone every ``interval`` seconds:
+- still at or above ``high_c``: tighten one level per ``step_seconds``
+- at or below ``recover_c``: relax one level per ``step_seconds``, down to 0
+
+Slices missing from the cgroup tree are skipped. Writing ``cpu.max`` needs root
+or a delegated subtree; pass ``cgroup_root`` to point at another tree (the tests
+use a temporary directory).
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger("throttle")
+
+CGROUP_ROOT = os.environ.get('PICRAWLER_CGROUP_ROOT', '/sys/fs/cgroup')
+THERMAL_PATH = '/sys/class/thermal/thermal_zone0/temp'
+# slice -> fraction of total CPU left at the tightest level
+SLICE_FLOORS = {
+    'picrawler.slice': 0.5,
+    'vision.slice': 0.25,
+    'ai.slice': 0.1,
+}
+DEFAULT_PERIOD_US = 100000
+
+THROTTLE_LEVEL = Gauge("picrawler_cpu_throttle_level", "Current CPU throttle level (0 = unthrottled)")
+THROTTLE_QUOTA = Gauge(
+    "picrawler_cpu_throttle_quota_ratio", "CPU quota per slice as a fraction of all CPUs (1 = unlimited)", ['slice'])
+THROTTLE_STEPS = Counter("picrawler_cpu_throttle_steps_total", "CPU throttle level changes", ['direction'])
+
+
+def read_thermal(path: str = THERMAL_PATH) -> Optional[float]:
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip()) / 1000.0
+    except Exception:
+        return None
+
+
+class CpuThrottler:
+    def __init__(self, cgroup_root: str = CGROUP_ROOT, slices: Dict[str, float] = None,
+                 thermal_path: str = THERMAL_PATH, high_c: float = 85.0, recover_c: float = 80.0,
+                 levels: int = 4, step_seconds: float = 30.0, interval: float = 5.0, cpus: int = None):
+        self.cgroup_root = cgroup_root
+        self.slices = dict(SLICE_FLOORS if slices is None else slices)
+        self.thermal_path = thermal_path
+        self.high_c = high_c
+        self.recover_c = recover_c
+        self.levels = levels
+        self.step_seconds = step_seconds
+        self.interval = interval
+        self.cpus = cpus or os.cpu_count() or 1
+        self.level = 0
+        self.changed_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def quota_ratio(self, slice_name: str, level: int) -> float:
+        floor = self.slices[slice_name]
+        return 1.0 - (1.0 - floor) * level / max(1, self.levels - 1)
+
+    def _write_cpu_max(self, slice_name: str, ratio: float) -> bool:
+        path = os.path.join(self.cgroup_root, slice_name, 'cpu.max')
+        if not os.path.exists(path):
+            logger.debug("No cgroup for %s, skipping", slice_name)
+            return False
+        period = DEFAULT_PERIOD_US
+        try:
+            with open(path, 'r') as f:
+                period = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            pass
+        quota = 'max' if ratio >= 1.0 else str(max(1000, round(ratio * self.cpus * period)))
+        try:
+            with open(path, 'w') as f:
+                f.write(f'{quota} {period}\n')
+        except OSError:
+            logger.exception("Failed to write %s", path)
+            return False
+        THROTTLE_QUOTA.labels(slice_name).set(ratio)
+        return True
+
+    def set_level(self, level: int, now: float = None) -> bool:
+        """Apply ``level`` to every slice; True if at least one cgroup was updated."""
+        level = min(max(level, 0), self.levels - 1)
+        written = [self._write_cpu_max(s, self.quota_ratio(s, level)) for s in self.slices]
+        if not any(written):
+            return False
+        if level != self.level:
+            THROTTLE_STEPS.labels('down' if level > self.level else 'up').inc()
+            logger.info("CPU throttle level %d -> %d", self.level, level)
+        self.level = level
+        self.changed_at = time.monotonic() if now is None else now
+        THROTTLE_LEVEL.set(level)
+        return True
+
+    def engage(self, now: float = None) -> bool:
+        """Tighten by one level (at least to level 1) and start the control loop."""
+        with self._lock:
+            ok = self.set_level(max(1, self.level + 1), now)
+        if ok:
+            self.start()
+        return ok
+
+    def control(self, temp: Optional[float], now: float = None) -> int:
+        """One control step for ``temp``; returns the resulting level."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if temp is None or self.level == 0:
+                return self.level
+            if self.changed_at is not None and now - self.changed_at < self.step_seconds:
+                return self.level
+            if temp >= self.high_c and self.level < self.levels - 1:
+                self.set_level(self.level + 1, now)
+            elif temp <= self.recover_c:
+                self.set_level(self.level - 1, now)
+            return self.level
+
+    def start(self) -> threading.Thread:
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.control(read_thermal(self.thermal_path))
+                except Exception:
+                    logger.exception("CPU throttle control step failed")
+        self._thread = threading.Thread(target=loop, name='cpu-throttle', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, release: bool = True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if release:
+            with self._lock:
+                self.set_level(0)
@@ -1,52 +1,320 @@
 #!/usr/bin/env python3
-"""Watchdog agent: polls metrics endpoint and evaluates rules, printing or executing enforcement actions.
+"""Watchdog agent: polls metrics endpoints and evaluates rules, printing or executing enforcement actions.
 
-This is a lightweight runtime that can be extended to actually call motor stop endpoints
-or interact with systemd to restart agents.
+An asyncio runtime scrapes every target (local exporter, other agents, other robots)
+concurrently on its own interval and deadline; each target has its own rule state, so
+a slow target never delays safety evaluation for the others.
 """
+import asyncio
+import logging
+import os
 import time
 import requests
 import argparse
-from prometheus_client.parser import text_string_to_metric_families
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from scripts.enforcement import ActionGate, dispatch_firings, warm_motor_backend
 from scripts.rules_engine import RulesEngine
+from scripts.scrape_parser import parse_into
+from scripts.series import SeriesStore
 
+logger = logging.getLogger("watchdog")
 
-def fetch_metrics(url: str):
-    r = requests.get(url, timeout=5)
-    r.raise_for_status()
-    metrics = {}
-    for family in text_string_to_metric_families(r.text):
-        for m in family.samples:
-            # only take unlabelled metrics (or the first) for now
-            name = m.name
-            val = m.value
-            metrics[name] = val
-    return metrics
+SCRAPE_CHUNK_BYTES = 16384
+DEFAULT_CONNECT_TIMEOUT = 0.5
+DEFAULT_READ_TIMEOUT = 1.5
 
+# Watchdog self-metrics (served on --metrics-port)
+SCRAPE_SECONDS = Histogram(
+    "picrawler_watchdog_scrape_duration_seconds",
+    "Watchdog scrape latency by phase (http: request until headers, body: download and parse, total)",
+    ['target', 'phase'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+SCRAPE_ERRORS = Counter("picrawler_watchdog_scrape_errors_total", "Failed watchdog scrapes", ['target'])
+SCRAPE_NOT_MODIFIED = Counter(
+    "picrawler_watchdog_scrape_not_modified_total", "Scrapes answered with 304 Not Modified", ['target'])
 
-def run_watchdog(metrics_url: str, interval: float = 5.0):
-    engine = RulesEngine()
+
+class Scraper:
+    """Polls one metrics URL over a pooled keep-alive session.
+
+    Conditional polling: when the target sends an ETag it is echoed back in
+    If-None-Match, and a 304 leaves the store untouched. gzip is off by default
+    because on loopback compressing costs the Pi more than it saves.
+    """
+
+    def __init__(self, url: str, store: SeriesStore = None, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, gzip: bool = False, session: requests.Session = None,
+                 target: str = None):
+        self.url = url
+        self.store = store if store is not None else SeriesStore()
+        self.timeout = (connect_timeout, read_timeout)
+        self.target = target or url
+        self.etag = None
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        session.headers['Accept-Encoding'] = 'gzip' if gzip else 'identity'
+        self.session = session
+
+    def fetch(self, subscribed=None) -> SeriesStore:
+        """Scrape into ``self.store`` (updated in place) and return it.
+
+        The body is parsed as it streams in; with ``subscribed`` only those metric
+        names are kept. Every labeled series is kept; see SeriesStore for how rules
+        read them.
+        """
+        headers = {'If-None-Match': self.etag} if self.etag else None
+        start = time.perf_counter()
+        try:
+            with self.session.get(self.url, timeout=self.timeout, stream=True, headers=headers) as r:
+                headers_at = time.perf_counter()
+                SCRAPE_SECONDS.labels(self.target, 'http').observe(headers_at - start)
+                if r.status_code == 304:
+                    SCRAPE_NOT_MODIFIED.labels(self.target).inc()
+                    return self.store
+                r.raise_for_status()
+                self.store.begin_scrape()
+                parse_into(r.iter_content(SCRAPE_CHUNK_BYTES), self.store, subscribed)
+                self.etag = r.headers.get('ETag')
+            self.store.end_scrape()
+        except Exception:
+            SCRAPE_ERRORS.labels(self.target).inc()
+            raise
+        done = time.perf_counter()
+        SCRAPE_SECONDS.labels(self.target, 'body').observe(done - headers_at)
+        SCRAPE_SECONDS.labels(self.target, 'total').observe(done - start)
+        return self.store
+
+    def close(self):
+        self.session.close()
+
+
+def fetch_metrics(url: str, store: SeriesStore = None, subscribed=None) -> SeriesStore:
+    """One-off scrape of ``url``; long-running callers should keep a Scraper."""
+    scraper = Scraper(url, store)
+    try:
+        return scraper.fetch(subscribed)
+    finally:
+        scraper.close()
+
+
+DEFAULT_RULES_CACHE = os.path.expanduser('~/.cache/picrawler/rules.json')
+
+TICKS = Counter("picrawler_watchdog_ticks_total", "Completed scrape+evaluate cycles", ['target'])
+TICK_RATE = Gauge("picrawler_watchdog_tick_rate_hz", "Effective evaluation rate per target (EWMA)", ['target'])
+DEADLINE_MISSES = Counter(
+    "picrawler_watchdog_deadline_exceeded_total", "Scrapes that did not finish within the target deadline", ['target'])
+
+
+class Target:
+    """One scrape target with its own schedule, scraper and rule state.
+
+    Only targets with ``enforce`` run real enforcement, and only under
+    ``--enforce`` (see load_targets); remote robots default to dry-run so a
+    fleet target never stops this robot's motors unless configured to. Firings pass
+    through the target's ActionGate (rule ``cooldown_seconds`` / ``fire_once``).
+
+    The safety fast path (SafetyListener) evaluates on its own thread, so it gets
+    its own engine from ``attach_safety_engine``: rule state is never shared
+    between threads (the listener also reloads that engine itself), and a stale scraped value cannot clear a rule the fast path
+    just fired. Both engines share the gate; a rule re-arms only once neither
+    engine has it firing.
+    """
+
+    def __init__(self, name: str, url: str, interval: float = 5.0, deadline: float = None,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 gzip: bool = False, enforce: bool = False, rules_cache: str = DEFAULT_RULES_CACHE,
+                 rules_pattern: str = 'config/rules/*.yaml'):
+        self.name = name
+        self.interval = interval
+        self.deadline = deadline if deadline is not None else min(interval, connect_timeout + read_timeout)
+        self.enforce = enforce
+        self.rules_pattern = rules_pattern
+        self.rules_cache = rules_cache
+        self.engine = RulesEngine(rules_pattern, cache_path=rules_cache or None)
+        self.safety_engine = None
+        self.safety_listener = None
+        self.gate = ActionGate()
+        self.engine.on_clear = self._cleared
+        # hands firings to the enforcement pool off the event loop; only inline stops run on this thread,
+        # so a tick's stop never queues behind an earlier tick's slow action
+        self.enforcer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'enforce-{name}')
+        self.scraper = Scraper(url, connect_timeout=connect_timeout, read_timeout=read_timeout, gzip=gzip,
+                               target=name)
+        self.inflight = None
+        self.last_tick = None
+        self.rate = 0.0
+
+    def attach_safety_engine(self) -> RulesEngine:
+        """Create the separate engine evaluated by the safety listener thread."""
+        self.safety_engine = RulesEngine(self.rules_pattern, cache_path=self.rules_cache or None)
+        self.safety_engine.on_clear = self._cleared
+        return self.safety_engine
+
+    def engines(self):
+        return [e for e in (self.engine, self.safety_engine) if e is not None]
+
+    def _cleared(self, rule_id: str):
+        if not any((e.state.get(rule_id) or {}).get('firing') for e in self.engines()):
+            self.gate.clear(rule_id)
+
+    def admit(self, fired):
+        """Filter firings through the gate; firings left with no actions are dropped."""
+        admitted = []
+        for a in fired:
+            run = self.gate.admit(a['rule_id'], a['actions'], a.get('policy'))
+            if run:
+                admitted.append(dict(a, actions=run))
+        return admitted
+
+    def record_tick(self, now: float):
+        TICKS.labels(self.name).inc()
+        if self.last_tick is not None and now > self.last_tick:
+            inst = 1.0 / (now - self.last_tick)
+            self.rate = inst if not self.rate else 0.8 * self.rate + 0.2 * inst
+            TICK_RATE.labels(self.name).set(self.rate)
+        self.last_tick = now
+
+
+def load_targets(path: str, rules_cache: str = DEFAULT_RULES_CACHE, enforce: bool = False):
+    """Read extra scrape targets from a YAML file (see config/watchdog_targets.yaml).
+
+    A target's ``enforce: true`` only takes effect when ``enforce`` (the
+    watchdog's ``--enforce``) is set too; otherwise every target is dry-run.
+    """
+    with open(path, 'r') as fh:
+        cfg = yaml.safe_load(fh) or {}
+    targets = []
+    for t in cfg.get('targets') or []:
+        opts = {k: t[k] for k in ('interval', 'deadline', 'connect_timeout', 'read_timeout', 'gzip') if k in t}
+        targets.append(Target(t['name'], t['url'], rules_cache=rules_cache,
+                              enforce=enforce and bool(t.get('enforce')), **opts))
+    return targets
+
+
+def enforce_actions(target: Target, actions):
+    """Start every firing's actions together; stops run first, inline, results print as they come in."""
+    for a in actions:
+        print(f"[watchdog] {target.name}: rule triggered: {a['rule_id']} -> actions: {a['actions']}")
+    # Call enforcement hooks (safe by default). Use --enforce to actually take actions.
+    dispatch_firings(actions, dry_run=not target.enforce,
+                     on_done=lambda a, results: print(f"[watchdog] {target.name}: enforcement results: {results}"))
+
+
+async def watch_target(target: Target):
+    """Scrape and evaluate one target forever on its own schedule.
+
+    A scrape that misses its deadline is left running in its thread and awaited
+    again on the next tick instead of being duplicated; enforcement is handed to
+    the target's own worker thread, which runs stops inline and never waits on
+    the other actions, so a slow action delays neither the next evaluation nor
+    the next stop. An error in one tick is logged and the loop carries on, so one
+    bad target never ends monitoring of the others.
+    """
+    loop = asyncio.get_running_loop()
+    next_at = loop.time()
     while True:
+        if target.inflight is None or target.inflight.done():
+            target.inflight = loop.run_in_executor(None, target.scraper.fetch, target.engine.subscribed)
+        metrics = None
         try:
-            metrics = fetch_metrics(metrics_url)
-            ts = time.time()
-            actions = engine.evaluate_snapshot(metrics, ts=ts)
-            for a in actions:
-                print(f"[watchdog] Rule triggered: {a['rule_id']} -> actions: {a['actions']}")
-                # Call enforcement hooks (safe by default). Use --enforce to actually take actions.
-                from scripts.enforcement import perform_actions
-                enforce = getattr(args, 'enforce', False)
-                results = perform_actions(a['actions'], dry_run=not enforce)
-                print(f"[watchdog] Enforcement results: {results}")
+            metrics = await asyncio.wait_for(asyncio.shield(target.inflight), target.deadline)
+        except asyncio.TimeoutError:
+            DEADLINE_MISSES.labels(target.name).inc()
+            print(f"[watchdog] {target.name}: scrape exceeded {target.deadline}s deadline")
         except Exception as e:
-            print(f"[watchdog] Error fetching metrics: {e}")
-        time.sleep(interval)
+            print(f"[watchdog] {target.name}: error fetching metrics: {e}")
+        if metrics is not None:
+            try:
+                actions = target.admit(target.engine.evaluate_snapshot(metrics, ts=time.time()))
+                target.record_tick(loop.time())
+                if actions:
+                    loop.run_in_executor(target.enforcer, enforce_actions, target, actions)
+            except Exception:
+                logger.exception("%s: evaluation failed", target.name)
+        next_at += target.interval
+        delay = next_at - loop.time()
+        if delay < 0:
+            next_at = loop.time()  # running behind: don't try to catch up with a burst
+            delay = 0
+        await asyncio.sleep(delay)
+
+
+async def reload_rules_periodically(targets, interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        for t in targets:
+            # pick up edits under config/rules without a restart; timers of unchanged rules survive
+            try:
+                await loop.run_in_executor(None, t.engine.reload_rules)
+            except Exception as e:
+                print(f"[watchdog] {t.name}: rule reload failed: {e}")
+            if t.safety_listener is not None:
+                t.safety_listener.request_reload()  # applied on the listener thread, which owns that engine
+
+
+async def run_targets(targets, reload_interval: float = 5.0, safety_socket: str = None):
+    loop = asyncio.get_running_loop()
+    # scrapes and reloads each hold a thread (enforcement has per-target workers);
+    # size the pool so a hung target cannot starve the others
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=2 * len(targets) + 2,
+                                                 thread_name_prefix='watchdog'))
+    if safety_socket:
+        # critical rules also fire straight from pushed sensor readings, without waiting for a scrape
+        from scripts.safety_channel import SafetyListener
+        local = targets[0]
+        local.safety_listener = SafetyListener(local.attach_safety_engine(),
+                                               lambda actions: enforce_actions(local, local.admit(actions)),
+                                               safety_socket)
+        local.safety_listener.start()
+    tasks = [watch_target(t) for t in targets]
+    if reload_interval > 0:
+        tasks.append(reload_rules_periodically(targets, reload_interval))
+    await asyncio.gather(*tasks)
+
+
+def run_watchdog(metrics_url: str, interval: float = 5.0, reload_interval: float = 5.0,
+                 rules_cache: str = DEFAULT_RULES_CACHE, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, gzip: bool = False, enforce: bool = False,
+                 safety_socket: str = None, targets=None):
+    # the validated rule cache skips YAML parsing so safety rules are armed quickly after a restart
+    local = Target('local', metrics_url, interval, connect_timeout=connect_timeout, read_timeout=read_timeout,
+                   gzip=gzip, enforce=enforce, rules_cache=rules_cache)
+    if enforce:
+        # open the motor controller now instead of at the moment a stop is needed
+        warm_motor_backend()
+    asyncio.run(run_targets([local] + list(targets or []), reload_interval, safety_socket))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--metrics-url', default='http://127.0.0.1:8000/metrics')
     parser.add_argument('--interval', type=float, default=5.0)
+    parser.add_argument('--reload-interval', type=float, default=5.0,
+                        help='seconds between rule file change checks (0 disables hot reload)')
+    parser.add_argument('--rules-cache', default=os.environ.get('PICRAWLER_RULES_CACHE', DEFAULT_RULES_CACHE),
+                        help='path of the compiled rule cache ("" disables it)')
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT)
+    parser.add_argument('--read-timeout', type=float, default=DEFAULT_READ_TIMEOUT)
+    parser.add_argument('--gzip', action='store_true', help='request gzip-encoded scrapes (useful for remote targets)')
+    parser.add_argument('--metrics-port', type=int, default=int(os.environ.get('WATCHDOG_METRICS_PORT', 8001)),
+                        help='port for the watchdog\'s own metrics (0 disables)')
+    parser.add_argument('--enforce', action='store_true', help='execute enforcement actions (default: dry run)')
+    parser.add_argument('--safety-socket', default=None,
+                        help='Unix datagram socket for pushed sensor readings (see scripts/safety_channel.py)')
+    parser.add_argument('--targets', default=None,
+                        help='YAML file with additional scrape targets (see config/watchdog_targets.yaml)')
     args = parser.parse_args()
 
-    run_watchdog(args.metrics_url, args.interval)
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    extra = load_targets(args.targets, args.rules_cache, args.enforce) if args.targets else []
+    run_watchdog(args.metrics_url, args.interval, args.reload_interval, args.rules_cache,
+                 args.connect_timeout, args.read_timeout, args.gzip, args.enforce, args.safety_socket, extra)
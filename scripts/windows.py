@@ -0,0 +1,138 @@
+"""Sliding-window aggregates for windowed rule triggers.
+
+A rule trigger may smooth its metric before the condition is applied:
+
+    trigger:
+      metric: picrawler_battery_voltage_volts
+      aggregate: avg          # avg | min | max | rate | p95
+      window_seconds: 5
+      condition: "< 6.0"
+
+Each window keeps at most ``max_samples`` samples so memory stays bounded per
+rule. ``avg`` and ``rate`` are maintained incrementally, ``min``/``max`` use
+monotonic deques, so every push is amortized O(1). ``p95`` keeps a sorted copy
+of the (bounded) window and costs O(log n) search plus a bounded memmove.
+"""
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Any, Optional
+
+AGGREGATES = ('avg', 'min', 'max', 'rate', 'p95')
+DEFAULT_MAX_SAMPLES = 512
+
+
+class SlidingWindow:
+    """Samples from the last ``window_seconds`` reduced with one aggregate."""
+
+    def __init__(self, aggregate: str, window_seconds: float, max_samples: int = DEFAULT_MAX_SAMPLES):
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"unknown aggregate {aggregate!r}; expected one of {', '.join(AGGREGATES)}")
+        self.aggregate = aggregate
+        self.window_seconds = float(window_seconds)
+        self.max_samples = int(max_samples)
+        self.samples = deque()  # (ts, value), oldest first
+        self.total = 0.0
+        self.extremes = deque()  # monotonic (ts, value) for min/max
+        self.ordered = []  # sorted values for p95
+
+    def __len__(self):
+        return len(self.samples)
+
+    def _evict_oldest(self):
+        ts, v = self.samples.popleft()
+        self.total -= v
+        if self.extremes and self.extremes[0][0] <= ts:
+            self.extremes.popleft()
+        if self.aggregate == 'p95':
+            del self.ordered[bisect_left(self.ordered, v)]
+
+    def push(self, ts: float, value: float):
+        samples = self.samples
+        if samples and ts <= samples[-1][0]:
+            # same observation seen twice (e.g. rules sharing an ID) or clock went back
+            return
+        cutoff = ts - self.window_seconds
+        while samples and (samples[0][0] <= cutoff or len(samples) >= self.max_samples):
+            self._evict_oldest()
+        samples.append((ts, value))
+        self.total += value
+        if self.aggregate == 'min':
+            while self.extremes and self.extremes[-1][1] >= value:
+                self.extremes.pop()
+            self.extremes.append((ts, value))
+        elif self.aggregate == 'max':
+            while self.extremes and self.extremes[-1][1] <= value:
+                self.extremes.pop()
+            self.extremes.append((ts, value))
+        elif self.aggregate == 'p95':
+            insort(self.ordered, value)
+
+    def value(self) -> Optional[float]:
+        """Current aggregate, or None when the window cannot produce one yet."""
+        samples = self.samples
+        if not samples:
+            return None
+        agg = self.aggregate
+        if agg == 'avg':
+            return self.total / len(samples)
+        if agg in ('min', 'max'):
+            return self.extremes[0][1]
+        if agg == 'rate':
+            (t0, v0), (t1, v1) = samples[0], samples[-1]
+            if t1 <= t0:
+                return None
+            return (v1 - v0) / (t1 - t0)
+        # p95, nearest-rank
+        ordered = self.ordered
+        rank = -(-95 * len(ordered) // 100)  # ceil(0.95 * n)
+        return ordered[max(rank, 1) - 1]
+
+
+def rolling_aggregate(ts: Any, values: Any, aggregate: str, window_seconds: float,
+                      max_samples: int = DEFAULT_MAX_SAMPLES):
+    """Vectorized equivalent of pushing every sample through a SlidingWindow.
+
+    Returns a float array aligned with ``values``; NaN where the window has no
+    value yet. ``ts`` must be strictly increasing.
+    """
+    import numpy as np
+
+    ts = np.asarray(ts, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    n = values.size
+    pos = np.arange(n)
+    left = np.searchsorted(ts, ts - window_seconds, side='right')
+    left = np.maximum(left, pos + 1 - max_samples)
+    if aggregate == 'avg':
+        cs = np.concatenate(([0.0], np.cumsum(values)))
+        return (cs[pos + 1] - cs[left]) / (pos + 1 - left)
+    if aggregate == 'rate':
+        dt = ts - ts[left]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(dt > 0, (values - values[left]) / dt, np.nan)
+    if aggregate in ('min', 'max'):
+        # sparse table over the series answers each [left, i] range in O(1)
+        reduce = np.minimum if aggregate == 'min' else np.maximum
+        table = [values]
+        width = 1
+        while width * 2 <= n:
+            prev = table[-1]
+            table.append(reduce(prev[:-width], prev[width:]))
+            width *= 2
+        span = pos + 1 - left
+        level = np.floor(np.log2(span)).astype(np.int64)
+        out = np.empty(n)
+        for k in np.unique(level):
+            sel = level == k
+            lo, hi = left[sel], pos[sel] - (1 << k) + 1
+            out[sel] = reduce(table[k][lo], table[k][hi])
+        return out
+    if aggregate == 'p95':
+        # percentile has no cheap vectorized form; the window is bounded so reuse it
+        window = SlidingWindow('p95', window_seconds, max_samples)
+        out = np.empty(n)
+        for i, (t, v) in enumerate(zip(ts.tolist(), values.tolist())):
+            window.push(t, v)
+            out[i] = window.value()
+        return out
+    raise ValueError(f"unknown aggregate {aggregate!r}")
@@ -23,3 +23,147 @@ def test_ai_agent_uses_openrouter(monkeypatch):
     ai = importlib.import_module('scripts.ai_agent')
     out = ai.respond('hello')
     assert 'fake reply' in out
+
+
+def test_ai_agent_caches_cacheable_intents(monkeypatch, tmp_path):
+    calls = []
+
+    class FakeClient:
+        def __init__(self, api_key=None):
+            pass
+        def complete(self, prompt=None):
+            calls.append(prompt)
+            return {'text': 'all systems nominal'}
+    fake_openrouter = type('M', (), {'OpenRouter': FakeClient})
+    monkeypatch.setitem(__import__('sys').modules, 'openrouter', fake_openrouter)
+    monkeypatch.setenv('OPENROUTER_API_KEY', 'FAKE')
+    ai = importlib.import_module('scripts.ai_agent')
+    monkeypatch.setattr(ai, '_caches', {})
+    monkeypatch.setattr(ai, '_limiters', {})
+    monkeypatch.setattr(ai, '_routers', {})
+    cfg = {'openrouter': {'model': 'free-tier'},
+           'cache': {'path': str(tmp_path / 'cache.json'), 'intents': ['status_query']}}
+    assert ai.respond('Status?', intent='status_query', config=cfg) == 'all systems nominal'
+    assert ai.respond('  status? ', intent='status_query', config=cfg) == 'all systems nominal'
+    assert len(calls) == 1
+    ai.respond('Status?', intent='navigate', config=cfg)
+    ai.respond('Status?', config=cfg)
+    assert len(calls) == 3
+    # misses are persisted by the background saver (or at exit), not on the request path
+    assert not os.path.exists(tmp_path / 'cache.json')
+    ai.get_cache(cfg).save()
+    assert os.path.exists(tmp_path / 'cache.json')
+
+
+def test_ai_agent_reuses_client_and_respects_rate_limit(monkeypatch):
+    built, calls = [], []
+
+    class FakeClient:
+        def __init__(self, api_key=None):
+            built.append(api_key)
+        def complete(self, prompt=None):
+            calls.append(prompt)
+            return {'text': 'remote'}
+    fake_openrouter = type('M', (), {'OpenRouter': FakeClient})
+    monkeypatch.setitem(__import__('sys').modules, 'openrouter', fake_openrouter)
+    monkeypatch.setenv('OPENROUTER_API_KEY', 'FAKE')
+    ai = importlib.import_module('scripts.ai_agent')
+    monkeypatch.setattr(ai, '_limiters', {})
+    monkeypatch.setattr(ai, '_routers', {})
+    cfg = {'openrouter': {'rate_limits_per_minute': 60, 'burst': 2, 'queue_timeout_seconds': 0}}
+    assert [ai.respond(p, config=cfg) for p in ('a', 'b', 'c')] == ['remote', 'remote', '(local) Echo: c']
+    assert calls == ['a', 'b']
+    assert built == ['FAKE']
+    # a different openrouter section gets its own limiter instead of the first one's
+    assert ai.respond('d', config={'openrouter': {'rate_limits_per_minute': 60, 'burst': 3}}) == 'remote'
+    assert ai.get_limiter(cfg) is not ai.get_limiter({'openrouter': {}})
+    assert ai.get_limiter({'openrouter': {}}) is None
+    from prometheus_client import REGISTRY
+    assert REGISTRY.get_sample_value('picrawler_ai_rate_limited_total', {'outcome': 'fallback'}) >= 1
+
+
+def test_request_limiter_queues_in_arrival_order():
+    import threading
+    import time
+    from scripts.ai_agent import RequestLimiter
+    limiter = RequestLimiter(per_minute=600, burst=1, queue_timeout=1.0)  # one token per 0.1 s
+    done = []
+
+    def worker(i):
+        assert limiter.acquire()
+        done.append((i, time.monotonic()))
+    start = time.monotonic()
+    threads = []
+    for i in range(4):
+        t = threading.Thread(target=worker, args=(i,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.01)
+    for t in threads:
+        t.join()
+    assert [i for i, _ in done] == [0, 1, 2, 3]
+    assert done[-1][1] - start >= 0.28
+    assert limiter.waiting == 0
+    limiter = RequestLimiter(per_minute=60, burst=1, queue_timeout=0.5)
+    assert limiter.acquire()
+    assert not limiter.acquire()  # next token is a second away
+
+
+def test_hedged_router_races_local_when_remote_is_slow():
+    import threading
+    import time
+    from scripts.ai_agent import HedgedRouter
+    release = threading.Event()
+
+    def hung(prompt):
+        release.wait(5)
+        return 'late remote'
+    router = HedgedRouter(hung, lambda p: 'local', initial_budget=0.05)
+    start = time.monotonic()
+    try:
+        assert router.route('status?')[:2] == ('local', 'local')
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+    router = HedgedRouter(lambda p: 'remote', lambda p: 'local', initial_budget=0.05)
+    assert router.route('status?')[:2] == ('remote', 'openrouter')
+
+
+def test_hedged_router_learns_p95_budget():
+    from scripts.ai_agent import HedgedRouter
+    router = HedgedRouter(lambda p: 'remote', lambda p: 'local', initial_budget=2.0, min_budget=0.1,
+                          max_budget=1.0, min_samples=10)
+    router.latencies.extend([0.2] * 5)
+    assert router.budget() == 2.0
+    router.latencies.extend([0.2] * 14 + [0.5])
+    assert router.budget() == 0.2
+    router.latencies.extend([5.0] * 20)
+    assert router.budget() == 1.0
+
+
+def test_local_intents_skip_openrouter(monkeypatch):
+    class FakeClient:
+        def __init__(self, api_key=None):
+            pass
+        def complete(self, prompt=None):
+            raise AssertionError('remote called for a local intent')
+    fake_openrouter = type('M', (), {'OpenRouter': FakeClient})
+    monkeypatch.setitem(__import__('sys').modules, 'openrouter', fake_openrouter)
+    monkeypatch.setenv('OPENROUTER_API_KEY', 'FAKE')
+    ai = importlib.import_module('scripts.ai_agent')
+    monkeypatch.setattr(ai, '_routers', {})
+    cfg = {'routing': {'local_intents': ['obstacle_reaction']}}
+    assert ai.respond('obstacle ahead', intent='obstacle_reaction', config=cfg).startswith('(local)')
+
+
+def test_agent_config_is_parsed_once(monkeypatch):
+    ai = importlib.import_module('scripts.ai_agent')
+    monkeypatch.delenv('OPENROUTER_API_KEY', raising=False)
+    monkeypatch.setattr(ai, '_config', None)
+    loads = []
+    real = ai.load_agent_config
+    monkeypatch.setattr(ai, 'load_agent_config', lambda *a: loads.append(1) or real(*a))
+    ai.respond('hello')
+    ai.respond('obstacle ahead', intent='obstacle_reaction')
+    assert len(loads) == 1
+    assert 'status_query' in ai.get_agent_config()['cache']['intents']
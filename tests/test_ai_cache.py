@@ -0,0 +1,56 @@
+from scripts.ai_cache import ResponseCache, cache_key
+
+
+def test_key_normalizes_prompt_but_not_model():
+    assert cache_key('Battery  status?', {'model': 'a'}) == cache_key(' battery status? ', {'model': 'a'})
+    assert cache_key('battery status?', {'model': 'a'}) != cache_key('battery status?', {'model': 'b'})
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(None, ttl_seconds=10)
+    cache.put('k', 'reply', now=100)
+    assert cache.get('k', now=105) == 'reply'
+    assert cache.get('k', now=111) is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResponseCache(None, max_entries=2)
+    cache.put('a', '1')
+    cache.put('b', '2')
+    cache.get('a')
+    cache.put('c', '3')
+    assert cache.get('b') is None and cache.get('a') == '1'
+
+    cache = ResponseCache(None, max_bytes=30)
+    cache.put('a', 'x' * 10)
+    cache.put('b', 'y' * 10)
+    cache.put('c', 'z' * 10)
+    assert cache.get('a') is None and cache.bytes <= 30
+    cache.put('huge', 'x' * 100)  # larger than the whole cache: not stored
+    assert cache.get('huge') is None and cache.get('c') == 'z' * 10
+
+
+def test_persists_across_restarts(tmp_path):
+    path = str(tmp_path / 'ai.json')
+    cache = ResponseCache(path, ttl_seconds=60)
+    cache.put('old', 'stale', now=0)
+    cache.put('k', 'reply', latency=1.5)
+    cache.save()
+    restored = ResponseCache(path, ttl_seconds=60)
+    assert restored.get('k') == 'reply'
+    assert restored.entries['k'][2] == 1.5
+    assert 'old' not in restored.entries
+
+
+def test_save_only_writes_changes(tmp_path):
+    path = tmp_path / 'ai.json'
+    cache = ResponseCache(str(path), ttl_seconds=60)
+    cache.save()
+    assert not path.exists()
+    cache.put('k', 'reply')
+    cache.save()
+    assert path.exists()
+    path.unlink()
+    cache.save()  # nothing changed since the last save
+    assert not path.exists()
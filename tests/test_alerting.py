@@ -1,8 +1,12 @@
-import os
-import tempfile
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
 import requests
 
-from scripts.alerting import send_alert, LAST_ALERT_PATH
+from scripts.alerting import AlertDispatcher, AlertRateLimiter, load_alert_config, send_alert
 
 
 class DummyResponse:
@@ -17,17 +21,139 @@ def test_send_alert_success(monkeypatch, tmp_path):
         return DummyResponse(200, 'ok')
     monkeypatch.setattr('requests.post', fake_post)
 
-    # ensure the last alert path is writable in test
-    monkeypatch.setenv('PICRAWLER_ALERT_RATE_LIMIT', '0')
-    ok = send_alert('http://example.com/webhook', {'msg': 'test'}, retries=1)
+    ok = send_alert('http://example.com/webhook', {'msg': 'test'}, retries=1, limiter=AlertRateLimiter(0))
     assert ok
 
 
 def test_send_alert_rate_limit(monkeypatch, tmp_path):
-    # write a recent timestamp to last alert path to trigger rate limit
-    p = tmp_path / 'last'
-    p.write_text(str(float( ( __import__('time').time() ) )))
-    monkeypatch.setenv('PICRAWLER_ALERT_RATE_LIMIT', '1000')
-    monkeypatch.setattr('scripts.alerting.LAST_ALERT_PATH', str(p))
-    ok = send_alert('http://example.com/webhook', {'msg': 'test'}, retries=1)
-    assert ok is False
+    monkeypatch.setattr('requests.post', lambda url, json, headers, timeout: DummyResponse(200, 'ok'))
+    limiter = AlertRateLimiter(per_seconds=1000)
+    payload = {'msg': 'test', 'rule_id': 'observability/heartbeat', 'severity': 'medium'}
+    assert send_alert('http://example.com/webhook', payload, retries=1, limiter=limiter)
+    assert send_alert('http://example.com/webhook', payload, retries=1, limiter=limiter) is False
+
+
+def test_rate_limit_is_per_rule_and_critical_bypasses():
+    limiter = AlertRateLimiter(per_seconds=10, burst=2, severities={'medium': {'per_seconds': 60, 'burst': 1}})
+    assert [limiter.allow('observability/heartbeat', 'medium', now=0) for _ in range(2)] == [True, False]
+    # a noisy medium rule does not use up another rule's budget
+    assert [limiter.allow('operational/heartbeat-missing', 'high', now=0) for _ in range(3)] == [True, True, False]
+    assert all(limiter.allow('safety/battery-low', 'critical', now=0) for _ in range(10))
+    assert limiter.allow('operational/heartbeat-missing', 'high', now=10)  # refilled one token
+    assert not limiter.allow('observability/heartbeat', 'medium', now=30)
+    assert limiter.allow('observability/heartbeat', 'medium', now=60)
+
+
+def test_rate_limit_state_persists(tmp_path):
+    path = str(tmp_path / 'ratelimit.json')
+    limiter = AlertRateLimiter(per_seconds=1000, persist_path=path)
+    assert limiter.allow('r', 'high')
+    limiter.save()
+    assert not AlertRateLimiter(per_seconds=1000, persist_path=path).allow('r', 'high')
+
+
+def test_alert_config_builds_limiter():
+    limiter = AlertRateLimiter.from_config(load_alert_config('config/alerts.yaml'))
+    assert limiter.bypass == {'critical'}
+    assert limiter.severities['medium']['per_seconds'] == 60
+    assert limiter.persist_path is None
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status == 200:
+            self.server.batches.append(json.loads(body))
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookHandler)
+    server.connections = 0
+    server.batches = []
+    server.statuses = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/hook'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_dispatcher_coalesces_alerts_into_one_batch(webhook, tmp_path):
+    d = AlertDispatcher(webhook.url, outbox_path=str(tmp_path / 'outbox.json'), coalesce_seconds=0.2)
+    d.start()
+    start = time.monotonic()
+    for msg in ('overtemp', 'overtemp', 'battery low'):
+        assert d.enqueue({'message': msg})
+    assert time.monotonic() - start < 0.05  # enqueue never waits on the network
+    assert wait_for(lambda: webhook.batches)
+    assert webhook.batches == [{'alerts': [
+        {'alert': {'message': 'overtemp'}, 'count': 2, 'first_ts': None, 'last_ts': None},
+        {'alert': {'message': 'battery low'}, 'count': 1, 'first_ts': None, 'last_ts': None}], 'total': 3}]
+    d.enqueue({'message': 'again'})
+    assert wait_for(lambda: len(webhook.batches) == 2)
+    assert webhook.connections == 1  # pooled session
+    d.stop()
+    assert not (tmp_path / 'outbox.json').exists()
+
+
+def test_undelivered_alerts_survive_in_outbox(webhook, tmp_path):
+    outbox = tmp_path / 'outbox.json'
+    webhook.statuses = [500] * 100
+    d = AlertDispatcher(webhook.url, outbox_path=str(outbox), coalesce_seconds=0.05, backoff=0.05)
+    d.start()
+    d.enqueue({'message': 'collision'})
+    assert wait_for(outbox.exists)
+    d.stop()
+    assert json.loads(outbox.read_text()) == [{'message': 'collision'}]
+
+    # a new dispatcher (e.g. after a crash) delivers what was left behind
+    webhook.statuses = []
+    d = AlertDispatcher(webhook.url, outbox_path=str(outbox), coalesce_seconds=0.05)
+    d.start()
+    assert wait_for(lambda: webhook.batches)
+    assert webhook.batches[0]['alerts'] == [{'alert': {'message': 'collision'}, 'count': 1,
+                                             'first_ts': None, 'last_ts': None}]
+    d.stop()
+    assert not outbox.exists()
+
+
+def test_alert_operator_alerts_coalesce_and_dry_run_posts_nothing(webhook, tmp_path, monkeypatch):
+    from scripts import alerting, enforcement
+    d = AlertDispatcher(webhook.url, outbox_path=str(tmp_path / 'outbox.json'), coalesce_seconds=0.2)
+    monkeypatch.setattr(alerting, '_dispatcher', d)
+    monkeypatch.setattr(alerting, '_dispatcher_checked', True)
+    d.start()
+    try:
+        assert enforcement.alert_operator('dry', rule_id='safety/overtemp', severity='high')  # dry_run default
+        for _ in range(3):
+            assert enforcement.alert_operator('overtemp', rule_id='safety/overtemp', severity='high', dry_run=False)
+            time.sleep(0.01)
+        assert wait_for(lambda: webhook.batches)
+    finally:
+        d.stop()
+    (batch,) = webhook.batches
+    assert batch['total'] == 3
+    (entry,) = batch['alerts']
+    assert entry['count'] == 3 and entry['alert']['message'] == 'overtemp'
+    assert entry['last_ts'] - entry['first_ts'] >= 0.02
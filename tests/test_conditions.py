@@ -0,0 +1,48 @@
+import pytest
+
+from scripts.conditions import ConditionError, compile_condition
+from scripts.rules_engine import Rule, RuleConfigError
+
+
+def test_simple_comparisons():
+    assert compile_condition('< 6.0')(5.9, None)
+    assert not compile_condition('> 85')(85, None)
+    assert compile_condition('>=85')(85, None)
+
+
+def test_between_and_tolerance():
+    rng = compile_condition('between 5.5 and 6.0')
+    assert rng(5.5, None) and rng(6.0, None)
+    assert not rng(6.01, None)
+    eq = compile_condition('== 1 +/- 0.01')
+    assert eq(1.005, None) and not eq(1.02, None)
+    assert compile_condition('!= 1 ± 0.01')(1.02, None)
+
+
+def test_boolean_combination_across_metrics():
+    pred = compile_condition('> 85 and (picrawler_battery_voltage_volts < 6.0 or not camera_raw_upload_attempt == 0)')
+    assert pred(90, {'picrawler_battery_voltage_volts': 5.8})
+    assert pred(90, {'picrawler_battery_voltage_volts': 6.5, 'camera_raw_upload_attempt': 1})
+    assert not pred(90, {'picrawler_battery_voltage_volts': 6.5, 'camera_raw_upload_attempt': 0})
+    assert not pred(80, {'picrawler_battery_voltage_volts': 5.8})
+
+
+@pytest.mark.parametrize('cond', ['', '~ 5', '< abc', '> 5 6', 'between 6 and 5', '< 5 +/- 1', '(> 5'])
+def test_malformed_conditions_fail_at_load(cond):
+    with pytest.raises(ConditionError):
+        compile_condition(cond)
+    with pytest.raises(RuleConfigError):
+        Rule({'id': 'test/bad', 'trigger': {'metric': 'm', 'condition': cond}})
+
+
+@pytest.mark.parametrize('extra', [{'fire_once': ['reboot']}, {'cooldown_seconds': -1},
+                                   {'cooldown_seconds': {'reboot': 5}}, {'fire_once': 'yes'}])
+def test_bad_action_policy_fails_at_load(extra):
+    with pytest.raises(RuleConfigError):
+        Rule(dict({'id': 'test/bad', 'enforcement_action': ['alert_operator']}, **extra))
+
+
+def test_action_policy():
+    rule = Rule({'id': 't', 'enforcement_action': ['stop_motors', {'alert_operator': 'hot'}],
+                 'fire_once': True, 'cooldown_seconds': {'alert_operator': 60}})
+    assert rule.action_policy == {'stop_motors': (0.0, True), 'alert_operator': (60.0, True)}
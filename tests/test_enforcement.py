@@ -10,3 +10,90 @@ def test_perform_actions_dry_run():
 def test_unknown_action_logged():
     results = perform_actions(['nonexistent_action'], dry_run=True)
     assert results == [('nonexistent_action', False)]
+
+
+def test_stop_motors_runs_first_and_slow_actions_hit_deadline(monkeypatch):
+    import time
+    from scripts import enforcement
+
+    calls = []
+
+    def slow_restart(agent_name, dry_run=True):
+        calls.append('restart')
+        time.sleep(1.0)
+        return True
+
+    def stop(dry_run=True):
+        calls.append('stop')
+        return True
+
+    monkeypatch.setitem(enforcement.ACTION_MAP, 'attempt_restart_agent', slow_restart)
+    monkeypatch.setitem(enforcement.ACTION_MAP, 'stop_motors', stop)
+    monkeypatch.setitem(enforcement.ACTION_DEADLINE_SECONDS, 'attempt_restart_agent', 0.1)
+    start = time.monotonic()
+    results = perform_actions(['attempt_restart_agent', 'alert_operator', 'stop_motors'], dry_run=True)
+    assert time.monotonic() - start < 0.5
+    assert calls[0] == 'stop'
+    # result contract unchanged: (name, ok) in input order
+    assert results == [('attempt_restart_agent', False), ('alert_operator', True), ('stop_motors', True)]
+
+
+def test_gate_fire_once_until_cleared_and_cooldown():
+    from scripts.enforcement import ActionGate
+    from scripts.rules_engine import RulesEngine
+
+    engine = RulesEngine('config/rules/safety_overtemp.yaml')
+    gate = ActionGate()
+    engine.on_clear = gate.clear
+    t0 = 1_700_000_000.0
+    ran = []
+    for i, temp in enumerate([86, 87, 88, 88, 80, 86, 87]):
+        for a in engine.evaluate_snapshot({'picrawler_cpu_temp_celsius': temp}, ts=t0 + 11 * i):
+            ran.append((i, gate.admit(a['rule_id'], a['actions'], a['policy'], now=t0 + 11 * i)))
+    # fires at ticks 1-3 and 6; throttle runs once per hot spell, the alert waits out its 300s cooldown
+    assert ran == [(1, ['throttle_cpu_tasks', 'alert_operator']), (2, []), (3, []),
+                   (6, ['throttle_cpu_tasks'])]
+
+
+def test_gate_without_policy_runs_everything():
+    from scripts.enforcement import ActionGate
+    gate = ActionGate()
+    assert gate.admit('r', ['stop_motors', {'alert_operator': 'msg'}]) == ['stop_motors', {'alert_operator': 'msg'}]
+    assert gate.admit('r', ['stop_motors']) == ['stop_motors']
+
+
+def test_stops_of_a_tick_run_before_slow_actions_of_earlier_firings(monkeypatch):
+    import threading
+    import time
+    from scripts import enforcement
+
+    calls = []
+    reported = {}
+    done = threading.Event()
+
+    def slow_restart(agent_name, dry_run=True):
+        calls.append('restart')
+        time.sleep(0.5)
+        return True
+
+    def stop(dry_run=True):
+        calls.append('stop')
+        return True
+
+    def on_done(firing, results):
+        reported[firing['rule_id']] = results
+        if len(reported) == 2:
+            done.set()
+
+    monkeypatch.setitem(enforcement.ACTION_MAP, 'attempt_restart_agent', slow_restart)
+    monkeypatch.setitem(enforcement.ACTION_MAP, 'stop_motors', stop)
+    firings = [{'rule_id': 'observability/heartbeat', 'actions': [{'attempt_restart_agent': 'vision-agent'}]},
+               {'rule_id': 'safety/collision-imminent', 'actions': ['stop_motors', 'alert_operator']}]
+    start = time.monotonic()
+    enforcement.dispatch_firings(firings, dry_run=True, on_done=on_done)
+    # the stop ran inline and nothing waited on the restart
+    assert time.monotonic() - start < 0.25
+    assert calls[0] == 'stop'
+    assert done.wait(2)
+    assert reported == {'observability/heartbeat': [('attempt_restart_agent', True)],
+                        'safety/collision-imminent': [('stop_motors', True), ('alert_operator', True)]}
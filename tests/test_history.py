@@ -0,0 +1,62 @@
+import json
+import urllib.request
+
+import numpy as np
+
+from scripts.history import HistoryRing
+from scripts.rules_engine import RulesEngine
+
+METRICS = ['picrawler_battery_voltage_volts', 'picrawler_cpu_temp_celsius']
+
+
+def test_ring_wraps_and_windows_are_views(tmp_path):
+    path = str(tmp_path / 'h.ring')
+    ring = HistoryRing(path, METRICS, capacity=8)
+    for i in range(5):
+        ring.append(100.0 + i, {'picrawler_battery_voltage_volts': 7.0 - i * 0.1})
+    ts, cols = ring.window(since=101, until=103)
+    assert ts.tolist() == [101.0, 102.0, 103.0]
+    assert np.shares_memory(ts, ring.ts)  # contiguous range: no copy
+    assert np.isnan(cols['picrawler_cpu_temp_celsius']).all()
+
+    for i in range(5, 12):
+        ring.append(100.0 + i, {'picrawler_battery_voltage_volts': 7.0 - i * 0.1})
+    assert len(ring) == 8 and ring.count == 12
+    ts, cols = ring.window()
+    assert ts.tolist() == [100.0 + i for i in range(4, 12)]
+    np.testing.assert_allclose(cols['picrawler_battery_voltage_volts'], [7.0 - i * 0.1 for i in range(4, 12)],
+                               rtol=1e-6)
+    ring.close()
+
+    # another process opens it read-only from the header and sees the same rows
+    reader = HistoryRing.open(path)
+    assert reader.metrics == METRICS and reader.capacity == 8
+    assert reader.window(since=110)[0].tolist() == [110.0, 111.0]
+
+
+def test_history_feeds_backtest(tmp_path):
+    ring = HistoryRing(str(tmp_path / 'h.ring'), METRICS, capacity=64)
+    for i in range(40):
+        ring.append(1000.0 + i, {'picrawler_battery_voltage_volts': 7.0 if i < 10 else 5.5})
+    ts, cols = ring.window()
+    fired = RulesEngine('config/rules/safety_battery-low.yaml').evaluate_series(cols, ts)
+    assert fired and fired[0]['rule_id'] == 'safety/battery-low'
+    assert fired[0]['timestamps'][0] >= 1025.0  # 15s duration after the drop at t=1010
+
+
+def test_history_endpoint(tmp_path):
+    from scripts.metrics_exporter import serve
+    ring = HistoryRing(str(tmp_path / 'h.ring'), METRICS, capacity=16)
+    for i in range(10):
+        ring.append(2000.0 + i, {'picrawler_cpu_temp_celsius': 60.0 + i})
+    server = serve(0, ring)
+    try:
+        port = server.server_address[1]
+        url = f'http://127.0.0.1:{port}/history?metric=picrawler_cpu_temp_celsius&since=2005&until=2007'
+        data = json.loads(urllib.request.urlopen(url, timeout=5).read())
+        assert data == {'ts': [2005.0, 2006.0, 2007.0], 'metrics': {'picrawler_cpu_temp_celsius': [65.0, 66.0, 67.0]}}
+        body = urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5).read().decode()
+        assert 'picrawler_cpu_temp_celsius' in body
+    finally:
+        server.shutdown()
+        server.server_close()
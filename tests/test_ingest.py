@@ -0,0 +1,56 @@
+import time
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+from scripts.ingest import IngestCollector, IngestListener, IngestPublisher
+
+
+def test_apply_sets_gauges_and_accumulates_counters():
+    c = IngestCollector(reserved={'picrawler_cpu_temp_celsius'})
+    assert c.apply(b'picrawler_servos_position_degrees{servo="servo0"} 42.5\n'
+                   b'picrawler_vision_frames_total{camera="front"} +3\n'
+                   b'picrawler_vision_frames_total{camera="front"} +2\n'
+                   b'picrawler_servos_position_degrees{servo="servo0"} 40\n') == 4
+    # reserved name, type clash, malformed value
+    assert c.apply(b'picrawler_cpu_temp_celsius 99\npicrawler_vision_frames_total{camera="front"} 1\n'
+                   b'picrawler_servos_position_degrees{servo="servo1"} nope\n') == 0
+    registry = CollectorRegistry()
+    registry.register(c)
+    text = generate_latest(registry).decode()
+    assert 'picrawler_servos_position_degrees{servo="servo0"} 40.0' in text
+    assert 'picrawler_vision_frames_total{camera="front"} 5.0' in text
+    assert '# TYPE picrawler_vision_frames_total counter' in text
+    assert 'picrawler_cpu_temp_celsius' not in text
+    assert 'picrawler_ingest_rejected_total 3.0' in text
+
+
+def test_series_cap():
+    c = IngestCollector(max_series=2)
+    assert c.apply(b'a{i="1"} 1\na{i="2"} 1\na{i="3"} 1\na{i="1"} 2') == 3
+    assert c.gauges[('a', b'i="1"')] == 2.0
+    assert len(c.gauges) == 2
+    # rejected series (over the cap, reserved names, type clashes) leave no cached labels behind
+    c.apply(b'\n'.join(b'a{i="%d"} 1' % i for i in range(4, 1000)))
+    c.apply(b'a{i="1"} +1\npicrawler_ingest_series{x="y"} 1')
+    assert set(c.labels) == {b'', b'i="1"', b'i="2"'}
+    assert len(c.types) == 1
+
+
+def test_publisher_batches_over_socket(tmp_path):
+    c = IngestCollector()
+    listener = IngestListener(c, str(tmp_path / 'ingest.sock'))
+    listener.start()
+    try:
+        pub = IngestPublisher(listener.path)
+        for i in range(100):
+            pub.gauge('picrawler_servos_position_degrees', float(i), {'servo': f'servo{i % 4}'})
+            pub.inc('picrawler_daemon_commands_total')
+        pub.close()
+        deadline = time.monotonic() + 2
+        while c.counters.get(('picrawler_daemon_commands_total', b'')) != 100 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert c.counters[('picrawler_daemon_commands_total', b'')] == 100
+        assert c.gauges[('picrawler_servos_position_degrees', b'servo="servo3"')] == 99.0
+        assert pub.dropped == 0
+    finally:
+        listener.stop()
@@ -9,7 +9,11 @@ def test_metrics_endpoint(tmp_path):
     port = 9100
     env = os.environ.copy()
     env['METRICS_PORT'] = str(port)
-    p = subprocess.Popen(["python3", "scripts/metrics_exporter.py", "--port", str(port)], env=env)
+    env.pop('PICRAWLER_HISTORY_PATH', None)
+    env.pop('PICRAWLER_INGEST_SOCKET', None)
+    history = tmp_path / 'history.ring'
+    p = subprocess.Popen(["python3", "scripts/metrics_exporter.py", "--port", str(port),
+                          "--history-path", str(history), "--ingest-socket", str(tmp_path / 'ingest.sock')], env=env)
     try:
         # wait for exporter to start
         time.sleep(2)
@@ -18,6 +22,102 @@ def test_metrics_endpoint(tmp_path):
         text = r.text
         assert "picrawler_process_cpu_percent" in text
         assert "picrawler_last_heartbeat_timestamp" in text
+        assert history.exists() and (tmp_path / 'ingest.sock').exists()
     finally:
         p.terminate()
         p.wait(timeout=5)
+
+
+def test_sysfs_reader_keeps_fd_open(tmp_path):
+    from scripts.metrics_exporter import SysfsReader
+    path = tmp_path / 'temp'
+    path.write_text('45000\n')
+    reader = SysfsReader(str(path))
+    assert reader.read() == b'45000\n'
+    fd = reader.fd
+    with open(path, 'r+') as f:  # sysfs attributes change in place
+        f.write('51000\n')
+    assert reader.read() == b'51000\n'
+    assert reader.fd == fd
+    reader.close()
+
+
+def test_hung_sensor_does_not_block_others():
+    import threading
+    from prometheus_client import Gauge, REGISTRY
+    from scripts.metrics_exporter import Sampler, Sensor
+
+    release = threading.Event()
+    fast = Gauge('test_sampler_fast', 'fast sensor')
+    reads = []
+
+    def hung():
+        release.wait(5)
+        return 1.0
+
+    sampler = Sampler([Sensor('test_hung', hung, lambda v: None, interval=0.05, timeout=0.1),
+                       Sensor('test_fast', lambda: reads.append(1) or len(reads), fast.set, interval=0.05)])
+    sampler.start()
+    try:
+        time.sleep(0.5)
+        assert len(reads) >= 5
+        assert REGISTRY.get_sample_value('picrawler_sensor_timeouts_total', {'sensor': 'test_hung'}) == 1
+        assert REGISTRY.get_sample_value('picrawler_sensor_staleness_seconds', {'sensor': 'test_hung'}) > 0.4
+        assert REGISTRY.get_sample_value('picrawler_sensor_staleness_seconds', {'sensor': 'test_fast'}) < 0.2
+    finally:
+        release.set()
+        sampler.stop()
+
+
+def test_exposition_cache_serves_etag_gzip_and_openmetrics():
+    import gzip
+    from prometheus_client import REGISTRY, CollectorRegistry, Gauge
+    from scripts.metrics_exporter import serve
+
+    def renders():
+        return REGISTRY.get_sample_value('picrawler_exporter_renders_total', {'format': 'text'}) or 0
+
+    registry = CollectorRegistry()
+    Gauge('test_exposition_value', 'value', registry=registry).set(3)
+    server = serve(0, max_age=60, registry=registry)
+    url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+    before = renders()
+    try:
+        with requests.Session() as s:
+            first = s.get(url, headers={'Accept-Encoding': 'identity'}, timeout=5)
+            second = s.get(url, headers={'Accept-Encoding': 'identity'}, timeout=5)
+            assert b'test_exposition_value 3.0' in first.content
+            assert second.content == first.content
+            assert second.headers['ETag'] == first.headers['ETag']
+            assert renders() - before == 1
+
+            r = s.get(url, headers={'If-None-Match': first.headers['ETag']}, timeout=5)
+            assert r.status_code == 304 and r.content == b''
+
+            r = s.get(url, headers={'Accept-Encoding': 'gzip'}, stream=True, timeout=5)
+            assert r.headers['Content-Encoding'] == 'gzip'
+            assert gzip.decompress(r.raw.read()) == first.content
+
+            r = s.get(url, headers={'Accept': 'application/openmetrics-text; version=1.0.0'}, timeout=5)
+            assert r.headers['Content-Type'].startswith('application/openmetrics-text')
+            assert r.text.endswith('# EOF\n')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stale_readings_are_left_out_of_history_rows(monkeypatch):
+    from scripts import metrics_exporter
+    monkeypatch.setattr(metrics_exporter, 'latest', {})
+    apply = metrics_exporter._recorder(metrics_exporter.CPU_TEMP, 'picrawler_cpu_temp_celsius', 2.0)
+    apply(71.5)
+    now = time.monotonic()
+    assert metrics_exporter.history_row(now) == {'picrawler_cpu_temp_celsius': 71.5}
+    # the sensor stopped producing readings: the row gets NaN instead of the old value
+    assert metrics_exporter.history_row(now + 5) == {}
+
+
+def test_update_metrics_takes_every_reading():
+    from scripts import metrics_exporter
+    metrics_exporter.update_metrics()
+    assert metrics_exporter.PROCESS_MEM._value.get() > 0
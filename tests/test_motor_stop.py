@@ -13,3 +13,35 @@ def test_stop_motors_uses_robot_hat(monkeypatch):
     ok = stop_motors(dry_run=False)
     assert ok
     assert getattr(fake_motors, 'stopped', False) is True
+
+
+def test_warm_backend_opens_once_and_falls_back_when_handle_fails(monkeypatch, tmp_path):
+    opened = []
+
+    class FakeMotors:
+        def __init__(self):
+            opened.append(self)
+            self.stops = 0
+
+        def stop(self):
+            self.stops += 1
+            if self.stops > 2:
+                raise IOError('i2c bus gone')
+
+    monkeypatch.setitem(__import__('sys').modules, 'robot_hat', types.SimpleNamespace(Motors=FakeMotors))
+
+    from scripts.enforcement import MotorBackend
+    marker = tmp_path / 'stopped'
+    backend = MotorBackend(fallback_cmd=['touch', str(marker)])
+    try:
+        assert backend.open()
+        assert backend.stop() and backend.stop()
+        assert len(opened) == 1
+        # a failing handle falls back to the stop command and is reopened later
+        assert backend.stop()
+        assert marker.exists()
+        assert backend.motors is None
+        assert backend.reopen_if_lost()
+        assert len(opened) == 2
+    finally:
+        backend.close()
@@ -39,3 +39,14 @@ def test_privacy_block_upload():
     acts = engine.evaluate_snapshot({'camera_raw_upload_attempt': 1})
     assert any(a['rule_id'] == 'privacy/no-raw-frame-upload' for a in acts)
     assert any('block_upload' in a['actions'] for a in acts)
+
+
+def test_metric_index_only_dispatches_watched_metrics():
+    engine = RulesEngine('config/rules/safety_*.yaml')
+    assert 'picrawler_battery_voltage_volts' in engine.by_metric
+    assert all(r.trigger['metric'] == 'ultrasonic_distance_m' for r in engine.by_metric['ultrasonic_distance_m'])
+    # unrelated samples in a full scrape must not change the result
+    snapshot = {f'unrelated_metric_{i}': float(i) for i in range(500)}
+    snapshot['ultrasonic_distance_m'] = 0.05
+    acts = engine.evaluate_snapshot(snapshot)
+    assert [a['rule_id'] for a in acts] == ['safety/collision-imminent']
@@ -0,0 +1,75 @@
+import os
+
+from scripts.rules_engine import RulesEngine
+
+BATTERY = """- id: safety/battery-low
+  trigger: {metric: picrawler_battery_voltage_volts, condition: "< 6.0", duration_seconds: 15}
+  enforcement_action: [stop_motors]
+"""
+OVERTEMP = """- id: safety/overtemp
+  trigger: {metric: picrawler_cpu_temp_celsius, condition: "> %s", duration_seconds: 10}
+  enforcement_action: [throttle_cpu_tasks]
+"""
+
+
+def touch(path, text):
+    path.write_text(text)
+    # make sure the change is visible even on filesystems with coarse mtimes
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_reload_preserves_timers_of_unchanged_rules(tmp_path):
+    touch(tmp_path / 'battery.yaml', BATTERY)
+    touch(tmp_path / 'overtemp.yaml', OVERTEMP % 85)
+    engine = RulesEngine(str(tmp_path / '*.yaml'))
+    t0 = 1_700_000_000.0
+    engine.evaluate_snapshot({'picrawler_battery_voltage_volts': 5.5, 'picrawler_cpu_temp_celsius': 90}, ts=t0)
+    assert set(engine.state) == {'safety/battery-low', 'safety/overtemp'}
+
+    assert engine.reload_rules()['changed'] == []
+    touch(tmp_path / 'overtemp.yaml', OVERTEMP % 80)
+    report = engine.reload_rules()
+    assert report['changed'] == [str(tmp_path / 'overtemp.yaml')]
+    assert report['reset'] == ['safety/overtemp']
+    # the battery timer kept running across the reload
+    acts = engine.evaluate_snapshot({'picrawler_battery_voltage_volts': 5.5}, ts=t0 + 16)
+    assert [a['rule_id'] for a in acts] == ['safety/battery-low']
+
+
+def test_reload_keeps_previous_rules_on_error_and_reports_duplicates(tmp_path):
+    touch(tmp_path / 'a.yaml', BATTERY)
+    engine = RulesEngine(str(tmp_path / '*.yaml'))
+    touch(tmp_path / 'a.yaml', BATTERY.replace('"< 6.0"', '"<< 6.0"'))
+    touch(tmp_path / 'b.yaml', BATTERY)
+    report = engine.reload_rules()
+    assert str(tmp_path / 'a.yaml') in report['errors']
+    assert report['duplicates'] == {'safety/battery-low': [str(tmp_path / 'a.yaml'), str(tmp_path / 'b.yaml')]}
+    assert len(engine.by_metric['picrawler_battery_voltage_volts']) == 2
+
+
+def test_shipped_rules_report_duplicate_ids():
+    engine = RulesEngine()
+    assert 'safety/battery-low' in engine.duplicates
+
+
+def test_rule_cache_skips_yaml_until_file_changes(tmp_path, monkeypatch):
+    rules_dir = tmp_path / 'rules'
+    rules_dir.mkdir()
+    touch(rules_dir / 'battery.yaml', BATTERY)
+    cache = tmp_path / 'cache.json'
+    RulesEngine(str(rules_dir / '*.yaml'), cache_path=str(cache))
+    assert cache.exists()
+
+    import scripts.rules_engine as re_mod
+    calls = []
+    real_load = re_mod.yaml.load
+    monkeypatch.setattr(re_mod.yaml, 'load', lambda *a, **kw: calls.append(1) or real_load(*a, **kw))
+    engine = RulesEngine(str(rules_dir / '*.yaml'), cache_path=str(cache))
+    assert calls == []
+    assert [r.id for r in engine.rules] == ['safety/battery-low']
+
+    touch(rules_dir / 'battery.yaml', BATTERY.replace('6.0', '5.8'))
+    engine = RulesEngine(str(rules_dir / '*.yaml'), cache_path=str(cache))
+    assert calls == [1]
+    assert engine.rules[0].trigger['condition'] == '< 5.8'
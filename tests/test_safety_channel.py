@@ -0,0 +1,74 @@
+import threading
+
+from scripts.rules_engine import RulesEngine
+from scripts.safety_channel import SafetyListener, SafetyPublisher
+
+
+def test_handle_datagram_evaluates_only_critical_rules():
+    engine = RulesEngine('config/rules/*.yaml')
+    fired = []
+    listener = SafetyListener(engine, fired.extend, path='unused')
+    acts = listener.handle_datagram(b'ultrasonic_distance_m 0.05\npicrawler_agent_heartbeat_age_seconds 500\n')
+    # the heartbeat rules are not critical and are left to the scrape loop
+    assert [a['rule_id'] for a in acts] == ['safety/collision-imminent']
+    assert fired == acts
+    assert listener.handle_datagram(b'garbage\nultrasonic_distance_m nope\n') == []
+
+
+def test_publish_over_socket_reaches_listener(tmp_path):
+    engine = RulesEngine('config/rules/safety_collision-imminent.yaml')
+    got = threading.Event()
+    listener = SafetyListener(engine, lambda acts: got.set(), path=str(tmp_path / 's.sock'))
+    listener.start()
+    try:
+        pub = SafetyPublisher(listener.path)
+        assert pub.publish('ultrasonic_distance_m', 0.5, labels={'sensor': 'front'})
+        assert pub.publish('ultrasonic_distance_m', 0.04, labels={'sensor': 'front'})
+        assert got.wait(2)
+        pub.close()
+    finally:
+        listener.stop()
+    assert not SafetyPublisher(listener.path).publish('ultrasonic_distance_m', 0.04)
+
+
+def test_fast_path_state_is_separate_and_sees_each_sensor(tmp_path):
+    from scripts.watchdog import Target
+    (tmp_path / 'r.yaml').write_text(
+        "- id: safety/collision-imminent\n"
+        "  severity: critical\n"
+        "  trigger: {metric: ultrasonic_distance_m, condition: '< 0.1'}\n"
+        "  enforcement_action: [stop_motors]\n"
+        "  fire_once: true\n")
+    target = Target('local', 'http://127.0.0.1:9/metrics', rules_cache='', rules_pattern=str(tmp_path / '*.yaml'))
+    runs = []
+    listener = SafetyListener(target.attach_safety_engine(), lambda acts: runs.extend(target.admit(acts)),
+                              path='unused')
+    # only the front sensor is close; the rear one must not mask it
+    listener.handle_datagram(b'ultrasonic_distance_m{sensor="front"} 0.03\n'
+                             b'ultrasonic_distance_m{sensor="rear"} 2.0\n', ts=100.0)
+    assert [a['rule_id'] for a in runs] == ['safety/collision-imminent']
+    # the scrape loop fires and then clears on a stale reading; the fast path still fires, so no re-arm
+    target.engine.evaluate_snapshot({'ultrasonic_distance_m': 0.05}, ts=101.0)
+    target.engine.evaluate_snapshot({'ultrasonic_distance_m': 2.0}, ts=102.0)
+    assert target.safety_engine.state['safety/collision-imminent']['firing']
+    listener.handle_datagram(b'ultrasonic_distance_m{sensor="front"} 0.02\n', ts=103.0)
+    assert len(runs) == 1
+    # once both paths see it clear, the latch re-arms
+    listener.handle_datagram(b'ultrasonic_distance_m{sensor="front"} 1.5\n', ts=104.0)
+    listener.handle_datagram(b'ultrasonic_distance_m{sensor="front"} 0.02\n', ts=105.0)
+    assert len(runs) == 2
+
+
+def test_reload_runs_on_the_listener_thread(tmp_path):
+    engine = RulesEngine('config/rules/safety_collision-imminent.yaml')
+    reloaded = []
+    done = threading.Event()
+    engine.reload_rules = lambda: (reloaded.append(threading.current_thread().name), done.set())
+    listener = SafetyListener(engine, lambda acts: None, path=str(tmp_path / 's.sock'))
+    listener.start()
+    try:
+        listener.request_reload()
+        assert done.wait(2)
+    finally:
+        listener.stop()
+    assert reloaded == ['safety-listener']
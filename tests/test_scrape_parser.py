@@ -0,0 +1,56 @@
+import pytest
+
+from scripts.scrape_parser import ExpositionError, format_series, parse_into, parse_labels, split_sample
+from scripts.series import SeriesStore
+
+EXPOSITION = b'''# HELP picrawler_cpu_temp_celsius CPU temperature in Celsius
+# TYPE picrawler_cpu_temp_celsius gauge
+picrawler_cpu_temp_celsius 71.5
+# TYPE picrawler_servos_position_degrees gauge
+picrawler_servos_position_degrees{servo="servo0"} 12.0
+picrawler_servos_position_degrees{servo="servo1",note="a \\"quoted\\" } brace"} -3e1 1700000000000
+picrawler_camera_frames_total 42
+'''
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 7, 4096])
+def test_parse_matches_prometheus_client(size):
+    parser = pytest.importorskip('prometheus_client.parser')
+    store = SeriesStore()
+    store.begin_scrape()
+    kept = parse_into(chunked(EXPOSITION, size), store)
+    store.end_scrape()
+    expected = {}
+    for family in parser.text_string_to_metric_families(EXPOSITION.decode()):
+        for s in family.samples:
+            expected[(s.name, frozenset(s.labels.items()))] = s.value
+    assert kept == 4
+    assert store.values == expected
+
+
+def test_unsubscribed_lines_are_skipped():
+    store = SeriesStore()
+    store.begin_scrape()
+    kept = parse_into([EXPOSITION], store, subscribed={'picrawler_cpu_temp_celsius'})
+    store.end_scrape()
+    assert kept == 1
+    assert dict(store) == {'picrawler_cpu_temp_celsius': 71.5}
+
+
+def test_malformed_sample_raises():
+    with pytest.raises(ExpositionError):
+        parse_into([b'picrawler_cpu_temp_celsius\n'], SeriesStore())
+
+
+def test_format_series_escapes_label_values():
+    labels = {'path': 'C:\\logs', 'note': 'say "hi"\nbye', 'cam': 'front'}
+    line = format_series('picrawler_agent_errors_total', labels)
+    assert line == 'picrawler_agent_errors_total{cam="front",note="say \\"hi\\"\\nbye",path="C:\\\\logs"}'
+    name, raw, rest = split_sample(line.encode() + b' 1')
+    assert name == b'picrawler_agent_errors_total' and rest == b' 1'
+    assert parse_labels(raw.decode()) == labels
+    assert format_series('picrawler_cpu_temp_celsius') == 'picrawler_cpu_temp_celsius'
@@ -0,0 +1,91 @@
+import pytest
+
+from scripts.rules_engine import RulesEngine
+from scripts.series import AmbiguousSeriesError, SeriesStore
+
+
+def scrape(store, samples):
+    store.begin_scrape()
+    for name, labels, value in samples:
+        store.set(name, labels, value)
+    store.end_scrape()
+
+
+def test_labeled_series_are_kept_and_interned():
+    store = SeriesStore()
+    samples = [
+        ('picrawler_servos_position_degrees', {'servo': 'servo0'}, 10.0),
+        ('picrawler_servos_position_degrees', {'servo': 'servo1'}, 45.0),
+        ('picrawler_cpu_temp_celsius', {}, 70.0),
+    ]
+    scrape(store, samples)
+    key = store.key('picrawler_servos_position_degrees', {'servo': 'servo1'})
+    assert store.values[key] == 45.0
+    # order of samples does not change the flat view
+    scrape(store, list(reversed(samples)))
+    assert store.key('picrawler_servos_position_degrees', {'servo': 'servo1'}) is key
+    assert store.select('picrawler_servos_position_degrees') == 45.0
+    # several labeled series have no single flat value
+    with pytest.raises(AmbiguousSeriesError):
+        store['picrawler_servos_position_degrees']
+    assert store.get('picrawler_servos_position_degrees') is None
+    assert store.select('picrawler_servos_position_degrees', {'servo': 'servo0'}) == 10.0
+    assert store.select('picrawler_servos_position_degrees', how='avg') == 27.5
+    # series missing from a scrape are dropped
+    scrape(store, samples[2:])
+    assert 'picrawler_servos_position_degrees' not in store
+    assert len(store) == 1
+
+
+def test_rule_selects_series_by_label(tmp_path):
+    (tmp_path / 'r.yaml').write_text(
+        "- id: observability/vision-heartbeat\n"
+        "  trigger: {metric: picrawler_agent_heartbeat_age_seconds, labels: {agent: vision-agent}, condition: '> 90'}\n"
+        "  enforcement_action: [attempt_restart_agent]\n"
+        "- id: observability/any-heartbeat\n"
+        "  trigger: {metric: picrawler_agent_heartbeat_age_seconds, label_aggregate: max, condition: '> 90'}\n"
+        "  enforcement_action: [alert_operator]\n")
+    engine = RulesEngine(str(tmp_path / '*.yaml'))
+    store = SeriesStore()
+    scrape(store, [
+        ('picrawler_agent_heartbeat_age_seconds', {'agent': 'vision-agent'}, 5.0),
+        ('picrawler_agent_heartbeat_age_seconds', {'agent': 'navigation-agent'}, 120.0),
+    ])
+    acts = engine.evaluate_snapshot(store, ts=1.0)
+    assert [a['rule_id'] for a in acts] == ['observability/any-heartbeat']
+
+
+def test_rule_without_selector_fires_if_any_series_matches(tmp_path):
+    (tmp_path / 'r.yaml').write_text(
+        "- id: safety/battery-low\n"
+        "  trigger: {metric: picrawler_battery_voltage_volts, condition: '< 6.0', duration_seconds: 15}\n"
+        "  enforcement_action: [stop_motors]\n"
+        "- id: safety/collision-smoothed\n"
+        "  trigger: {metric: ultrasonic_distance_m, aggregate: avg, window_seconds: 1, condition: '< 0.1'}\n"
+        "  enforcement_action: [stop_motors]\n")
+    engine = RulesEngine(str(tmp_path / '*.yaml'))
+    store = SeriesStore()
+    for ts in (100.0, 116.0):
+        scrape(store, [
+            ('picrawler_battery_voltage_volts', {'cell': '0'}, 5.2),
+            ('picrawler_battery_voltage_volts', {'cell': '1'}, 7.0),
+            ('ultrasonic_distance_m', {'sensor': 'front'}, 0.03),
+            ('ultrasonic_distance_m', {'sensor': 'rear'}, 2.0),
+        ])
+        acts = engine.evaluate_snapshot(store, ts=ts)
+    assert sorted(a['rule_id'] for a in acts) == ['safety/battery-low', 'safety/collision-smoothed']
+    # windows are kept per series, not mixed across sensors
+    assert len(engine.state['safety/collision-smoothed']['windows']) == 2
+
+
+def test_dropped_series_release_their_interned_keys():
+    store = SeriesStore()
+    for i in range(1000):
+        store.begin_scrape()
+        store.set('picrawler_vision_frames_total', {'session': str(i)}, 1.0, raw='{session="%d"}' % i)
+        store.set('picrawler_cpu_temp_celsius', None, 70.0)
+        store.end_scrape()
+    assert len(store.values) == 2
+    # only the canonical and lookup spellings of the two live series remain
+    assert len(store._interned) == 4
+    assert store.lookup('picrawler_vision_frames_total', '{session="998"}') is None
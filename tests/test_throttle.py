@@ -0,0 +1,50 @@
+from prometheus_client import REGISTRY
+
+from scripts import enforcement
+from scripts.throttle import CpuThrottler
+
+
+def fake_cgroupfs(root, slices=('picrawler.slice', 'vision.slice', 'ai.slice')):
+    for s in slices:
+        (root / s).mkdir()
+        (root / s / 'cpu.max').write_text('max 100000\n')
+    return root
+
+
+def cpu_max(root, s):
+    return (root / s / 'cpu.max').read_text().split()
+
+
+def test_throttle_steps_down_and_recovers_gradually(tmp_path):
+    root = fake_cgroupfs(tmp_path)
+    t = CpuThrottler(str(root), levels=4, step_seconds=30, cpus=4)
+    t.set_level(1, now=0)
+    assert cpu_max(root, 'ai.slice') == [str(round(0.7 * 4 * 100000)), '100000']
+    assert cpu_max(root, 'picrawler.slice') == [str(round((1 - 0.5 / 3) * 4 * 100000)), '100000']
+    assert REGISTRY.get_sample_value('picrawler_cpu_throttle_level') == 1
+
+    assert t.control(88.0, now=10) == 1  # too soon after the last step
+    assert t.control(88.0, now=31) == 2  # still hot: tighten
+    assert t.control(88.0, now=62) == 3
+    assert t.control(88.0, now=93) == 3  # already at the tightest level
+    assert cpu_max(root, 'ai.slice')[0] == str(round(0.1 * 4 * 100000))
+    assert t.control(82.0, now=200) == 3  # between thresholds: hold
+    assert [t.control(75.0, now=now) for now in (230, 240, 261, 292)] == [2, 2, 1, 0]
+    assert cpu_max(root, 'vision.slice') == ['max', '100000']
+
+
+def test_throttle_cpu_action_uses_cgroups_and_skips_missing_slices(tmp_path, monkeypatch):
+    root = fake_cgroupfs(tmp_path, slices=('vision.slice',))
+    t = CpuThrottler(str(root), interval=3600)
+    monkeypatch.setattr(enforcement, '_cpu_throttler', t)
+    assert enforcement.throttle_cpu(dry_run=False)
+    assert t.level == 1
+    assert cpu_max(root, 'vision.slice')[0] != 'max'
+    t.stop()
+    assert cpu_max(root, 'vision.slice')[0] == 'max'
+
+
+def test_throttle_without_cgroups_reports_failure(tmp_path):
+    t = CpuThrottler(str(tmp_path))
+    assert not t.engage()
+    assert t.level == 0
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from prometheus_client import REGISTRY
+
+from scripts import watchdog
+
+BODY = b'picrawler_cpu_temp_celsius 71.5\npicrawler_battery_voltage_volts 7.1\n'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        time.sleep(self.server.delay)
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(BODY)))
+        if self.server.etag:
+            self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.connections = 0
+    server.requests = []
+    server.etag = False
+    server.delay = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def stub_server():
+    server = make_stub_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_scraper_reuses_connection_and_records_latency(stub_server):
+    url = f'http://127.0.0.1:{stub_server.server_address[1]}/metrics'
+    scraper = watchdog.Scraper(url, target='stub')
+    for _ in range(3):
+        store = scraper.fetch({'picrawler_cpu_temp_celsius'})
+    scraper.close()
+    assert dict(store) == {'picrawler_cpu_temp_celsius': 71.5}
+    assert stub_server.connections == 1
+    assert stub_server.requests[0]['Accept-Encoding'] == 'identity'
+    labels = {'target': 'stub', 'phase': 'total'}
+    assert REGISTRY.get_sample_value('picrawler_watchdog_scrape_duration_seconds_count', labels) == 3
+
+
+def test_scraper_conditional_polling_keeps_store(stub_server):
+    stub_server.etag = True
+    url = f'http://127.0.0.1:{stub_server.server_address[1]}/metrics'
+    scraper = watchdog.Scraper(url, target='stub-etag')
+    first = dict(scraper.fetch())
+    second = dict(scraper.fetch())
+    scraper.close()
+    assert first == second == {'picrawler_cpu_temp_celsius': 71.5, 'picrawler_battery_voltage_volts': 7.1}
+    assert stub_server.requests[1]['If-None-Match'] == '"v1"'
+    assert REGISTRY.get_sample_value('picrawler_watchdog_scrape_not_modified_total', {'target': 'stub-etag'}) == 1
+
+
+def test_slow_target_does_not_delay_others(stub_server):
+    slow = make_stub_server()
+    slow.delay = 1.0
+    try:
+        fast_t = watchdog.Target('fast', f'http://127.0.0.1:{stub_server.server_address[1]}/metrics',
+                                 interval=0.05, rules_cache='')
+        slow_t = watchdog.Target('slow', f'http://127.0.0.1:{slow.server_address[1]}/metrics',
+                                 interval=0.05, deadline=0.1, read_timeout=5, rules_cache='')
+
+        async def run():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(watchdog.run_targets([fast_t, slow_t], reload_interval=0), 0.6)
+
+        asyncio.run(run())
+        assert REGISTRY.get_sample_value('picrawler_watchdog_ticks_total', {'target': 'fast'}) >= 8
+        assert REGISTRY.get_sample_value('picrawler_watchdog_tick_rate_hz', {'target': 'fast'}) > 5
+        assert REGISTRY.get_sample_value('picrawler_watchdog_deadline_exceeded_total', {'target': 'slow'}) >= 3
+        assert fast_t.engine is not slow_t.engine
+    finally:
+        slow.shutdown()
+        slow.server_close()
+
+
+def test_evaluation_error_does_not_stop_other_targets(stub_server):
+    url = f'http://127.0.0.1:{stub_server.server_address[1]}/metrics'
+    good = watchdog.Target('good', url, interval=0.05, rules_cache='')
+    bad = watchdog.Target('bad', url, interval=0.05, rules_cache='')
+    calls = []
+
+    def broken(metrics, ts=None):
+        calls.append(ts)
+        raise RuntimeError('boom')
+    bad.engine.evaluate_snapshot = broken
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(watchdog.run_targets([good, bad], reload_interval=0), 0.5)
+
+    asyncio.run(run())
+    assert REGISTRY.get_sample_value('picrawler_watchdog_ticks_total', {'target': 'good'}) >= 5
+    assert len(calls) >= 5  # the failing target keeps being polled too
+
+
+def test_enforcer_does_not_queue_stops_behind_slow_actions(monkeypatch):
+    from scripts import enforcement
+    stops = []
+
+    def slow_restart(agent_name, dry_run=True):
+        time.sleep(1.0)
+        return True
+    monkeypatch.setitem(enforcement.ACTION_MAP, 'attempt_restart_agent', slow_restart)
+    monkeypatch.setitem(enforcement.ACTION_MAP, 'stop_motors', lambda dry_run=True: stops.append(time.monotonic()))
+    target = watchdog.Target('local', 'http://127.0.0.1:9/metrics', rules_cache='')
+    start = time.monotonic()
+    target.enforcer.submit(watchdog.enforce_actions, target,
+                           [{'rule_id': 'observability/heartbeat', 'actions': ['attempt_restart_agent']}])
+    target.enforcer.submit(watchdog.enforce_actions, target,
+                           [{'rule_id': 'safety/collision-imminent', 'actions': ['stop_motors']}]).result(2)
+    assert stops and stops[0] - start < 0.25
+
+
+def test_target_enforce_needs_the_cli_flag_too(tmp_path):
+    path = tmp_path / 'targets.yaml'
+    path.write_text("targets:\n  - {name: pi-crawler-2, url: 'http://127.0.0.1:9/metrics', enforce: true}\n"
+                    "  - {name: vision-agent, url: 'http://127.0.0.1:9/metrics'}\n")
+    assert [t.enforce for t in watchdog.load_targets(str(path), rules_cache='')] == [False, False]
+    assert [t.enforce for t in watchdog.load_targets(str(path), rules_cache='', enforce=True)] == [True, False]
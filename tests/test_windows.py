@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from scripts.rules_engine import RulesEngine, Rule, RuleConfigError
+from scripts.windows import SlidingWindow, rolling_aggregate
+
+
+def brute_force(samples, aggregate):
+    vals = [v for _, v in samples]
+    if aggregate == 'avg':
+        return sum(vals) / len(vals)
+    if aggregate == 'min':
+        return min(vals)
+    if aggregate == 'max':
+        return max(vals)
+    if aggregate == 'rate':
+        (t0, v0), (t1, v1) = samples[0], samples[-1]
+        return (v1 - v0) / (t1 - t0) if t1 > t0 else None
+    ordered = sorted(vals)
+    return ordered[max(-(-95 * len(ordered) // 100), 1) - 1]
+
+
+@pytest.mark.parametrize('aggregate', ['avg', 'min', 'max', 'rate', 'p95'])
+def test_sliding_window_matches_brute_force(aggregate):
+    rnd = random.Random(3)
+    w = SlidingWindow(aggregate, window_seconds=5, max_samples=8)
+    history = []
+    t = 0.0
+    for _ in range(300):
+        t += rnd.uniform(0.1, 2.0)
+        v = rnd.uniform(0, 10)
+        w.push(t, v)
+        history.append((t, v))
+        live = [(ts, x) for ts, x in history if ts > t - 5][-8:]
+        assert len(w) == len(live) <= 8
+        expected = brute_force(live, aggregate)
+        if expected is None:
+            assert w.value() is None
+        else:
+            assert w.value() == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('aggregate', ['avg', 'min', 'max', 'rate', 'p95'])
+def test_rolling_aggregate_matches_window(aggregate):
+    np = pytest.importorskip('numpy')
+    rng = np.random.default_rng(5)
+    ts = np.cumsum(rng.uniform(0.1, 2.0, 400))
+    vals = rng.uniform(0, 10, 400)
+    w = SlidingWindow(aggregate, 5, 8)
+    expected = []
+    for t, v in zip(ts.tolist(), vals.tolist()):
+        w.push(t, v)
+        x = w.value()
+        expected.append(float('nan') if x is None else x)
+    got = rolling_aggregate(ts, vals, aggregate, 5, 8)
+    np.testing.assert_allclose(got, expected, equal_nan=True)
+
+
+def test_windowed_trigger_ignores_single_noisy_sample(tmp_path):
+    (tmp_path / 'r.yaml').write_text(
+        "- id: safety/collision-smoothed\n"
+        "  trigger: {metric: ultrasonic_distance_m, aggregate: avg, window_seconds: 1, condition: '< 0.1'}\n"
+        "  enforcement_action: [stop_motors]\n")
+    engine = RulesEngine(str(tmp_path / '*.yaml'))
+    assert engine.evaluate_snapshot({'ultrasonic_distance_m': 0.5}, ts=100.0) == []
+    # one spurious echo is averaged away
+    assert engine.evaluate_snapshot({'ultrasonic_distance_m': 0.01}, ts=100.2) == []
+    engine.evaluate_snapshot({'ultrasonic_distance_m': 0.02}, ts=100.9)
+    acts = engine.evaluate_snapshot({'ultrasonic_distance_m': 0.02}, ts=101.3)
+    assert [a['rule_id'] for a in acts] == ['safety/collision-smoothed']
+    assert len(engine.state['safety/collision-smoothed']['window']) == 2
+
+
+@pytest.mark.parametrize('trigger', [
+    {'aggregate': 'median', 'window_seconds': 5},
+    {'aggregate': 'avg'},
+    {'aggregate': 'avg', 'window_seconds': 5, 'max_samples': 0},
+])
+def test_bad_window_config_fails_at_load(trigger):
+    with pytest.raises(RuleConfigError):
+        Rule({'id': 'test/bad', 'trigger': dict(trigger, metric='m', condition='< 1')})